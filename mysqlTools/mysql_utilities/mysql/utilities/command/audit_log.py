@@ -20,9 +20,13 @@ This file contains features to examine an audit log file, including
 searching and displaying the results.
 """
 
+import marshal
 import sys
+import tempfile
+
 from mysql.utilities.exception import UtilError
 from mysql.utilities.common.audit_log_parser import AuditLogParser
+from mysql.utilities.common.audit_log_parser import QUERY_TYPES
 from mysql.utilities.common.format import convert_dictionary_list, print_list
 from mysql.utilities.common.server import Server
 
@@ -58,11 +62,6 @@ EVENT_TYPES = ["Audit", "Binlog Dump", "Change user", "Close stmt",
     "Refresh", "Register Slave", "Reset stmt", "Set option", "Shutdown",
      "Sleep", "Statistics", "Table Dump", "Time"]
 
-QUERY_TYPES = ["CREATE", "ALTER", "DROP", "TRUNCATE", "RENAME", "GRANT",
-                "REVOKE", "SELECT", "INSERT", "UPDATE", "DELETE", "COMMIT",
-                "SHOW", "SET", "CALL", "PREPARE", "EXECUTE", "DEALLOCATE"]
-
-
 def command_requires_log_name(command):
     """Check if the specified command requires the --audit-log-name option.
 
@@ -114,6 +113,49 @@ def check_command_value(command, value):
     return True
 
 
+class _SpooledRows(object):
+    """ Audit log records stored in a temporary file.
+
+    The records are dictionaries, read back as lists of values in the order
+    of the columns found in all the records (like convert_dictionary_list).
+    The rows can be read several times, as needed by print_list.
+    """
+
+    def __init__(self):
+        """Constructor
+        """
+        self.columns = []
+        self._count = 0
+        self._file = tempfile.TemporaryFile()
+
+    def append(self, record):
+        """Store a record.
+
+        record[in]        dictionary of the record attributes
+        """
+        for key in record:
+            if key not in self.columns:
+                self.columns.append(key)
+        marshal.dump(record, self._file)
+        self._count += 1
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        self._file.flush()
+        self._file.seek(0)
+        for _ in xrange(self._count):
+            record = marshal.load(self._file)
+            yield [record.get(col, None) for col in self.columns]
+        self._file.seek(0, 2)
+
+    def close(self):
+        """Remove the temporary file.
+        """
+        self._file.close()
+
+
 class AuditLog(object):
     """ Class to manage and parse the audit log.
 
@@ -145,29 +187,44 @@ class AuditLog(object):
     def parse_log(self):
         """ Parse the audit log file (previously opened), applying
         search/filtering criterion.
+
+        The matching records are not kept, only the information needed by
+        show_statistics(). Use output_formatted_log() to print them.
         """
-        self.log.parse_log()
+        for _ in self.log.iter_log():
+            pass
 
     def output_formatted_log(self):
-        """Output the parsed log entries according to the specified format.
+        """Parse the log and output the entries according to the specified
+        format.
 
         Print the entries resulting from the parsing process to the standard
         output in the specified format. If no entries are found (i.e., none
         match the defined search criterion) a notification message is print.
+
+        Raw entries are printed as they are read. For the other formats all
+        the columns must be known before printing, so the entries are first
+        written to a temporary file instead of being kept in memory.
         """
-        log_rows = self.log.retrieve_rows()
-        if log_rows:
-            out_format = self.options.get("format", "GRID")
-            if out_format == 'raw':
-                for row in log_rows:
-                    sys.stdout.write(row)
-            else:
-                #Convert the results to the appropriate format
-                cols, rows = convert_dictionary_list(log_rows)
-                # Note: No need to sort rows, retrieved with the same order
-                # as read (i.e., sorted by timestamp)
-                print_list(sys.stdout, out_format, cols, rows)
+        out_format = self.options.get("format", "GRID")
+        found = False
+        if out_format == 'raw':
+            for row in self.log.iter_log():
+                sys.stdout.write(row)
+                found = True
         else:
+            rows = _SpooledRows()
+            try:
+                for row in self.log.iter_log():
+                    rows.append(row)
+                if rows:
+                    # Note: No need to sort rows, retrieved with the same
+                    # order as read (i.e., sorted by timestamp)
+                    print_list(sys.stdout, out_format, rows.columns, rows)
+                    found = True
+            finally:
+                rows.close()
+        if not found:
             #Print message notifying that no entry was found
             no_entry_msg = "#\n# No entry found!\n#"
             print no_entry_msg
@@ -368,6 +368,16 @@ def copy_db(src_val, dest_val, db_list, options):
 
     # Copy data
     if not skip_data and not skip_tables:
+
+        # With threads and the default locking, the tables of all the
+        # databases are read by the workers in one consistent snapshot
+        copy = None
+        threads = int(options.get("threads", False) or 1)
+        if not cloning and threads > 1 and locking == "snapshot":
+            from mysql.utilities.common.parallel_copy import ParallelCopy
+
+            copy = ParallelCopy(threads, options.get("quiet", False),
+                                source=source)
     
         # Copy tables
         for db_name in db_list:
@@ -378,7 +388,10 @@ def copy_db(src_val, dest_val, db_list, options):
             # Perform the copy
             db.init()
             db.copy_data(db_name[1], options, destination,
-                         options.get("threads", False))
+                         options.get("threads", False), copy)
+
+        if copy is not None:
+            copy.finish()
             
     # if cloning with lock-all unlock here to avoid system table lock conflicts
     if cloning and locking == 'lock-all':
@@ -20,8 +20,11 @@ This file contains the export operations that will export object metadata or
 table data.
 """
 
+import collections
+import json
 import re
 import sys
+import time
 from mysql.utilities.exception import UtilError, UtilDBError
 from mysql.utilities.common.sql_transform import quote_with_backticks
 from mysql.utilities.common.sql_transform import remove_backtick_quoting
@@ -44,6 +47,14 @@ _GTID_BACKUP_WARNING = "# WARNING: A partial export from a server that has " + \
     "option. To export all databases, use the --all and --export=both " + \
     "options."
 
+# Parallel export (see export_data_parallel())
+# Files of the data of the tables and their checksums, see write_manifest()
+MANIFEST_FILE = "export_manifest.json"
+# Key ranges (see Table.get_key_ranges()) written to one file of a table
+_RANGES_PER_FILE = 100
+# Files waiting for a worker, per worker
+_PENDING_PER_WORKER = 2
+
 def export_metadata(source, src_val, db_list, options):
     """Produce rows to be used to recreate objects in a database.
 
@@ -292,62 +303,80 @@ def _export_row(data_rows, cur_table, format, single, skip_blobs, first=False,
                             data_rows)
 
 
-def export_data(source, src_val, db_list, options):
-    """Produce data for the tables in a database.
+def _export_table_rows(row_lists, cur_table, format, single, skip_blobs,
+                       first=False, no_headers=False, load_data=False,
+                       outfile=None):
+    """Export the rows of a table
 
-    This method retrieves the data for each table in the databases listed in
-    the form of BULK INSERT (SQL) statements or in a tabular form to the file
-    specified. The valid values for the format parameter are SQL, CSV, TSV,
-    VERITCAL, or GRID.
+    This method exports lists of rows with _export_row(), or in the format
+    of LOAD DATA INFILE.
+
+    row_lists[in]      lists of rows (e.g. from Table.retrieve_rows())
+    cur_table[in]      Table class instance
+    format[in]         desired output format
+    single[in]         if True, generate single INSERT statements
+    skip_blobs[in]     if True, skip blob data
+    first[in]          if True, the header is printed with the first rows
+    no_headers[in]     if True, do not print headers
+    load_data[in]      if True, write the rows for LOAD DATA INFILE (valid
+                       only for format=CSV or TAB)
+    outfile[in]        if is not None, write table data to this file.
+
+    Returns number of rows exported
+    """
+    from mysql.utilities.common.format import format_load_data_list
+
+    if format in ("grid", "vertical"):
+        # The rows are printed at once, the grid depends on all of them
+        row_lists = [[row for rows in row_lists for row in rows]]
+    num_rows = 0
+    for data_rows in row_lists:
+        num_rows += len(data_rows)
+        if load_data:
+            format_load_data_list(outfile, data_rows,
+                                  "," if format == "csv" else "\t")
+            continue
+        _export_row(data_rows, cur_table, format, single,
+                    skip_blobs, first, no_headers, outfile)
+        first = False
+    return num_rows
+
+
+def _get_table_list(source, src_val, db_list, options):
+    """Get the tables to export
+
+    This method checks that the databases exist and that the user can read
+    them.
 
     source[in]         Server instance
     src_val[in]        a dictionary containing connection information for the
-                       source including:
-                       (user, password, host, port, socket)
-    options[in]        a dictionary containing the options for the copy:
-                       (skip_tables, skip_views, skip_triggers, skip_procs,
-                       skip_funcs, skip_events, skip_grants, skip_create,
-                       skip_data, no_header, display, format, file_per_tbl,
-                       and debug)
+                       source
+    db_list[in]        list of database names, the databases of the server
+                       are added to it for the all option
+    options[in]        a dictionary containing the options for the export
 
-    Returns bool True = success, False = error
+    Returns list of tuples (database name, table name)
     """
-
     from mysql.utilities.common.database import Database
-    from mysql.utilities.common.table import Table
-
-    format = options.get("format", "sql")
-    no_headers = options.get("no_headers", True)
-    column_type = options.get("display", "brief")
-    single = options.get("single", False)
-    skip_blobs = options.get("skip_blobs", False)
-    quiet = options.get("quiet", False)
-    file_per_table = options.get("file_per_tbl", False)
-    skip_views = options.get("skip_views", False)
-    skip_procs = options.get("skip_procs", False)
-    skip_funcs = options.get("skip_funcs", False)
-    skip_events = options.get("skip_events", False)
-    skip_grants = options.get("skip_grants", False)
 
     if options.get("all", False):
         rows = source.get_all_databases()
         for row in rows:
             if row[0] not in db_list:
                 db_list.append(row[0])
-                
+
     # Check if database exists and user permissions on source for all databases
-    table_lock_list = []
     table_list = []
     for db_name in db_list:
         source_db = Database(source, db_name)
 
         # Make a dictionary of the options
         access_options = {
-            'skip_views'  : skip_views,
-            'skip_procs'  : skip_procs,
-            'skip_funcs'  : skip_funcs,
-            'skip_grants' : skip_grants,
-            'skip_events' : skip_events,
+            'skip_views'  : options.get("skip_views", False),
+            'skip_procs'  : options.get("skip_procs", False),
+            'skip_funcs'  : options.get("skip_funcs", False),
+            'skip_grants' : options.get("skip_grants", False),
+            'skip_events' : options.get("skip_events", False),
         }
 
         # Error is source database does not exist
@@ -362,7 +391,49 @@ def export_data(source, src_val, db_list, options):
         tables = source_db.get_db_objects("TABLE")
         for table in tables:
             table_list.append((db_name, table[0]))
-        
+    return table_list
+
+
+def export_data(source, src_val, db_list, options):
+    """Produce data for the tables in a database.
+
+    This method retrieves the data for each table in the databases listed in
+    the form of BULK INSERT (SQL) statements or in a tabular form to the file
+    specified. The valid values for the format parameter are SQL, CSV, TSV,
+    VERITCAL, or GRID.
+
+    source[in]         Server instance
+    src_val[in]        a dictionary containing connection information for the
+                       source including:
+                       (user, password, host, port, socket)
+    options[in]        a dictionary containing the options for the copy:
+                       (skip_tables, skip_views, skip_triggers, skip_procs,
+                       skip_funcs, skip_events, skip_grants, skip_create,
+                       skip_data, no_header, display, format, file_per_tbl,
+                       load_data, compress, and debug)
+
+    Returns bool True = success, False = error
+    """
+
+    from mysql.utilities.common.compression import CompressedWriter
+    from mysql.utilities.common.compression import get_file_extension
+    from mysql.utilities.common.table import Table
+
+    format = options.get("format", "sql")
+    no_headers = options.get("no_headers", True)
+    single = options.get("single", False)
+    skip_blobs = options.get("skip_blobs", False)
+    quiet = options.get("quiet", False)
+    file_per_table = options.get("file_per_tbl", False)
+    # The files of the tables only hold the rows, for LOAD DATA INFILE
+    load_data = (options.get("load_data", False) and file_per_table and
+                 format in ("csv", "tab"))
+    # The compressed files are listed with their checksum in the manifest
+    compress = options.get("compress", None) if file_per_table else None
+    manifest_tables = []
+
+    table_list = _get_table_list(source, src_val, db_list, options)
+
     old_db = ""
     for table in table_list:
         db_name = table[0]
@@ -399,22 +470,390 @@ def export_data(source, src_val, db_list, options):
                file_name = tbl_name + ".sql"
             else:
                 file_name = tbl_name + ".%s" % format.lower()
-            outfile = open(file_name, "w")
-            outfile.write(message + "\n")
+            if compress:
+                file_name += get_file_extension(compress)
+                outfile = CompressedWriter(open(file_name, "wb"), compress)
+            else:
+                outfile = open(file_name, "w")
+            if not load_data:
+                outfile.write(message + "\n")
+            elif not quiet:
+                print message + file_name
         else:
             outfile = None
             print message
 
-        for data_rows in cur_table.retrieve_rows(retrieval_mode):
-            _export_row(data_rows, cur_table, format, single,
-                        skip_blobs, first, no_headers, outfile)
-            if first:
-               first = False
- 
+        row_lists = cur_table.retrieve_rows(retrieval_mode)
+        num_rows = _export_table_rows(row_lists, cur_table, format, single,
+                                      skip_blobs, first, no_headers,
+                                      load_data, outfile)
+
         if file_per_table:
             outfile.close()
-  
+        if compress:
+            manifest_tables.append({
+                'table' : q_tbl_name,
+                'files' : [{'file': file_name, 'rows': num_rows,
+                            'sha256': outfile.checksum()}],
+            })
+
+    if compress:
+        write_manifest({
+            'format'      : format,
+            'load_data'   : load_data,
+            'compression' : compress,
+            'tables'      : manifest_tables,
+        })
+        if not quiet:
+            print "# Wrote the manifest %s." % MANIFEST_FILE
+
+    if not quiet:
+        print "#...done."
+
+    return True
+
+
+def _init_export_worker(conn_val, started, locked):
+    """Start the consistent snapshot of an export worker process
+
+    See init_snapshot_worker(), the arguments are the same.
+    """
+    from mysql.utilities.common.compression import CompressedWriter
+    from mysql.utilities.common.parallel_copy import init_snapshot_worker
+
+    if isinstance(sys.stdout, CompressedWriter):
+        # The compressed stream of the export is written by the main process
+        sys.stdout = sys.stderr
+    init_snapshot_worker(conn_val, started, locked)
+
+
+def _export_file(task):
+    """Export the rows of a table, or of ranges of its keys, to a file in a
+    worker process
+
+    task[in]           tuple (quoted table name, column metadata, key
+                       ranges, file name, compression, options), the whole
+                       table is exported if the key ranges are None; the
+                       options are the arguments of _export_table_rows()
+
+    Returns tuple - (number of rows exported, checksum of the file)
+    """
+    from mysql.utilities.common.compression import CompressedWriter
+    from mysql.utilities.common.parallel_copy import get_snapshot_table
+
+    q_table, columns, key_ranges, file_name, compress, options = task
+    format, single, skip_blobs, first, no_headers, load_data = options
+    try:
+        tbl = get_snapshot_table(q_table, columns)
+        if key_ranges is None:
+            row_lists = tbl.retrieve_rows(1)
+        else:
+            row_lists = (tbl.retrieve_key_range(lower, upper)
+                         for lower, upper in key_ranges)
+        outfile = CompressedWriter(open(file_name, "wb"), compress)
+        try:
+            if not load_data:
+                outfile.write("# Data for table %s: \n" % q_table)
+            num_rows = _export_table_rows(row_lists, tbl, format, single,
+                                          skip_blobs, first, no_headers,
+                                          load_data, outfile)
+        finally:
+            outfile.close()
+        return num_rows, outfile.checksum()
+    except UtilError, err:
+        # Subclasses like UtilDBError can not be unpickled
+        raise UtilError(err.errmsg, err.errno)
+
+
+def _get_file_name(tbl_name, format, num=None, compress=None):
+    """Get the name of a file of the data of a table
+
+    tbl_name[in]       table name (db.table)
+    format[in]         format of the export
+    num[in]            number of the file if the table is written in several
+                       files
+    compress[in]       compression type of the file or None
+
+    Returns string - file name
+    """
+    from mysql.utilities.common.compression import get_file_extension
+
+    if format == "sql":
+        ext = "sql"
+    else:
+        ext = format.lower()
+    ext += get_file_extension(compress)
+    if num is None:
+        return "%s.%s" % (tbl_name, ext)
+    return "%s.chunk%04d.%s" % (tbl_name, num, ext)
+
+
+def _group_key_ranges(key_ranges, ranges_per_file=_RANGES_PER_FILE):
+    """Group consecutive key ranges in the ranges of the files of a table
+
+    key_ranges[in]     key ranges (see Table.get_key_ranges())
+    ranges_per_file[in] maximum number of key ranges of a file
+
+    Returns (yield) lists of key ranges
+    """
+    group = []
+    for key_range in key_ranges:
+        group.append(key_range)
+        if len(group) >= ranges_per_file:
+            yield group
+            group = []
+    if group:
+        yield group
+
+
+def write_manifest(manifest, file_name=MANIFEST_FILE):
+    """Write the manifest of an export
+
+    manifest[in]       dictionary of the manifest
+    file_name[in]      name of the file
+    """
+    manifest_file = open(file_name, "w")
+    try:
+        # The key values are byte strings in the connection character set
+        json.dump(manifest, manifest_file, encoding="latin1", indent=2,
+                  sort_keys=True)
+        manifest_file.write("\n")
+    finally:
+        manifest_file.close()
+
+
+def read_manifest(file_name=MANIFEST_FILE):
+    """Read the manifest of an export
+
+    file_name[in]      name of the file
+
+    Returns dictionary - the manifest
+    """
+    try:
+        manifest_file = open(file_name)
+        try:
+            return json.load(manifest_file, encoding="latin1")
+        finally:
+            manifest_file.close()
+    except (IOError, ValueError), err:
+        raise UtilError("Cannot read the export manifest %s: %s"
+                        % (file_name, err))
+
+
+class _ParallelExport(object):
+    """Export the data of tables with a pool of worker processes
+
+    The workers read the same consistent snapshot of the source, started
+    while the source is locked with FLUSH TABLES WITH READ LOCK. A table
+    with a primary key is split in ranges of key values written to
+    separate files, so the workers export large tables together.
+    """
+    def __init__(self, source, workers, lock=True, quiet=False,
+                 read_positions=None):
+        """Constructor
+
+        The workers are started and their snapshots taken, the binary log
+        position (and the GTIDs executed) of the snapshot are read from the
+        source meanwhile.
+
+        source[in]         Server instance
+        workers[in]        number of worker processes (connections)
+        lock[in]           if False, the source is not locked: the snapshots
+                           of the workers may differ
+        quiet[in]          if True, do not print the progress
+        read_positions[in] function called while the source is still locked,
+                           once the snapshots are started (e.g. to read the
+                           replication commands); its result is kept in
+                           the positions attribute
+        """
+        self.source = source
+        self.workers = workers
+        self.quiet = quiet
+        self.pending = collections.deque()
+        self.start = time.time()
+        self.rows = 0
+        self.snapshot = {}
+        self.positions = None
+        from mysql.utilities.common.parallel_copy import start_snapshot_pool
+
+        def _while_locked():
+            self.snapshot = self._get_snapshot_position()
+            if read_positions is not None:
+                self.positions = read_positions()
+
+        self.pool = start_snapshot_pool(source, workers, lock,
+                                        _init_export_worker, _while_locked)
+
+    def _get_snapshot_position(self):
+        """Get the binary log position and the GTIDs of the snapshot
+
+        Returns dictionary - binlog_file, binlog_position and gtid_executed
+                             (None if not available)
+        """
+        position = {
+            'binlog_file'     : None,
+            'binlog_position' : None,
+            'gtid_executed'   : None,
+        }
+        res = self.source.exec_query("SHOW MASTER STATUS")
+        if res:
+            position['binlog_file'] = res[0][0]
+            position['binlog_position'] = int(res[0][1])
+        if self.source.supports_gtid() == "ON":
+            res = self.source.exec_query(_GET_GTID_EXECUTED)
+            position['gtid_executed'] = res[0][0]
+        return position
+
+    def export_table(self, tbl, file_options, format, compress=None):
+        """Export the data of a table
+
+        The files of the table are submitted to the workers, the export may
+        not be finished when this method returns (see finish()).
+
+        tbl[in]            Table instance of the source table
+        file_options[in]   tuple of the options of _export_table_rows()
+        format[in]         format of the export
+        compress[in]       compression type of the files or None
+
+        Returns list of dictionaries - the files of the table for the
+                                       manifest, updated with the number of
+                                       rows and the checksum when exported
+        """
+        columns = self.source.exec_query("EXPLAIN %s" % tbl.q_table)
+        tbl_files = []
+        if tbl.get_keyset_columns() is None:
+            groups = [None]
+        else:
+            groups = list(_group_key_ranges(tbl.get_key_ranges()))
+        for num, key_ranges in enumerate(groups):
+            if len(groups) == 1:
+                num = None
+            else:
+                num += 1
+            file_name = _get_file_name(tbl.table, format, num, compress)
+            tbl_file = {'file': file_name, 'rows': None, 'sha256': None}
+            if key_ranges is not None:
+                tbl_file['lower'] = key_ranges[0][0]
+                tbl_file['upper'] = key_ranges[-1][1]
+            tbl_files.append(tbl_file)
+            self._submit(tbl_file, (tbl.q_table, columns, key_ranges,
+                                    file_name, compress, file_options))
+        return tbl_files
+
+    def _submit(self, tbl_file, task):
+        """Submit a task, waiting for a task to finish if too many wait
+        """
+        while len(self.pending) >= self.workers * _PENDING_PER_WORKER:
+            self._wait()
+        self.pending.append((tbl_file,
+                             self.pool.apply_async(_export_file, (task,))))
+
+    def _wait(self):
+        """Wait for the oldest task to finish
+        """
+        tbl_file, result = self.pending.popleft()
+        try:
+            num_rows, checksum = result.get()
+        except:
+            self.pool.terminate()
+            self.pool.join()
+            raise
+        tbl_file['rows'] = num_rows
+        tbl_file['sha256'] = checksum
+        self.rows += num_rows
+        if not self.quiet:
+            print "# Exported %d rows to %s." % (num_rows, tbl_file['file'])
+
+    def finish(self):
+        """Wait for all the exports to finish and stop the workers
+        """
+        while self.pending:
+            self._wait()
+        self.pool.close()
+        self.pool.join()
+        if not self.quiet:
+            seconds = max(time.time() - self.start, 0.001)
+            print "# Exported %d rows in %.1f seconds (%d rows/s)." % \
+                  (self.rows, seconds, self.rows / seconds)
+
+
+def start_export_parallel(source, options, read_positions=None):
+    """Start the workers of a parallel export and their snapshot
+
+    source[in]         Server instance
+    options[in]        a dictionary containing the options for the export
+                       (threads, locking and quiet)
+    read_positions[in] function called while the source is locked, once the
+                       snapshot is started (see _ParallelExport)
+
+    Returns _ParallelExport instance - to pass to export_data_parallel()
+    """
+    if not options.get("quiet", False):
+        print "# Exporting data with %d threads." % options["threads"]
+    # The source is already locked by LOCK TABLES for lock-all
+    locking = options.get("locking", "snapshot")
+    return _ParallelExport(source, options["threads"],
+                           locking not in ("no-locks", "lock-all"),
+                           options.get("quiet", False), read_positions)
+
+
+def export_data_parallel(source, src_val, db_list, options, export=None):
+    """Produce data for the tables in a database with several connections.
+
+    This method exports the data like export_data() with the file_per_tbl
+    option, but the tables are read by a pool of worker processes, each
+    with its own connection to the source. The workers read the same
+    consistent snapshot unless the locking option is no-locks. The tables
+    with a primary key are written in several files of key ranges if they
+    are large. The files, their key ranges and checksums and the binary log
+    position of the snapshot are written to the manifest of the export.
+
+    source[in]         Server instance
+    src_val[in]        a dictionary containing connection information for the
+                       source including:
+                       (user, password, host, port, socket)
+    options[in]        a dictionary containing the options for the export,
+                       as for export_data() with threads (number of
+                       workers)
+    export[in]         _ParallelExport instance started before (see
+                       start_export_parallel()), started here if None
+
+    Returns bool True = success, False = error
+    """
+    from mysql.utilities.common.table import Table
+
+    format = options.get("format", "sql")
+    single = options.get("single", False)
+    quiet = options.get("quiet", False)
+    load_data = options.get("load_data", False) and format in ("csv", "tab")
+    first = single and format not in ("sql", "grid", "vertical")
+    file_options = (format, single, options.get("skip_blobs", False), first,
+                    options.get("no_headers", True), load_data)
+    compress = options.get("compress", None)
+
+    table_list = _get_table_list(source, src_val, db_list, options)
+
+    if export is None:
+        export = start_export_parallel(source, options)
+    manifest = {
+        'format'      : format,
+        'load_data'   : load_data,
+        'compression' : compress,
+        'snapshot'    : export.snapshot,
+        'tables'      : [],
+    }
+    for db_name, tbl_name in table_list:
+        q_tbl_name = "%s.%s" % (quote_with_backticks(db_name),
+                                quote_with_backticks(tbl_name))
+        cur_table = Table(source, q_tbl_name, {'quiet': quiet})
+        tbl_files = export.export_table(cur_table, file_options, format,
+                                        compress)
+        manifest['tables'].append({'table': q_tbl_name, 'files': tbl_files})
+    export.finish()
+    write_manifest(manifest)
+
     if not quiet:
+        print "# Wrote the manifest %s." % MANIFEST_FILE
         print "#...done."
 
     return True
@@ -633,18 +1072,31 @@ def export_databases(server_values, db_list, options):
     # Lock tables first
     my_lock = get_copy_lock(source, db_list, options, True)
 
+    def _read_positions():
+        # Replication and GTID commands, (None, None) if not requested
+        rpl_info = None
+        if rpl_mode:
+            rpl_info = get_change_master_command(source, options)
+        if skip_gtids:
+            gtid_info = None
+        else:
+            gtid_info = get_gtid_commands(source, options)
+        return (rpl_info, gtid_info)
+
+    # With threads, the snapshot of the data is started first, and the
+    # replication and GTID commands are read while it is locked
+    parallel = None
+    if export in ("data", "both") and options.get("threads", 1) > 1:
+        parallel = start_export_parallel(source, options, _read_positions)
+        rpl_info, gtid_info = parallel.positions
+    else:
+        rpl_info, gtid_info = _read_positions()
+
     # if --rpl specified, write initial replication command
-    rpl_info = None
     if rpl_mode:
-        rpl_info = get_change_master_command(source, options)
         write_commands(rpl_info[_RPL_FILE], ["STOP SLAVE;"], options)
 
     # if GTIDs enabled and user requested the output, write the GTID commands
-    if skip_gtids:
-        gtid_info = None
-    else:
-        gtid_info = get_gtid_commands(source, options)
-
     if gtid_info:
         write_commands(sys.stdout, gtid_info[0], options)
         
@@ -656,7 +1108,11 @@ def export_databases(server_values, db_list, options):
     if export in ("data", "both"):
         if options.get("display", "brief") != "brief":
             print "# NOTE : --display is ignored for data export."
-        export_data(source, server_values, db_list, options)
+        if parallel is not None:
+            export_data_parallel(source, server_values, db_list, options,
+                                 parallel)
+        else:
+            export_data(source, server_values, db_list, options)
         
     # if GTIDs enabled, write the GTID-related commands
     if gtid_info:
@@ -21,6 +21,12 @@ table data.
 """
 
 import csv
+import hashlib
+import os
+import Queue
+import re
+import tempfile
+import threading
 from itertools import imap
 
 from mysql.utilities.common.sql_transform import quote_with_backticks
@@ -49,6 +55,33 @@ _GTID_SKIP_WARNING = "# WARNING: GTID commands are present in the import " + \
 _GTID_MISSING_WARNING = "# WARNING: GTIDs are enabled on this server but " + \
     "the import file did not contain any GTID commands."
 
+# Statements read before they are executed, see _StatementQueue
+_BATCH_STATEMENTS = 1000
+_BATCH_SIZE = 16 * 1024 * 1024
+# Data statements executed in one transaction (default of --commit-size)
+_COMMIT_SIZE = 100
+# Rows of a table converted to bulk INSERT statements at once
+_DATA_BATCH_ROWS = 10000
+# Batches waiting for an import thread, per thread
+_PENDING_PER_THREAD = 2
+# Bytes read at once to compute the checksum of a file
+_CHECKSUM_READ_SIZE = 1024 * 1024
+
+# Table of a data statement and object type of a CREATE statement
+_IDENTIFIER = r"(?:`(?:[^`]|``)+`|\w+)"
+_DATA_TABLE_CRE = re.compile(r"\s*(INSERT\s+INTO|UPDATE)\s+(?:(%s)\.)?(%s)"
+                             % (_IDENTIFIER, _IDENTIFIER), re.IGNORECASE)
+_CREATE_TYPE_CRE = re.compile(r"\s*CREATE\s.*?\b(TABLE|VIEW|TRIGGER|"
+                              r"PROCEDURE|FUNCTION|EVENT|DATABASE)\b",
+                              re.IGNORECASE | re.DOTALL)
+_USE_CRE = re.compile(r"\s*USE\s+(%s)" % _IDENTIFIER, re.IGNORECASE)
+# Session variables (e.g. SQL_LOG_BIN of the GTID commands), also set on
+# the connections of the import threads
+_SESSION_SET_CRE = re.compile(r"\s*SET\s+(?!@@GLOBAL\.|GLOBAL\s)",
+                              re.IGNORECASE)
+# Number of a data file of a table exported in several files
+_CHUNK_FILE_CRE = re.compile(r"\.chunk\d+$")
+
 def _read_row(file, format, skip_comments=False):
     """Read a row of from the file.
 
@@ -65,7 +98,7 @@ def _read_row(file, format, skip_comments=False):
     warnings_found = []
     if format == "sql":
         # Easiest - just read a row and return it.
-        for row in file.readlines():
+        for row in file:
             if row.startswith("# WARNING"):
                 warnings_found.append(row)
                 continue
@@ -86,7 +119,7 @@ def _read_row(file, format, skip_comments=False):
         read_header = False
         header = []
         data_row = []
-        for row in file.readlines():
+        for row in file:
             # Show warnings from file
             if row.startswith("# WARNING"):
                 warnings_found.append(row)
@@ -756,6 +789,161 @@ def _build_insert_data(col_names, tbl_name, data):
            ") VALUES (" + ','.join(imap(to_sql, data))  + ");"
 
 
+def _build_load_data(file_name, tbl_name, format, columns=None,
+                     charset=None):
+    """Build a LOAD DATA LOCAL INFILE statement.
+
+    The file is read in the format written by format_load_data_list().
+
+    file_name[in]     name (and path) of the file to load
+    tbl_name[in]      quoted table name (db.table)
+    format[in]        format of the file, csv or tab
+    columns[in]       list of the column names of the fields, default is all
+                      the columns of the table
+    charset[in]       character set of the file, default is the one of the
+                      database
+
+    Returns (string) the LOAD DATA statement.
+    """
+    if format == "csv":
+        fields = "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"'"
+    else:
+        fields = "FIELDS TERMINATED BY '\\t'"
+    query = "LOAD DATA LOCAL INFILE '%s' INTO TABLE %s" % \
+            (file_name.replace("\\", "\\\\").replace("'", "\\'"), tbl_name)
+    if charset:
+        query += " CHARACTER SET %s" % charset
+    query += " %s ESCAPED BY '\\\\' LINES TERMINATED BY '\\n'" % fields
+    if columns:
+        query += " (%s)" % ", ".join([
+            col if is_quoted_with_backticks(col) else quote_with_backticks(col)
+            for col in columns])
+    return query
+
+
+def _get_load_data_table(file_name):
+    """Get the table of a file written by mysqldbexport --load-data
+
+    The file name is the table name followed by the format, e.g.
+    db1.t1.csv, or by the number of the file for the tables exported in
+    several files, e.g. db1.t1.chunk0001.csv.
+
+    file_name[in]     name (and path) of the file
+
+    Returns (string) the quoted table name (db.table).
+    """
+    name = os.path.splitext(os.path.basename(file_name))[0]
+    name = _CHUNK_FILE_CRE.sub("", name)
+    db, sep, tbl = name.partition('.')
+    if not db or not tbl:
+        raise UtilError("Cannot find the table of the file %s. The name of "
+                        "the file must be <database>.<table>.<format>."
+                        % file_name)
+    return "%s.%s" % (quote_with_backticks(db), quote_with_backticks(tbl))
+
+
+def _get_manifest_checksum(file_name):
+    """Get the checksum of a file in the manifest of its export
+
+    The manifest is read from the directory of the file (see
+    mysqldbexport --compress and --threads).
+
+    file_name[in]     name (and path) of the file
+
+    Returns string - hexadecimal SHA-256 of the file or None if the file is
+                     not in a manifest
+    """
+    from mysql.utilities.command.dbexport import MANIFEST_FILE, read_manifest
+
+    manifest_name = os.path.join(os.path.dirname(os.path.abspath(file_name)),
+                                 MANIFEST_FILE)
+    if not os.path.exists(manifest_name):
+        return None
+    base_name = os.path.basename(file_name)
+    for table in read_manifest(manifest_name).get('tables', []):
+        for tbl_file in table.get('files', []):
+            if tbl_file.get('file') == base_name:
+                return tbl_file.get('sha256')
+    return None
+
+
+def _get_file_checksum(file_name):
+    """Compute the checksum of a file
+
+    file_name[in]     name (and path) of the file
+
+    Returns string - hexadecimal SHA-256 of the file
+    """
+    sha256 = hashlib.sha256()
+    data_file = open(file_name, "rb")
+    try:
+        for data in iter(lambda: data_file.read(_CHECKSUM_READ_SIZE), ""):
+            sha256.update(data)
+    finally:
+        data_file.close()
+    return sha256.hexdigest()
+
+
+class _LoadDataFile(object):
+    """Rows of a table loaded with LOAD DATA LOCAL INFILE
+
+    The rows are written to a temporary file as they are read from the
+    import file, so they are not held in memory, and loaded at once.
+    """
+
+    def __init__(self, tbl_name, columns, charset=None):
+        """Constructor
+
+        tbl_name[in]      quoted table name (db.table)
+        columns[in]       list of the column names of the rows
+        charset[in]       character set of the rows
+        """
+        from mysql.utilities.common.format import format_load_data_list
+
+        self.format_rows = format_load_data_list
+        self.tbl_name = tbl_name
+        self.columns = columns
+        self.charset = charset
+        self.rows = []
+        fd, self.file_name = tempfile.mkstemp(suffix=".tab")
+        self.file = os.fdopen(fd, "w")
+
+    def append(self, row):
+        """Add a row, the rows are written in batches
+        """
+        self.rows.append(row)
+        if len(self.rows) >= _DATA_BATCH_ROWS:
+            self.format_rows(self.file, self.rows)
+            self.rows = []
+
+    def load(self, server, statements, dryrun=False):
+        """Load the rows and remove the temporary file
+
+        The statements read before the rows (e.g. the CREATE TABLE) are
+        executed and committed first.
+
+        server[in]        Server instance allowing LOAD DATA LOCAL INFILE
+        statements[in]    _StatementQueue of the import
+        dryrun[in]        if True, print the LOAD DATA statement
+        """
+        try:
+            self.format_rows(self.file, self.rows)
+            self.rows = []
+            self.file.close()
+            statements.flush()
+            statements.commit()
+            query = _build_load_data(self.file_name, self.tbl_name, "tab",
+                                     self.columns, self.charset)
+            if dryrun:
+                print query
+            else:
+                server.exec_query(query)
+        finally:
+            if not self.file.closed:
+                self.file.close()
+            os.remove(self.file_name)
+
+
 def _skip_sql(sql, options):
     """Check to see if we skip this SQL statement
 
@@ -838,40 +1026,340 @@ def _skip_object(obj_type, options):
         return False
 
 
-def _exec_statements(statements, destination, format, options, dryrun=False):
-    """Execute a list of SQL statements
+class _StatementQueue(object):
+    """Queue of the SQL statements of an import
 
-    statements[in]    A list of SQL statements to execute
-    destination[in]   A connection to the destination server
-    format[in]        Format of import file
-    options[in]       Option dictionary containing the --skip_* options
-    dryrun[in]        If True, print the SQL statements and do not execute
+    The statements are executed in batches while the import file is read,
+    so the memory used does not depend on the size of the file. The data
+    statements (INSERT and UPDATE) are committed every commit_size
+    statements instead of one at a time, the other statements commit the
+    data statements executed before them.
+    """
 
-    Returns (bool) - True if all execute, raises error if one fails
+    def __init__(self, destination, format, options, dryrun=False):
+        """Constructor
+
+        destination[in]   A connection to the destination server
+        format[in]        Format of import file
+        options[in]       Option dictionary containing the --skip_* options
+                          and commit_size
+        dryrun[in]        If True, print the SQL statements and do not execute
+        """
+        self.destination = destination
+        self.format = format
+        self.options = options
+        self.dryrun = dryrun
+        self.commit_size = max(options.get("commit_size", _COMMIT_SIZE), 1)
+        self.statements = []
+        self.size = 0
+        self.uncommitted = 0
+
+    def append(self, statement):
+        """Add a statement, executing the batch if it is full
+        """
+        self.statements.append(statement)
+        self.size += len(statement)
+        if len(self.statements) >= _BATCH_STATEMENTS or \
+           self.size >= _BATCH_SIZE:
+            self.flush()
+
+    def extend(self, statements):
+        """Add a list of statements
+        """
+        for statement in statements:
+            self.append(statement)
+
+    def flush(self):
+        """Execute the statements of the batch
+
+        Returns (bool) - True if all execute, raises error if one fails
+        """
+        new_engine = self.options.get("new_engine", None)
+        def_engine = self.options.get("def_engine", None)
+        quiet = self.options.get("quiet", False)
+        statements = self.statements
+        self.statements = []
+        self.size = 0
+        for statement in statements:
+            if (new_engine is not None or def_engine is not None) and \
+               statement.upper()[0:12] == "CREATE TABLE":
+                i = statement.find(' ', 13)
+                tbl_name = statement[13:i]
+                statement = self.destination.substitute_engine(tbl_name,
+                                                               statement,
+                                                               new_engine,
+                                                               def_engine,
+                                                               quiet)
+            try:
+                if self.dryrun:
+                    print statement
+                elif self.format != "sql" or \
+                     not _skip_sql(statement, self.options):
+                    self._execute(statement)
+            except _ThreadError:
+                raise
+            # Here we capture any exception and raise UtilError to
+            # communicate to the script/user. Since all util errors
+            # (exceptions) derive from Exception, this is safe.
+            except Exception, e:
+                # Keep the statements executed before the one failing
+                self.commit()
+                raise UtilError("Invalid statement:\n%s" % statement +
+                                "\nERROR: %s" % e.errmsg)
+        return True
+
+    def _execute(self, statement):
+        """Execute a statement, committing the data statements in batches
+        """
+        if statement.lstrip()[0:6].upper() in _DATA_COMMANDS:
+            self.destination.exec_query(statement, {'fetch': False}).close()
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_size:
+                self.commit()
+        else:
+            # Commits the data statements too
+            self.destination.exec_query(statement)
+            self.uncommitted = 0
+
+    def commit(self):
+        """Commit the data statements executed
+        """
+        if self.uncommitted:
+            self.uncommitted = 0
+            self.destination.exec_query("COMMIT")
+
+    def close(self):
+        """Execute the remaining statements and commit them
+        """
+        self.flush()
+        self.commit()
+
+
+class _ThreadError(UtilError):
+    """Error of a statement executed by an import thread
     """
-    new_engine = options.get("new_engine", None)
-    def_engine = options.get("def_engine", None)
-    quiet = options.get("quiet", False)
-    for statement in statements:
-        if (new_engine is not None or def_engine is not None) and \
-           statement.upper()[0:12] == "CREATE TABLE":
-            i = statement.find(' ', 13)
-            tbl_name = statement[13:i]
-            statement = destination.substitute_engine(tbl_name, statement,
-                                                      new_engine, def_engine,
-                                                      quiet)
+    pass
+
+
+def _get_thread_server(conn_val, local_infile=False):
+    """Connect an import thread to the destination server
+
+    The session does not check foreign keys and unique keys, so the tables
+    can be loaded in any order.
+
+    conn_val[in]      connection values of the destination server
+    local_infile[in]  if True, the connection allows LOAD DATA LOCAL INFILE
+
+    Returns a connected Server instance
+    """
+    from mysql.utilities.common.server import Server
+
+    server = Server({'conn_info': conn_val, 'role': "thread",
+                     'local_infile': local_infile})
+    server.connect()
+    server.disable_foreign_key_checks(True)
+    server.exec_query("SET SESSION unique_checks = 0")
+    return server
+
+
+class _ImportThread(threading.Thread):
+    """Thread executing batches of data statements on its own connection
+    """
+
+    def __init__(self, queue, conn_val):
+        """Constructor
+
+        queue[in]         _ParallelStatementQueue notified of the batches
+                          done
+        conn_val[in]      connection values of the destination server
+        """
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.queue = queue
+        self.batches = Queue.Queue(_PENDING_PER_THREAD)
+        self.error = None
+        self.server = _get_thread_server(conn_val)
+
+    def run(self):
+        """Execute the batches until None is read
+        """
+        db_name = None
+        num_session = 0
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                break
+            table, batch_db, batch_session, statements = batch
+            statement = None
+            try:
+                # Skip the batches read after an error
+                if self.error is None:
+                    # The session statements read before the batch
+                    for statement in self.queue.session[num_session:
+                                                        batch_session]:
+                        self.server.exec_query(statement)
+                    num_session = max(num_session, batch_session)
+                    statement = None
+                    if batch_db is not None and batch_db != db_name:
+                        db_name = batch_db
+                        self.server.exec_query("USE %s" % db_name)
+                    for statement in statements:
+                        self.server.exec_query(statement,
+                                               {'fetch': False}).close()
+                    self.server.exec_query("COMMIT")
+            except Exception, e:
+                self.error = "Invalid statement:\n%s\nERROR: %s" % \
+                             (statement, getattr(e, 'errmsg', e))
+            self.queue.batch_done(table, statements)
+        self.server.disconnect()
+
+
+class _ParallelStatementQueue(_StatementQueue):
+    """Queue of the SQL statements of an import using several connections
+
+    The data statements are sent in batches of commit_size statements to
+    import threads, each with its own connection, while the other
+    statements are executed in the order of the file on the main
+    connection. The INSERT statements of a table can be executed by any
+    thread, its UPDATE statements (blob data) wait for the INSERT
+    statements sent before them. The views, triggers and grants are
+    executed once all the data is loaded, so triggers do not fire for the
+    imported rows. The session SET statements (e.g. SQL_LOG_BIN = 0 of the
+    GTID commands) are executed by the threads too, before the batches read
+    after them.
+    """
+
+    def __init__(self, destination, format, options, threads):
+        """Constructor
+
+        destination[in]   A connection to the destination server
+        format[in]        Format of import file
+        options[in]       Option dictionary containing the --skip_* options
+                          and commit_size
+        threads[in]       number of import threads (connections)
+        """
+        _StatementQueue.__init__(self, destination, format, options)
+        self.cond = threading.Condition()
+        self.inserts = {}  # INSERT batches of a table not done
+        self.deferred = []
+        self.session = []
+        self.db_name = None
+        self.batch_key = None
+        self.batch_db = None
+        self.batch = []
+        self.threads = []
+        conn_val = destination.get_connection_values()
+        for _ in range(threads):
+            thread = _ImportThread(self, conn_val)
+            thread.start()
+            self.threads.append(thread)
+
+    def _execute(self, statement):
+        """Send a data statement to the threads, defer views, triggers and
+        grants
+        """
+        match = _DATA_TABLE_CRE.match(statement)
+        if match:
+            table = "%s.%s" % (match.group(2) or self.db_name, match.group(3))
+            key = (table, match.group(1).upper() == "UPDATE")
+            if self.batch and key != self.batch_key:
+                self._send()
+            if not self.batch:
+                # The statements are executed in the database of the first
+                # one, USE statements may follow before the batch is sent
+                self.batch_db = self.db_name
+            self.batch_key = key
+            self.batch.append(statement)
+            if len(self.batch) >= self.commit_size:
+                self._send()
+            return
+        match = _CREATE_TYPE_CRE.match(statement[:1000])
+        if (match and match.group(1).upper() in ("VIEW", "TRIGGER")) or \
+           statement.lstrip()[0:5].upper() == "GRANT":
+            # Grants may refer to the views
+            self.deferred.append(statement)
+            return
+        match = _USE_CRE.match(statement)
+        if match:
+            self.db_name = match.group(1)
+        elif _SESSION_SET_CRE.match(statement):
+            if self.batch:
+                # The batch was read before the statement
+                self._send()
+            self.session.append(statement)
+        _StatementQueue._execute(self, statement)
+
+    def _check_errors(self):
+        """Raise the error of an import thread
+        """
+        for thread in self.threads:
+            if thread.error is not None:
+                self._stop()
+                raise _ThreadError(thread.error)
+
+    def _send(self):
+        """Send the batch of data statements to the least busy thread
+        """
+        (table, update), statements = self.batch_key, self.batch
+        self.batch = []
+        self.cond.acquire()
         try:
-            if dryrun:
-                print statement
-            elif format != "sql" or not _skip_sql(statement, options):
-                res = destination.exec_query(statement)
-        # Here we capture any exception and raise UtilError to communicate to
-        # the script/user. Since all util errors (exceptions) derive from
-        # Exception, this is safe.
-        except Exception, e:
-            raise UtilError("Invalid statement:\n%s" % statement +
-                            "\nERROR: %s" % e.errmsg)
-    return True
+            if update:
+                # The rows must be inserted before their blobs are set
+                while self.inserts.get(table) and \
+                      not [thread for thread in self.threads
+                           if thread.error is not None]:
+                    self.cond.wait(1.0)
+            else:
+                self.inserts[table] = self.inserts.get(table, 0) + 1
+        finally:
+            self.cond.release()
+        self._check_errors()
+        thread = min(self.threads,
+                     key=lambda thread: thread.batches.qsize())
+        thread.batches.put((table, self.batch_db, len(self.session),
+                            statements))
+
+    def batch_done(self, table, statements):
+        """Called by the import threads when a batch is done
+        """
+        if statements[0].lstrip()[0:6].upper() == "INSERT":
+            self.cond.acquire()
+            try:
+                self.inserts[table] -= 1
+                self.cond.notify_all()
+            finally:
+                self.cond.release()
+
+    def _stop(self):
+        """Stop the import threads once their batches are done
+        """
+        for thread in self.threads:
+            thread.batches.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+
+    def close(self):
+        """Execute the remaining statements, wait for the threads and execute
+        the deferred statements
+        """
+        self.flush()
+        self.commit()
+        if self.batch:
+            self._send()
+        threads = self.threads
+        self._stop()
+        for thread in threads:
+            if thread.error is not None:
+                raise _ThreadError(thread.error)
+        for statement in self.deferred:
+            try:
+                _StatementQueue._execute(self, statement)
+            except Exception, e:
+                raise UtilError("Invalid statement:\n%s" % statement +
+                                "\nERROR: %s" % e.errmsg)
+        self.commit()
 
 
 def _get_column_metadata(tbl_class, table_col_list):
@@ -905,6 +1393,10 @@ def import_file(dest_val, file_name, options):
     Users are highly encouraged to use the --dryrun option which will
     print the SQL statements without executing them.
 
+    Compressed files are decompressed as they are read. The checksum of a
+    file listed in the manifest of its export is checked before any of its
+    statements is executed.
+
     dest_val[in]       a dictionary containing connection information for the
                        destination including:
                        (user, password, host, port, socket)
@@ -912,11 +1404,13 @@ def import_file(dest_val, file_name, options):
     options[in]        a dictionary containing the options for the import:
                        (skip_tables, skip_views, skip_triggers, skip_procs,
                        skip_funcs, skip_events, skip_grants, skip_create,
-                       skip_data, no_header, display, format, and debug)
+                       skip_data, no_header, display, format, load_data,
+                       and debug)
 
     Returns bool True = success, False = error
     """
 
+    from mysql.utilities.common.compression import open_compressed
     from mysql.utilities.common.database import Database
     from mysql.utilities.common.options import check_engine_options
     from mysql.utilities.common.table import Table
@@ -936,20 +1430,25 @@ def import_file(dest_val, file_name, options):
                       table_col_list, table_rows, skip_blobs):
         # if there is data here, build bulk inserts
         # First, create table reference, then call insert_rows()
-        tbl = Table(destination, tbl_name)
-        # Need to check to see if table exists!
-        if tbl.exists():
-            tbl.get_column_metadata()
-            col_meta = True
-        elif len(table_col_list) > 0:
-            col_meta = _get_column_metadata(tbl, table_col_list)
-        else:
-            fix_cols = []
-            fix_cols.append((tbl.tbl_name, columns))
-            col_meta = _get_column_metadata(tbl, fix_cols)
-        if not col_meta:
-            raise UtilError("Cannot build bulk insert statements without "
-                                 "the table definition.")
+        # The rows of a table may be processed in several batches
+        tbl = data_tables.get(tbl_name)
+        if tbl is None:
+            tbl = Table(destination, tbl_name)
+            # Need to check to see if table exists!
+            if tbl.exists():
+                tbl.get_column_metadata()
+                col_meta = True
+            elif len(table_col_list) > 0:
+                col_meta = _get_column_metadata(tbl, table_col_list)
+            else:
+                fix_cols = []
+                fix_cols.append((tbl.tbl_name, columns))
+                col_meta = _get_column_metadata(tbl, fix_cols)
+            if not col_meta:
+                raise UtilError("Cannot build bulk insert statements without "
+                                     "the table definition.")
+            data_tables.clear()
+            data_tables[tbl_name] = tbl
         ins_strs = tbl.make_bulk_insert(table_rows, tbl.q_db_name)
         if len(ins_strs[0]) > 0:
             statements.extend(ins_strs[0])
@@ -967,6 +1466,9 @@ def import_file(dest_val, file_name, options):
     do_drop = options.get("do_drop", False)
     skip_blobs = options.get("skip_blobs", False)
     skip_gtid = options.get("skip_gtid", False)
+    # Data of csv and tab files loaded with LOAD DATA LOCAL INFILE
+    load_data = (options.get("load_data", False) and
+                 format in ("csv", "tab") and import_type != "definitions")
 
     # Attempt to connect to the destination server
     conn_options = {
@@ -997,14 +1499,57 @@ def import_file(dest_val, file_name, options):
     get_db = True
     check_privileges = False
     db_name = None
-    file = open(file_name)
+    # Check the whole file first, its statements are committed in batches
+    checksum = _get_manifest_checksum(file_name)
+    if checksum is not None and _get_file_checksum(file_name) != checksum:
+        raise UtilError("The checksum of the file %s does not match the "
+                        "export manifest." % file_name)
+    file = open_compressed(file_name)
+    loader = None
+    if load_data and not dryrun:
+        loader = _get_thread_server(destination.get_connection_values(),
+                                    True)
+    if load_data:
+        # A file written by mysqldbexport --load-data only holds rows
+        first_line = file.readline()
+        file.seek(0)
+        if first_line and not first_line.startswith(("#", "--")):
+            file.close()
+            if getattr(file, "compression", None) is not None:
+                if loader is not None:
+                    loader.disconnect()
+                raise UtilError("The compressed file %s cannot be loaded "
+                                "with LOAD DATA LOCAL INFILE." % file_name)
+            tbl_name = _get_load_data_table(file_name)
+            Database(destination, tbl_name.partition('.')[0]).\
+                check_write_access(dest_val['user'], dest_val['host'],
+                                   options.copy())
+            query = _build_load_data(os.path.abspath(file_name), tbl_name,
+                                     format, charset=destination.charset)
+            if dryrun:
+                print query
+            else:
+                loader.exec_query(query)
+                loader.disconnect()
+            if not quiet:
+                print "#...done."
+            return True
+    load_file = None
     columns = []
     read_columns = False
     table_rows = []
     obj_type = ""
     definitions = []
-    statements = []
+    # Statements are executed in batches as the file is read
+    threads = options.get("threads", 1)
+    if threads > 1 and not dryrun:
+        statements = _ParallelStatementQueue(destination, format, options,
+                                             threads)
+    else:
+        statements = _StatementQueue(destination, format, options, dryrun)
     table_col_list = []
+    data_tables = {}
+    checked_db = None
     tbl_name = ""
     skip_rpl = options.get("skip_rpl", False)
     gtid_command_found = False
@@ -1054,7 +1599,8 @@ def import_file(dest_val, file_name, options):
 
         # This is the first time through the loop so we must
         # check user permissions on source for all databases
-        if db_name is not None:
+        if db_name is not None and db_name != checked_db:
+            checked_db = db_name
             dest_db = Database(destination, db_name)
 
             # Make a dictionary of the options
@@ -1097,6 +1643,9 @@ def import_file(dest_val, file_name, options):
                 else:
                     if row[0] == "BEGIN_DATA":
                         # Start of table so first row is columns.
+                        if load_file is not None:
+                            load_file.load(loader, statements, dryrun)
+                            load_file = None
                         if len(table_rows) > 0:
                             _process_data(tbl_name, statements, columns,
                                           table_col_list, table_rows,
@@ -1113,9 +1662,20 @@ def import_file(dest_val, file_name, options):
                         if read_columns:
                             columns = row[1]
                             read_columns = False
+                            if load_data:
+                                load_file = _LoadDataFile(tbl_name, columns,
+                                                          destination.charset)
                         else:
-                            if not single:
+                            if load_file is not None:
+                                load_file.append(row[1])
+                            elif not single:
                                 table_rows.append(row[1])
+                                # Bound the rows held in memory
+                                if len(table_rows) >= _DATA_BATCH_ROWS:
+                                    _process_data(tbl_name, statements,
+                                                  columns, table_col_list,
+                                                  table_rows, skip_blobs)
+                                    table_rows = []
                             else:
                                 str = _build_insert_data(columns, tbl_name,
                                                          row[1])
@@ -1132,8 +1692,13 @@ def import_file(dest_val, file_name, options):
                       table_col_list, table_rows, skip_blobs)
         table_rows = []
 
-    # Now process the statements
-    _exec_statements(statements, destination, format, options, dryrun)
+    if load_file is not None:
+        load_file.load(loader, statements, dryrun)
+
+    # Now process the remaining statements
+    statements.close()
+    if loader is not None:
+        loader.disconnect()
 
     file.close()
     
@@ -0,0 +1,261 @@
+#
+# Copyright (c) 2012, 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+"""
+This file contains the index of the audit log records, stored in a SQLite
+file next to the audit log.
+
+The index holds the offset of each record with the values searched by
+mysqlauditgrep: TIMESTAMP, NAME, USER, PRIV_USER, CONNECTION_ID and the
+query types found in SQLTEXT. It is updated with the records appended to
+the log since the last search, and rebuilt when the log was rotated or
+truncated.
+"""
+
+import os
+import sqlite3
+
+from mysql.utilities.exception import UtilError
+from mysql.utilities.common.audit_log_parser import QUERY_TYPES
+
+# Changed when the tables change, older index files are rebuilt
+_INDEX_VERSION = '1'
+
+# Bytes at the start of the log used to recognize it
+_HEAD_SIZE = 1024
+
+# Records inserted per statement when indexing
+_BATCH_SIZE = 1000
+
+_CREATE_TABLES = [
+    "CREATE TABLE meta (name TEXT PRIMARY KEY, value TEXT)",
+    "CREATE TABLE records (offset INTEGER PRIMARY KEY, timestamp TEXT, "
+    "name TEXT, user TEXT, priv_user TEXT, connection_id TEXT, "
+    "query_types INTEGER)",
+    "CREATE INDEX records_timestamp ON records (timestamp)",
+    "CREATE INDEX records_name ON records (name)",
+    "CREATE INDEX records_connection_id ON records (connection_id)",
+]
+
+
+def get_query_types_mask(sqltext):
+    """Get the query types found in a SQL statement.
+
+    The query types are matched like by AuditLogParser.match_query_type(),
+    i.e. anywhere in the statement.
+
+    sqltext[in]       value of the SQLTEXT attribute or None
+
+    Returns an integer with the bits of the QUERY_TYPES found set.
+    """
+    mask = 0
+    if sqltext:
+        sqltext = sqltext.lower()
+        for bit, qtype in enumerate(QUERY_TYPES):
+            if qtype.lower() in sqltext:
+                mask |= 1 << bit
+    return mask
+
+
+class AuditLogIndex(object):
+    """ The AuditLogIndex class is used to find the offset of the audit log
+    records matching search criteria without reading the whole log.
+    """
+
+    def __init__(self, log_name, index_name=None):
+        """Constructor
+
+        log_name[in]      path of the audit log file
+        index_name[in]    path of the index file, default is the log name
+                          with the .idx extension appended
+        """
+        self.log_name = log_name
+        self.index_name = index_name or log_name + '.idx'
+        self.conn = None
+
+    def open(self):
+        """Open the index file, creating it if needed.
+        """
+        try:
+            self.conn = sqlite3.connect(self.index_name)
+            self.conn.text_factory = str
+            tables = self.conn.execute("SELECT name FROM sqlite_master "
+                                       "WHERE type = 'table'").fetchall()
+            if ('meta',) in tables and self._get_meta('version') \
+               != _INDEX_VERSION:
+                for (table,) in tables:
+                    self.conn.execute("DROP TABLE %s" % table)
+                tables = []
+            if not tables:
+                for statement in _CREATE_TABLES:
+                    self.conn.execute(statement)
+                self._set_meta('version', _INDEX_VERSION)
+                self.conn.commit()
+        except sqlite3.Error, err:
+            raise UtilError("Cannot open the audit log index '%s': %s"
+                            % (self.index_name, err))
+
+    def close(self):
+        """Close the index file.
+        """
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def _get_meta(self, name):
+        """Get a value of the meta table, None if not set.
+        """
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?",
+                                (name,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def _set_meta(self, name, value):
+        """Set a value of the meta table.
+        """
+        self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                          (name, value))
+
+    def update(self, parse_line):
+        """Index the records appended to the log since the last update.
+
+        The whole log is indexed again if it is not the log indexed before,
+        i.e. if it was rotated, truncated or overwritten: the inode, the
+        first bytes of the log or the last bytes indexed changed. Only
+        complete lines are indexed, a record being written is indexed on the
+        next update.
+
+        parse_line[in]    function returning the record dict of a line of
+                          the log, or None if it is not an audit record
+
+        Returns the number of records indexed.
+        """
+        log = open(self.log_name, 'rb')
+        try:
+            head = log.read(_HEAD_SIZE)
+            indexed = int(self._get_meta('size') or 0)
+            log.seek(max(indexed - _HEAD_SIZE, 0))
+            tail = log.read(min(indexed, _HEAD_SIZE))
+            if (str(os.fstat(log.fileno()).st_ino) != self._get_meta('inode')
+                or not head.startswith(self._get_meta('head') or '')
+                or tail != (self._get_meta('tail') or '')):
+                # Not the log indexed, start again
+                self.conn.execute("DELETE FROM records")
+                indexed = 0
+            log.seek(indexed)
+            num_records = 0
+            batch = []
+            offset = indexed
+            for line in log:
+                if not line.endswith('\n'):
+                    break
+                record = parse_line(line)
+                if record is not None:
+                    batch.append(
+                        (offset, record.get('TIMESTAMP'),
+                         record.get('NAME', '').lower(), record.get('USER'),
+                         record.get('PRIV_USER'),
+                         record.get('CONNECTION_ID'),
+                         get_query_types_mask(record.get('SQLTEXT'))))
+                    if len(batch) >= _BATCH_SIZE:
+                        num_records += self._insert(batch)
+                        batch = []
+                offset += len(line)
+            num_records += self._insert(batch)
+            self._set_meta('size', str(offset))
+            self._set_meta('inode', str(os.fstat(log.fileno()).st_ino))
+            self._set_meta('head', head[:offset])
+            log.seek(max(offset - _HEAD_SIZE, 0))
+            self._set_meta('tail', log.read(min(offset, _HEAD_SIZE)))
+            self.conn.commit()
+        except sqlite3.Error, err:
+            self.conn.rollback()
+            raise UtilError("Cannot update the audit log index '%s': %s"
+                            % (self.index_name, err))
+        finally:
+            log.close()
+        return num_records
+
+    def _insert(self, batch):
+        """Insert a batch of records, returns their number.
+        """
+        self.conn.executemany("INSERT INTO records VALUES (?, ?, ?, ?, ?, "
+                              "?, ?)", batch)
+        return len(batch)
+
+    def find_records(self, users=None, start_date=None, end_date=None,
+                     event_types=None, query_types=None):
+        """Find the records to read for the search criteria.
+
+        The records found are the ones matching all the criteria, the AUDIT
+        records (see AuditLogParser.header_rows) and, when searching users,
+        the records of the connections of those users and the records which
+        register them (see AuditLogParser._track_new_users_connection_id).
+        Users are matched by connection, so the records found must still be
+        checked in the order of the log.
+
+        users[in]         list of user names or None
+        start_date[in]    start date/time of the records (inclusive)
+        end_date[in]      end date/time of the records (inclusive)
+        event_types[in]   list of lower case record names or None
+        query_types[in]   list of lower case query types or None
+
+        Returns a generator of record offsets in the order of the log.
+        """
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append("timestamp >= ?")
+            params.append(start_date)
+        if end_date:
+            conditions.append("timestamp <= ?")
+            params.append(end_date)
+        if event_types:
+            conditions.append("name IN (%s)"
+                              % ", ".join(["?"] * len(event_types)))
+            params.extend(event_types)
+        if query_types:
+            mask = 0
+            for bit, qtype in enumerate(QUERY_TYPES):
+                if qtype.lower() in query_types:
+                    mask |= 1 << bit
+            conditions.append("query_types & ? != 0")
+            params.append(mask)
+
+        alternatives = ["name = 'audit'"]
+        if users:
+            user_list = ", ".join(["?"] * len(users))
+            tracking = ("(name = 'connect' AND user IN (%s)) OR "
+                        "priv_user IN (%s)" % (user_list, user_list))
+            alternatives.append(tracking)
+            params = list(users) * 2 + params
+            conditions.append("connection_id IN (SELECT connection_id FROM "
+                              "records WHERE %s)" % tracking)
+            params.extend(list(users) * 2)
+        if conditions:
+            alternatives.append(" AND ".join(conditions))
+        else:
+            alternatives.append("1")
+        query = ("SELECT offset FROM records WHERE %s ORDER BY offset"
+                 % " OR ".join(["(%s)" % cond for cond in alternatives]))
+        try:
+            for (offset,) in self.conn.execute(query, params):
+                yield offset
+        except sqlite3.Error, err:
+            raise UtilError("Cannot search the audit log index '%s': %s"
+                            % (self.index_name, err))
@@ -20,11 +20,38 @@ This file contains features to parse an audit log file, including
 searching and displaying the results.
 """
 
+import os
 import re
 
 from mysql.utilities.common.audit_log_reader import AuditLogReader
 from mysql.utilities.exception import UtilError
 
+QUERY_TYPES = ["CREATE", "ALTER", "DROP", "TRUNCATE", "RENAME", "GRANT",
+               "REVOKE", "SELECT", "INSERT", "UPDATE", "DELETE", "COMMIT",
+               "SHOW", "SET", "CALL", "PREPARE", "EXECUTE", "DEALLOCATE"]
+
+# Smallest part of the log searched by reading it instead of seeking
+_SEEK_MIN_RANGE = 64 * 1024
+
+
+def _get_raw_attribute(line, name):
+    """ Get the value of an attribute from a raw audit record line.
+
+    The value is returned as written in the log, with the special characters
+    masked. Returns None if the line has no such attribute.
+
+    line[in] line of the audit log;
+    name[in] attribute name (e.g. NAME or TIMESTAMP);
+    """
+    start = line.find(' %s="' % name)
+    if start < 0:
+        return None
+    start += len(name) + 3
+    end = line.find('"', start)
+    if end < 0:
+        return None
+    return line[start:end]
+
 
 class AuditLogParser(AuditLogReader):
     """The AuditLogParser class is used to parse the audit log file, applying
@@ -46,6 +73,26 @@ class AuditLogParser(AuditLogReader):
     def parse_log(self):
         """Parse audit log records, apply search criteria and store results.
         """
+        for row in self.iter_log():
+            self.rows.append(row)
+
+    def iter_log(self):
+        """Parse audit log records and generate the ones matching the search
+        criteria.
+
+        Most records do not match, so the event type, datetime and users
+        criteria are first checked on the raw line, without parsing its XML.
+        Records are written in time order: with a start date the log is
+        searched for the first record to read, and reading stops after the
+        end date. Only the records needed for the statistics (--stats) or to
+        track user connections are always read.
+
+        With the 'index' option, the records to read are found with the index
+        of the log instead (see AuditLogIndex).
+
+        Generator function that returns the matching records, the original
+        line with the 'raw' format or else the record dict.
+        """
 
         # Compile regexp pattern
         regexp_obj = None
@@ -55,59 +102,189 @@ class AuditLogParser(AuditLogReader):
             except:
                 raise UtilError("Invalid Pattern: " + self.options['pattern'])
 
-        # Find and store records matching search criteria
-        for record, line in self.get_next_record():
-            name = record.get("NAME")
-            name_case = name.upper()
-            # The variable matching_record is used to avoid unnecessary
-            # executions the match_* function of the remaining search criteria
-            # to check, as it suffice that one match fails to not store the
-            # records in the results. This implementation technique was applied
-            # to avoid the use of too deep nested if-else statements that will
-            # make the code more complex and difficult to read and understand,
-            # trying to optimize the execution performance.
-            matching_record = True
-            if name_case == 'AUDIT':
-                # Store audit start record
-                self.header_rows.append(record)
-
-            # Apply filters and search criteria
-            if self.options['users']:
-                self._track_new_users_connection_id(record, name_case)
-                #Check if record matches users search criteria
-                if not self.match_users(record):
-                    matching_record = False
-
-            # Check if record matches event type criteria
-            if (matching_record and self.options['event_type']
-                and not self.match_event_type(record,
-                                              self.options['event_type'])):
-                matching_record = False
+        users = self.options['users']
+        event_types = self.options['event_type']
+        start_date = self.options['start_date']
+        end_date = self.options['end_date']
+        raw_format = self.options['format'] == 'raw'
+        stats = self.options.get('stats', False)
+        if self.options.get('index', False):
+            for line in self._iter_indexed_lines():
+                record = self._parse_line(line)
+                if record is not None and self._match_record(record,
+                                                             regexp_obj):
+                    if raw_format:
+                        yield line
+                    else:
+                        yield record
+            return
+        if start_date and not users and not stats:
+            self._seek_datetime(start_date)
+
+        connection_ids = set()
+        for line in self.log:
+            name = _get_raw_attribute(line, 'NAME')
+            if (name is not None and name.upper() != 'AUDIT'
+                and line.rstrip().endswith('/>')
+                and not (users and self._is_user_connect(line, name))):
+                # Record which is not needed whatever its values: check the
+                # criteria on the raw line
+                timestamp = _get_raw_attribute(line, 'TIMESTAMP')
+                if end_date and timestamp and end_date < timestamp:
+                    if stats:
+                        continue
+                    break
+                if event_types and name.lower() not in event_types:
+                    continue
+                if start_date and (not timestamp or timestamp < start_date):
+                    continue
+                if users:
+                    connection_id = _get_raw_attribute(line, 'CONNECTION_ID')
+                    if (connection_id is not None
+                        and '&' not in connection_id
+                        and connection_id not in connection_ids):
+                        continue
+
+            record = self._parse_line(line)
+            if record is None:
+                continue
+            num_connections = len(self.connection_ids)
+            matching_record = self._match_record(record, regexp_obj)
+            if len(self.connection_ids) > num_connections:
+                connection_ids.add(self.connection_ids[-1][2])
+
+            # Generate record (i.e., survived defined filters)
+            if matching_record:
+                if raw_format:
+                    yield line
+                else:
+                    yield record
 
-            # Check if record matches datetime range criteria
-            if (matching_record
-                and not self.match_datetime_range(record,
-                                                  self.options['start_date'],
-                                                  self.options['end_date'])):
-                matching_record = False
+    def _iter_indexed_lines(self):
+        """ Read the records found with the index of the log.
 
-            # Check if record matches query type criteria
-            if (matching_record and self.options['query_type']
-                and not self.match_query_type(record,
-                                              self.options['query_type'])):
-                matching_record = False
+        The index (see AuditLogIndex) is first updated with the records
+        appended to the log since the last search.
+
+        Generator function that returns the lines of the records which can
+        match the search criteria, in the order of the log.
+        """
+        # Imported here, the index is optional and needs sqlite3
+        from mysql.utilities.common.audit_log_index import AuditLogIndex
+
+        index = AuditLogIndex(self.log_name,
+                              self.options.get('index_name', None))
+        index.open()
+        try:
+            index.update(self._parse_line)
+            for offset in index.find_records(self.options['users'],
+                                             self.options['start_date'],
+                                             self.options['end_date'],
+                                             self.options['event_type'],
+                                             self.options['query_type']):
+                self.log.seek(offset)
+                yield self.log.readline()
+        finally:
+            index.close()
+
+    def _is_user_connect(self, line, name):
+        """ Check if a raw record line can register a connection of the
+        searched users (see _track_new_users_connection_id).
+        """
+        user = _get_raw_attribute(line, 'USER')
+        priv_user = _get_raw_attribute(line, 'PRIV_USER')
+        for value in (user, priv_user):
+            if value and '&' in value:
+                # Masked characters, let the XML parser decide
+                return True
+        return bool((name.upper() == "CONNECT" and user and
+                     user in self.options['users']) or
+                    (priv_user and priv_user in self.options['users']))
+
+    def _seek_datetime(self, start_date):
+        """ Move to the part of the log with records from start_date.
 
-            # Search attributes values for matching pattern
-            if (matching_record and regexp_obj
-                and not self.match_pattern(record, regexp_obj)):
+        Binary search on the log, which is written in time order. The
+        position reached is before the first record at start_date or later.
+
+        start_date[in] start date/time of the records;
+        """
+        self.log.seek(0, os.SEEK_END)
+        low = 0
+        high = self.log.tell()
+        while high - low > _SEEK_MIN_RANGE:
+            middle = (low + high) // 2
+            self.log.seek(middle)
+            # Skip the end of the line sought in
+            self.log.readline()
+            timestamp = None
+            while timestamp is None:
+                line = self.log.readline()
+                if not line:
+                    break
+                timestamp = _get_raw_attribute(line, 'TIMESTAMP')
+            if timestamp is None or timestamp >= start_date:
+                high = middle
+            else:
+                low = middle
+        self.log.seek(low)
+        if low:
+            self.log.readline()
+
+    def _match_record(self, record, regexp_obj):
+        """ Apply the search criteria to a record.
+
+        Returns True if the record matches all the search criteria.
+
+        record[in] audit log record to check;
+        regexp_obj[in] compiled regular expression object or None;
+        """
+        name = record.get("NAME")
+        name_case = name.upper()
+        # The variable matching_record is used to avoid unnecessary
+        # executions the match_* function of the remaining search criteria
+        # to check, as it suffice that one match fails to not store the
+        # records in the results. This implementation technique was applied
+        # to avoid the use of too deep nested if-else statements that will
+        # make the code more complex and difficult to read and understand,
+        # trying to optimize the execution performance.
+        matching_record = True
+        if name_case == 'AUDIT':
+            # Store audit start record
+            self.header_rows.append(record)
+
+        # Apply filters and search criteria
+        if self.options['users']:
+            self._track_new_users_connection_id(record, name_case)
+            #Check if record matches users search criteria
+            if not self.match_users(record):
                 matching_record = False
 
-            # Store record into resulting rows (i.e., survived defined filters)
-            if matching_record:
-                if self.options['format'] == 'raw':
-                    self.rows.append(line)
-                else:
-                    self.rows.append(record)
+        # Check if record matches event type criteria
+        if (matching_record and self.options['event_type']
+            and not self.match_event_type(record,
+                                          self.options['event_type'])):
+            matching_record = False
+
+        # Check if record matches datetime range criteria
+        if (matching_record
+            and not self.match_datetime_range(record,
+                                              self.options['start_date'],
+                                              self.options['end_date'])):
+            matching_record = False
+
+        # Check if record matches query type criteria
+        if (matching_record and self.options['query_type']
+            and not self.match_query_type(record,
+                                          self.options['query_type'])):
+            matching_record = False
+
+        # Search attributes values for matching pattern
+        if (matching_record and regexp_obj
+            and not self.match_pattern(record, regexp_obj)):
+            matching_record = False
+
+        return matching_record
 
     def retrieve_rows(self):
         """ Retrieve the resulting entries from the log parsing process
@@ -20,7 +20,10 @@ This file contains the methods for reading the audit log.
 """
 
 import os
-import xml.etree.ElementTree as xml
+try:
+    import xml.etree.cElementTree as xml
+except ImportError:
+    import xml.etree.ElementTree as xml
 from mysql.utilities.exception import UtilError
 
 _MANDATORY_FIELDS = ['NAME', 'TIMESTAMP']
@@ -85,17 +88,31 @@ class AuditLogReader(object):
         the original record.
         """
         for line in self.log:
-            try:
-                yield (self._make_record(xml.fromstring(line)), line)
-            except xml.ParseError:
-                if not self._validXML(line):
-                    raise UtilError("Malformed XML - Cannot parse log file: "
-                                    + "'%s'\nInvalid XML element: %r"
-                                    % (self.log_name, line))
+            record = self._parse_line(line)
+            if record is not None:
+                yield (record, line)
+
+    def _parse_line(self, line):
+        """Parse a line of the audit log.
+
+        Returns the formated record dict, or None for the XML elements
+        around the audit records.
+        """
+        try:
+            return self._make_record(xml.fromstring(line))
+        except xml.ParseError:
+            if not self._validXML(line):
+                raise UtilError("Malformed XML - Cannot parse log file: "
+                                + "'%s'\nInvalid XML element: %r"
+                                % (self.log_name, line))
+        return None
 
     def _do_replacements(self, old_str):
         """Replace special masked characters.
         """
+        if '&' not in old_str:
+            # Nothing masked, the common case
+            return old_str
         new_str = old_str.replace("&lt;", "<")
         new_str = new_str.replace("&gt;", ">")
         new_str = new_str.replace("&quot;", '"')
@@ -0,0 +1,339 @@
+#
+# Copyright (c) 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+"""
+This file contains the compressed streams of the export and import
+utilities.
+
+The streams are compressed with gzip or bz2 from the standard library, or
+with zstd if the zstandard module is installed (gzip is used otherwise).
+The SHA-256 checksum of the bytes written or read is computed as the data
+streams, so the files can be checked without being read again.
+"""
+
+import bz2
+import hashlib
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from mysql.utilities.exception import UtilError
+
+COMPRESSION_TYPES = ("gzip", "bz2", "zstd")
+
+_EXTENSIONS = {
+    "gzip" : ".gz",
+    "bz2"  : ".bz2",
+    "zstd" : ".zst",
+}
+
+# First bytes of the compressed files
+_MAGIC_NUMBERS = (
+    ("\x1f\x8b", "gzip"),
+    ("BZh", "bz2"),
+    ("\x28\xb5\x2f\xfd", "zstd"),
+)
+
+# Data compressed at once by CompressedWriter, and read at once by
+# DecompressedReader
+_CHUNK_SIZE = 256 * 1024
+
+# zlib window bits for the gzip format
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def get_compression(compression):
+    """Get the compression available for a compression type
+
+    compression[in]    compression type (see COMPRESSION_TYPES) or None
+
+    Returns string - the compression type, gzip for zstd if the zstandard
+                     module is not installed
+    """
+    if compression == "zstd" and zstandard is None:
+        return "gzip"
+    return compression
+
+
+def get_file_extension(compression):
+    """Get the file name extension of a compression type
+
+    compression[in]    compression type (see COMPRESSION_TYPES) or None
+
+    Returns string - the extension (e.g. '.gz'), empty if not compressed
+    """
+    return _EXTENSIONS.get(compression, "")
+
+
+def _get_compressor(compression):
+    """Get a compressor object (with compress() and flush() methods)
+    """
+    if compression == "gzip":
+        return zlib.compressobj(6, zlib.DEFLATED, _GZIP_WBITS)
+    if compression == "bz2":
+        return bz2.BZ2Compressor()
+    if compression == "zstd":
+        return zstandard.ZstdCompressor().compressobj()
+    raise UtilError("Unknown compression type: %s." % compression)
+
+
+def _get_decompressor(compression):
+    """Get a decompressor object (with decompress() and unused_data)
+    """
+    if compression == "gzip":
+        return zlib.decompressobj(_GZIP_WBITS)
+    if compression == "bz2":
+        return bz2.BZ2Decompressor()
+    if compression == "zstd":
+        if zstandard is None:
+            raise UtilError("The zstandard module is needed to read zstd "
+                            "compressed files.")
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise UtilError("Unknown compression type: %s." % compression)
+
+
+class CompressedWriter(object):
+    """File writing a compressed stream to another file
+
+    The data written is buffered and compressed in chunks. The checksum is
+    the one of the bytes written to the underlying file, i.e. of the
+    compressed file.
+    """
+
+    def __init__(self, file, compression=None, close_file=True):
+        """Constructor
+
+        file[in]           file to write to (e.g. sys.stdout), opened in
+                           binary mode
+        compression[in]    compression type (see COMPRESSION_TYPES), None
+                           to only compute the checksum
+        close_file[in]     if False, close() does not close the file
+        """
+        self.file = file
+        self.name = getattr(file, "name", None)
+        self.compression = compression
+        self.close_file = close_file
+        self.closed = False
+        self.softspace = 0  # Used by the print statement
+        self.compressor = None
+        if compression is not None:
+            self.compressor = _get_compressor(compression)
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.buffer = []
+        self.buffer_size = 0
+
+    def write(self, data):
+        """Write data, compressed with the data buffered in chunks
+        """
+        self.buffer.append(data)
+        self.buffer_size += len(data)
+        if self.buffer_size >= _CHUNK_SIZE:
+            self._write_buffer()
+
+    def writelines(self, lines):
+        """Write a sequence of strings
+        """
+        for line in lines:
+            self.write(line)
+
+    def _write_buffer(self):
+        """Compress the data buffered and write it
+        """
+        data = "".join(self.buffer)
+        self.buffer = []
+        self.buffer_size = 0
+        if self.compressor is not None:
+            data = self.compressor.compress(data)
+        self._write_file(data)
+
+    def _write_file(self, data):
+        """Write data to the underlying file
+        """
+        if data:
+            self.sha256.update(data)
+            self.size += len(data)
+            self.file.write(data)
+
+    def flush(self):
+        """Write the data buffered
+
+        The compressor may still hold some data, it is written on close().
+        """
+        self._write_buffer()
+        self.file.flush()
+
+    def close(self):
+        """End the compressed stream and close the file
+        """
+        if self.closed:
+            return
+        self._write_buffer()
+        if self.compressor is not None:
+            self._write_file(self.compressor.flush())
+        self.closed = True
+        if self.close_file:
+            self.file.close()
+        else:
+            self.file.flush()
+
+    def checksum(self):
+        """Returns string - hexadecimal SHA-256 of the bytes written
+        """
+        return self.sha256.hexdigest()
+
+
+def detect_compression(file_name):
+    """Detect the compression of a file from its first bytes
+
+    file_name[in]      name (and path) of the file
+
+    Returns string - the compression type or None if not compressed
+    """
+    magic_file = open(file_name, "rb")
+    try:
+        head = magic_file.read(4)
+    finally:
+        magic_file.close()
+    for magic, compression in _MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+class DecompressedReader(object):
+    """File reading the lines of a compressed file
+
+    The file is decompressed as it is read, without a decompressed copy.
+    The checksum is the one of the bytes read from the file, i.e. of the
+    compressed file, once all the file is read.
+    """
+
+    def __init__(self, file_name, compression=None):
+        """Constructor
+
+        file_name[in]      name (and path) of the file
+        compression[in]    compression type (see COMPRESSION_TYPES), None
+                           to only compute the checksum
+        """
+        self.name = file_name
+        self.compression = compression
+        self.file = None
+        self.lines = None
+        self.seek(0)
+
+    def seek(self, offset):
+        """Read the file again from the start (the only offset supported)
+        """
+        if offset != 0:
+            raise UtilError("Cannot seek in the compressed file %s."
+                            % self.name)
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.name, "rb")
+        self.sha256 = hashlib.sha256()
+        self.eof = False
+        self.lines = self._read_lines()
+
+    def _read_chunks(self):
+        """Read and decompress the file
+
+        Returns (yield) the decompressed data
+        """
+        decompressor = None
+        if self.compression is not None:
+            decompressor = _get_decompressor(self.compression)
+        while True:
+            data = self.file.read(_CHUNK_SIZE)
+            if not data:
+                break
+            self.sha256.update(data)
+            if decompressor is None:
+                yield data
+                continue
+            while data:
+                yield decompressor.decompress(data)
+                # Files like concatenated gzip files have several streams
+                data = getattr(decompressor, "unused_data", "")
+                if data:
+                    decompressor = _get_decompressor(self.compression)
+        self.eof = True
+
+    def _read_lines(self):
+        """Split the decompressed data in lines
+
+        Returns (yield) lines, ending with the new line character but the
+        last one
+        """
+        pending = ""
+        for data in self._read_chunks():
+            if not data:
+                continue
+            lines = (pending + data).split("\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line + "\n"
+        if pending:
+            yield pending
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        """Returns the next line
+        """
+        return self.lines.next()
+
+    def readline(self):
+        """Returns the next line, empty at the end of the file
+        """
+        try:
+            return self.lines.next()
+        except StopIteration:
+            return ""
+
+    def close(self):
+        """Close the file
+        """
+        self.file.close()
+
+    def checksum(self):
+        """Returns string - hexadecimal SHA-256 of the file, None if it is
+                            not read completely
+        """
+        if not self.eof:
+            return None
+        return self.sha256.hexdigest()
+
+
+def open_compressed(file_name, checksum=False):
+    """Open a file which may be compressed for reading its lines
+
+    file_name[in]      name (and path) of the file
+    checksum[in]       if True, compute the checksum of the file as it is
+                       read, also if it is not compressed
+
+    Returns a file object, a DecompressedReader if the file is compressed
+    or for a checksum
+    """
+    compression = detect_compression(file_name)
+    if compression is None and not checksum:
+        return open(file_name)
+    return DecompressedReader(file_name, compression)
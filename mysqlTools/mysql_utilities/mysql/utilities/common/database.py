@@ -501,7 +501,8 @@ class Database(object):
                 grant_msg_displayed = True
 
 
-    def copy_data(self, new_db, options, new_server=None, connections=1):
+    def copy_data(self, new_db, options, new_server=None, connections=1,
+                  parallel_copy=None):
         """Copy the data for the tables.
 
         This method will copy the data for all of the tables to another, new
@@ -513,6 +514,9 @@ class Database(object):
         new_server[in]     Connection to another server for copying the db
                            Default is None (copy to same server - clone)
         connections[in]    Number of threads(connections) to use for insert
+        parallel_copy[in]  ParallelCopy instance copying the tables of
+                           several databases, finished by the caller
+                           Default is None (started here if connections > 1)
         """
 
         from mysql.utilities.common.table import Table
@@ -541,6 +545,21 @@ class Database(object):
             'quiet'    : quiet
         }
 
+        # Copy the tables at the same time with several connections
+        copy = parallel_copy
+        if copy is None and not self.cloning and int(connections) > 1:
+            from mysql.utilities.common.parallel_copy import ParallelCopy
+
+            # The workers read their own consistent snapshot with the
+            # default locking, else the source tables directly
+            locking = options.get("locking", "snapshot")
+            snapshot_source = None
+            if locking == "snapshot":
+                snapshot_source = self.source
+            copy = ParallelCopy(int(connections), quiet,
+                                locking in ("lock-all", "no-locks"),
+                                snapshot_source)
+
         table_names = [obj[0] for obj in self.get_db_objects(_TABLE)]
         for tblname in table_names:
             if not quiet:
@@ -552,7 +571,13 @@ class Database(object):
             if tbl is None:
                 raise UtilDBError("Cannot create table object before copy.",
                                   -1, self.db_name)
-            tbl.copy_data(self.destination, self.cloning, new_db, connections)
+            if copy is not None:
+                copy.copy_table(tbl, self.destination, new_db)
+            else:
+                tbl.copy_data(self.destination, self.cloning, new_db,
+                              connections)
+        if copy is not None and parallel_copy is None:
+            copy.finish()
 
 
     def get_create_statement(self, db, name, obj_type):
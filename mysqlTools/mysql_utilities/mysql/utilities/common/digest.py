@@ -0,0 +1,751 @@
+#
+# Copyright (c) 2011, 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""Module with a query digest for the General and Slow Query Log parsers.
+
+Queries are reduced to a fingerprint (literals replaced by '?', IN and
+VALUES lists collapsed, comments removed, whitespace folded, lower case)
+and statistics are aggregated per fingerprint.
+"""
+
+import re
+import math
+import hashlib
+
+from collections import Counter, deque
+
+from mysql.utilities.exception import UtilError
+from mysql.utilities.common.parser import SlowQueryRecord
+
+# Statements the Slow Query Log writes in front of the query
+_SLOW_PREAMBLE_CRE = re.compile(
+    r"\A(?:\s*(?:use\s+[^;]+|SET\s+(?:timestamp|insert_id|last_insert_id)"
+    r"\s*=\s*\d+)\s*;)+", re.I)
+
+# Group 1 matches comments, group 2 literals (strings, numbers, NULL)
+_LITERAL_CRE = re.compile(
+    r"(/\*.*?\*/|(?:--\s|#)[^\n]*)"
+    r"|('(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\""
+    r"|\b0x[0-9a-f]+\b|\b\d+(?:\.\d*)?(?:e[-+]?\d+)?\b|\B\.\d+\b|\bnull\b)",
+    re.I | re.S)
+_IN_LIST_CRE = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_LIST_CRE = re.compile(r"\b(values?)\s*\(\s*\?(?:\s*,\s*\?)*\s*\)"
+                              r"(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+_SPACES_CRE = re.compile(r"\s+")
+_ADMIN_COMMAND_CRE = re.compile(r"#\s*administrator command:\s*(.*?);?\s*\Z",
+                                re.I)
+
+# Log-scale histogram buckets: upper bounds grow by 5% from one microsecond
+_HIST_BASE = 1.05
+_HIST_MIN = 0.000001
+
+# Fields the digest can be ordered by, see QueryStats.get_value()
+ORDER_BY = ('count', 'total_time', 'avg_time', 'p95_time', 'max_time',
+            'lock_time', 'rows_examined', 'rows_sent')
+
+# Report columns of QueryDigest.get_rows()
+REPORT_COLUMNS = ('rank', 'digest', 'count', 'total_time', 'avg_time',
+                  'p95_time', 'max_time', 'avg_lock_time', 'avg_rows_sent',
+                  'avg_rows_examined', 'examined_per_sent', 'first_seen',
+                  'last_seen', 'users', 'hosts', 'databases', 'fingerprint')
+
+# Sliding windows of SlidingDigest in seconds: 1, 5 and 15 minutes
+WINDOWS = (60, 300, 900)
+
+# Fields a SlidingDigest window can be ordered by
+WINDOW_ORDER_BY = ('count', 'total_time', 'avg_time', 'p95_time')
+
+# Report columns of SlidingDigest.get_rows()
+WINDOW_COLUMNS = ('rank', 'digest', 'count', 'qps', 'total_time',
+                  'avg_time', 'p95_time', 'fingerprint')
+
+# General Query Log commands carrying a query
+_GENERAL_QUERY_COMMANDS = ('Query', 'Execute')
+
+
+def _replace_literal(match):
+    """Replace a comment by a space and a literal by a placeholder
+    """
+    if match.group(1) is not None:
+        return ' '
+    return '?'
+
+
+def _database_name(database):
+    """Return the database name without the ';' of 'use db;'
+    """
+    if database:
+        # The Slow Query Log parser keeps the ';' of 'use db;'
+        return database.rstrip(';')
+    return database
+
+
+def _entry_times(entry):
+    """Return the query and lock time of an entry in seconds
+
+    Returns a tuple of floats, or None for entries without timing.
+    """
+    query_time = getattr(entry, 'query_time', None)
+    if query_time is None:
+        return None
+    if isinstance(entry, SlowQueryRecord):
+        # Float microseconds
+        return query_time / 1000000.0, (entry.lock_time or 0) / 1000000.0
+    return float(query_time), float(entry.lock_time or 0)
+
+
+def fingerprint(query):
+    """Reduce a query to its fingerprint
+
+    query[in]       a string, for example entry['query'] of a
+                    SlowQueryLogEntry
+
+    Leading 'use db;' and 'SET timestamp=N;' statements written by the
+    Slow Query Log are dropped and '# administrator command: X;' becomes
+    'administrator command: x'. Otherwise comments are removed, strings,
+    numbers and NULL become '?', IN (...) and VALUES (...),(...) lists
+    collapse to '(?+)', whitespace is folded and the result is lower case.
+    Queries differing only in their literals share the fingerprint.
+
+    Returns a string.
+    """
+    query = _SLOW_PREAMBLE_CRE.sub('', query).strip()
+    admin = _ADMIN_COMMAND_CRE.match(query)
+    if admin is not None:
+        return "administrator command: " + admin.group(1).lower()
+    query = _LITERAL_CRE.sub(_replace_literal, query)
+    query = _SPACES_CRE.sub(' ', query).strip().rstrip(';').strip().lower()
+    query = _IN_LIST_CRE.sub('in(?+)', query)
+    query = _VALUES_LIST_CRE.sub(r'\1(?+)', query)
+    return query
+
+
+def fingerprint_id(query_fingerprint):
+    """Return a short checksum identifying a fingerprint
+
+    query_fingerprint[in]   a string, result of fingerprint()
+
+    Returns a hexadecimal string of 16 characters.
+    """
+    return hashlib.md5(query_fingerprint).hexdigest()[:16].upper()
+
+
+class LogHistogram(object):
+    """Sparse histogram with logarithmic buckets
+
+    Keeps one counter per 5% wide bucket which is used, so memory does not
+    grow with the number of values. Percentiles are returned as the upper
+    bound of the bucket, within 5% of the exact value.
+    """
+    def __init__(self):
+        """Constructor
+        """
+        self.buckets = Counter()
+        self.count = 0
+
+    def add(self, value):
+        """Add a value
+
+        value[in]       a float greater or equal to 0
+        """
+        if value <= _HIST_MIN:
+            index = 0
+        else:
+            index = int(math.ceil(math.log(value / _HIST_MIN, _HIST_BASE)))
+        self.buckets[index] += 1
+        self.count += 1
+
+    def percentile(self, percent):
+        """Return the value below which percent of the values fall
+
+        percent[in]     a number between 0 and 100
+
+        Returns a float or None when no value was added.
+        """
+        if not self.count:
+            return None
+        rank = max(int(math.ceil(self.count * percent / 100.0)), 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                break
+        return _HIST_MIN * (_HIST_BASE ** index)
+
+    def merge(self, other):
+        """Add the values of another histogram
+
+        other[in]       a LogHistogram-instance
+        """
+        self.buckets.update(other.buckets)
+        self.count += other.count
+
+    def subtract(self, other):
+        """Remove the values of another histogram added before
+
+        other[in]       a LogHistogram-instance
+        """
+        for index, count in other.buckets.iteritems():
+            left = self.buckets[index] - count
+            if left > 0:
+                self.buckets[index] = left
+            else:
+                del self.buckets[index]
+        self.count -= other.count
+
+
+class QueryStats(object):
+    """Statistics of all queries sharing a fingerprint
+    """
+    def __init__(self, query_fingerprint, sample):
+        """Constructor
+
+        query_fingerprint[in]   a string, result of fingerprint()
+        sample[in]              the first query seen with this fingerprint
+        """
+        self.fingerprint = query_fingerprint
+        self.sample = sample
+        self.count = 0
+        self.query_time = 0.0
+        self.max_query_time = 0.0
+        self.lock_time = 0.0
+        self.max_lock_time = 0.0
+        self.rows_sent = 0
+        self.rows_examined = 0
+        self.timed = 0
+        self.histogram = LogHistogram()
+        self.first_seen = None
+        self.last_seen = None
+        self.users = Counter()
+        self.hosts = Counter()
+        self.databases = Counter()
+
+    def add(self, entry):
+        """Add a log entry
+
+        entry[in]       a GeneralQueryLogEntry, SlowQueryLogEntry or
+                        SlowQueryRecord
+        """
+        self.count += 1
+        times = _entry_times(entry)
+        if times is not None:
+            query_time, lock_time = times
+            self.timed += 1
+            self.query_time += query_time
+            self.lock_time += lock_time
+            self.max_query_time = max(self.max_query_time, query_time)
+            self.max_lock_time = max(self.max_lock_time, lock_time)
+            self.rows_sent += entry.rows_sent or 0
+            self.rows_examined += entry.rows_examined or 0
+            self.histogram.add(query_time)
+        seen = entry.datetime
+        if seen is not None:
+            if self.first_seen is None or seen < self.first_seen:
+                self.first_seen = seen
+            if self.last_seen is None or seen > self.last_seen:
+                self.last_seen = seen
+        self.users[entry.user] += 1
+        self.hosts[entry.host] += 1
+        self.databases[_database_name(entry.database)] += 1
+
+    def merge(self, other):
+        """Add the statistics of another QueryStats with the same fingerprint
+
+        other[in]       a QueryStats-instance
+        """
+        self.count += other.count
+        self.query_time += other.query_time
+        self.max_query_time = max(self.max_query_time, other.max_query_time)
+        self.lock_time += other.lock_time
+        self.max_lock_time = max(self.max_lock_time, other.max_lock_time)
+        self.rows_sent += other.rows_sent
+        self.rows_examined += other.rows_examined
+        self.timed += other.timed
+        self.histogram.merge(other.histogram)
+        if other.first_seen is not None:
+            if self.first_seen is None or other.first_seen < self.first_seen:
+                self.first_seen = other.first_seen
+        if other.last_seen is not None:
+            if self.last_seen is None or other.last_seen > self.last_seen:
+                self.last_seen = other.last_seen
+        self.users.update(other.users)
+        self.hosts.update(other.hosts)
+        self.databases.update(other.databases)
+
+    def replace_values(self, replace):
+        """Replace the users, hosts and databases counted
+
+        replace[in]     function returning the value to count instead of
+                        the value it is called with
+        """
+        for name in ('users', 'hosts', 'databases'):
+            replaced = Counter()
+            for value, count in getattr(self, name).iteritems():
+                value = replace(value)
+                if name == 'databases':
+                    value = _database_name(value)
+                replaced[value] += count
+            setattr(self, name, replaced)
+
+    def get_value(self, order_by):
+        """Return the value used to order fingerprints
+
+        order_by[in]    one of ORDER_BY
+
+        Returns a number.
+        """
+        timed = self.timed or 1
+        if order_by == 'count':
+            return self.count
+        elif order_by == 'total_time':
+            return self.query_time
+        elif order_by == 'avg_time':
+            return self.query_time / timed
+        elif order_by == 'p95_time':
+            return self.histogram.percentile(95) or 0.0
+        elif order_by == 'max_time':
+            return self.max_query_time
+        elif order_by == 'lock_time':
+            return self.lock_time
+        elif order_by == 'rows_examined':
+            return self.rows_examined
+        elif order_by == 'rows_sent':
+            return self.rows_sent
+        raise UtilError("Unknown digest order: %s" % order_by)
+
+
+def _format_breakdown(counter, top=3):
+    """Format the most common values of a Counter as 'value:count,...'
+    """
+    return ','.join(["%s:%d" % (value, count)
+                     for value, count in counter.most_common(top)])
+
+
+class QueryDigest(object):
+    """Aggregate General or Slow Query Log entries per fingerprint
+
+    The number of fingerprints kept is bounded: once twice max_fingerprints
+    are tracked, only the max_fingerprints with the highest total query
+    time (then count) are kept. Counts of a fingerprint seen again after
+    being dropped can be under-estimated by at most max_dropped_count.
+
+    For example, to report the ten queries taking most time:
+
+        digest = QueryDigest()
+        digest.add_log(SlowQueryLog(open("/var/lib/mysql/slow.log")))
+        columns, rows = digest.get_rows(10, 'total_time')
+
+    Digests of parts of a log can be combined with merge(), see the
+    parallel_log module.
+    """
+    def __init__(self, max_fingerprints=10000):
+        """Constructor
+
+        max_fingerprints[in]    fingerprints kept at least, memory bound
+        """
+        self.max_fingerprints = max_fingerprints
+        self.stats = {}
+        self.entries = 0
+        self.dropped_entries = 0
+        self.dropped_fingerprints = 0
+        self.max_dropped_count = 0
+        self._fingerprints = {}
+
+    def __getstate__(self):
+        """Pickle the digest without the fingerprint cache
+        """
+        state = self.__dict__.copy()
+        state['_fingerprints'] = {}
+        return state
+
+    def add_query(self, query, entry):
+        """Add a query
+
+        query[in]       the query string
+        entry[in]       the log entry the query comes from
+
+        Returns the fingerprint of the query.
+        """
+        # Logs repeat the exact same text often (prepared statements,
+        # polling), so the text => fingerprint map is reset with the stats.
+        query_fingerprint = self._fingerprints.get(query)
+        if query_fingerprint is None:
+            query_fingerprint = fingerprint(query)
+            if len(self._fingerprints) < self.max_fingerprints:
+                self._fingerprints[query] = query_fingerprint
+        stats = self.stats.get(query_fingerprint)
+        if stats is None:
+            if len(self.stats) >= 2 * self.max_fingerprints:
+                self._prune()
+            stats = self.stats[query_fingerprint] = QueryStats(
+                query_fingerprint, query)
+        stats.add(entry)
+        self.entries += 1
+        return query_fingerprint
+
+    def add_entry(self, entry):
+        """Add a log entry
+
+        entry[in]       a GeneralQueryLogEntry, SlowQueryLogEntry or
+                        SlowQueryRecord
+
+        General Query Log entries other than Query and Execute are ignored.
+
+        Returns the fingerprint of the query or None if the entry was not
+        added.
+        """
+        if isinstance(entry, SlowQueryRecord):
+            query = entry.query
+        elif 'query' in entry:
+            query = entry['query']
+        elif entry['command'] in _GENERAL_QUERY_COMMANDS:
+            query = entry['argument']
+        else:
+            return None
+        if not query:
+            return None
+        return self.add_query(query, entry)
+
+    def add_log(self, log):
+        """Add all entries of a log
+
+        log[in]         a GeneralQueryLog, SlowQueryLog or
+                        SlowQueryLogReader instance, or any iterable of
+                        log entries
+        """
+        add_entry = self.add_entry
+        for entry in log:
+            add_entry(entry)
+
+    def _prune(self):
+        """Keep the max_fingerprints fingerprints with most query time
+        """
+        ranked = sorted(self.stats.itervalues(),
+                        key=lambda stats: (stats.query_time, stats.count),
+                        reverse=True)
+        for stats in ranked[self.max_fingerprints:]:
+            del self.stats[stats.fingerprint]
+            self.dropped_entries += stats.count
+            self.dropped_fingerprints += 1
+            self.max_dropped_count = max(self.max_dropped_count, stats.count)
+        self._fingerprints = {}
+
+    def merge(self, other):
+        """Add the statistics of another QueryDigest
+
+        other[in]       a QueryDigest-instance, for example the digest of
+                        another part of the same log
+
+        The QueryStats of other are reused, other should not be used
+        afterwards. Counts of dropped fingerprints add up, so
+        max_dropped_count stays an upper bound.
+        """
+        for query_fingerprint, other_stats in other.stats.iteritems():
+            stats = self.stats.get(query_fingerprint)
+            if stats is None:
+                if len(self.stats) >= 2 * self.max_fingerprints:
+                    self._prune()
+                self.stats[query_fingerprint] = other_stats
+            else:
+                stats.merge(other_stats)
+        self.entries += other.entries
+        self.dropped_entries += other.dropped_entries
+        self.dropped_fingerprints += other.dropped_fingerprints
+        self.max_dropped_count += other.max_dropped_count
+
+    def replace_values(self, replace):
+        """Replace the users, hosts and databases counted
+
+        replace[in]     function returning the value to count instead of
+                        the value it is called with
+        """
+        for stats in self.stats.itervalues():
+            stats.replace_values(replace)
+
+    def top(self, num=10, order_by='total_time'):
+        """Return the QueryStats with the highest value
+
+        num[in]         number of fingerprints to return, all when None
+        order_by[in]    one of ORDER_BY
+
+        Returns a list of QueryStats.
+        """
+        if order_by not in ORDER_BY:
+            raise UtilError("Unknown digest order: %s. Supported values: %s"
+                            % (order_by, ", ".join(ORDER_BY)))
+        ranked = sorted(self.stats.itervalues(),
+                        key=lambda stats: (stats.get_value(order_by),
+                                           stats.count),
+                        reverse=True)
+        if num is None:
+            return ranked
+        return ranked[:num]
+
+    def get_rows(self, num=10, order_by='total_time'):
+        """Return the report of the top fingerprints
+
+        num[in]         number of fingerprints to report
+        order_by[in]    one of ORDER_BY
+
+        Returns a tuple (columns, rows) suitable for format.print_list().
+        """
+        rows = []
+        for rank, stats in enumerate(self.top(num, order_by)):
+            row = [rank + 1, fingerprint_id(stats.fingerprint), stats.count]
+            if stats.timed:
+                timed = stats.timed
+                p95 = min(stats.histogram.percentile(95),
+                          stats.max_query_time)
+                if stats.rows_sent:
+                    examined_per_sent = "%.1f" % (float(stats.rows_examined)
+                                                  / stats.rows_sent)
+                else:
+                    examined_per_sent = None
+                row.extend([
+                    "%.6f" % stats.query_time,
+                    "%.6f" % (stats.query_time / timed),
+                    "%.6f" % p95,
+                    "%.6f" % stats.max_query_time,
+                    "%.6f" % (stats.lock_time / timed),
+                    "%.1f" % (float(stats.rows_sent) / timed),
+                    "%.1f" % (float(stats.rows_examined) / timed),
+                    examined_per_sent,
+                ])
+            else:
+                # General Query Log entries carry no timing
+                row.extend([None] * 8)
+            row.extend([
+                stats.first_seen,
+                stats.last_seen,
+                _format_breakdown(stats.users),
+                _format_breakdown(stats.hosts),
+                _format_breakdown(stats.databases),
+                stats.fingerprint,
+            ])
+            rows.append(tuple(row))
+        return REPORT_COLUMNS, rows
+
+
+class WindowStats(object):
+    """Count, time and latency histogram of a fingerprint in a time slot
+    """
+    __slots__ = ('count', 'timed', 'query_time', 'histogram')
+
+    def __init__(self):
+        """Constructor
+        """
+        self.count = 0
+        self.timed = 0
+        self.query_time = 0.0
+        self.histogram = LogHistogram()
+
+    def add(self, query_time):
+        """Add a query, query_time is None for General Query Log entries
+        """
+        self.count += 1
+        if query_time is not None:
+            self.timed += 1
+            self.query_time += query_time
+            self.histogram.add(query_time)
+
+    def merge(self, other):
+        """Add the statistics of another WindowStats
+        """
+        self.count += other.count
+        self.timed += other.timed
+        self.query_time += other.query_time
+        self.histogram.merge(other.histogram)
+
+    def subtract(self, other):
+        """Remove the statistics of another WindowStats added before
+        """
+        self.count -= other.count
+        self.timed -= other.timed
+        self.query_time -= other.query_time
+        self.histogram.subtract(other.histogram)
+
+    def get_value(self, order_by):
+        """Return the value used to order fingerprints
+
+        order_by[in]    one of WINDOW_ORDER_BY
+
+        Returns a number.
+        """
+        if order_by == 'count':
+            return self.count
+        elif order_by == 'total_time':
+            return self.query_time
+        elif order_by == 'avg_time':
+            return self.query_time / (self.timed or 1)
+        elif order_by == 'p95_time':
+            return self.histogram.percentile(95) or 0.0
+        raise UtilError("Unknown window order: %s" % order_by)
+
+
+class SlidingDigest(object):
+    """QueryDigest with statistics over sliding windows
+
+    Besides the QueryDigest of all entries (attribute digest), counts,
+    query time and latency histograms per fingerprint are kept over the
+    last 1, 5 and 15 minutes (see WINDOWS).
+
+    Entries are added to a time slot of slot_seconds. Every window keeps
+    the sum of its slots: adding an entry updates the sums and a slot
+    leaving a window is subtracted from it. The cost of an update depends
+    on the new entries and the expired slots, not on the window size.
+    """
+    def __init__(self, windows=WINDOWS, slot_seconds=10,
+                 max_fingerprints=10000):
+        """Constructor
+
+        windows[in]             window lengths in seconds, multiples of
+                                slot_seconds
+        slot_seconds[in]        granularity of the windows in seconds
+        max_fingerprints[in]    see QueryDigest
+        """
+        self.windows = tuple(windows)
+        self.slot_seconds = slot_seconds
+        self.digest = QueryDigest(max_fingerprints)
+        self.started = None
+        self.now = None
+        # Slots as (slot number, {fingerprint: WindowStats})
+        self._slots = deque()
+        # Per window: sums per fingerprint and index of its first slot
+        self._sums = dict([(window, {}) for window in self.windows])
+        self._first = dict([(window, 0) for window in self.windows])
+
+    def add_entry(self, entry, when):
+        """Add a log entry
+
+        entry[in]       see QueryDigest.add_entry()
+        when[in]        time of the entry in seconds since the epoch
+
+        Returns the fingerprint of the query or None if the entry was not
+        added.
+        """
+        query_fingerprint = self.digest.add_entry(entry)
+        if query_fingerprint is None:
+            return None
+        self.advance(when)
+        times = _entry_times(entry)
+        query_time = times[0] if times is not None else None
+        slot = int(when // self.slot_seconds)
+        if not self._slots or self._slots[-1][0] < slot:
+            self._slots.append((slot, {}))
+        slot_stats = self._slots[-1][1]
+        if query_fingerprint not in slot_stats:
+            slot_stats[query_fingerprint] = WindowStats()
+        slot_stats[query_fingerprint].add(query_time)
+        for sums in self._sums.itervalues():
+            if query_fingerprint not in sums:
+                sums[query_fingerprint] = WindowStats()
+            sums[query_fingerprint].add(query_time)
+        return query_fingerprint
+
+    def advance(self, now):
+        """Move the windows to now, removing the slots which left them
+
+        now[in]         time in seconds since the epoch
+        """
+        if self.started is None:
+            self.started = now
+        if self.now is not None and now <= self.now:
+            return
+        self.now = now
+        current = int(now // self.slot_seconds)
+        for window in self.windows:
+            first_slot = current - window // self.slot_seconds + 1
+            index = self._first[window]
+            sums = self._sums[window]
+            while (index < len(self._slots) and
+                   self._slots[index][0] < first_slot):
+                for query_fingerprint, stats in \
+                        self._slots[index][1].iteritems():
+                    window_stats = sums[query_fingerprint]
+                    window_stats.subtract(stats)
+                    if window_stats.count <= 0:
+                        del sums[query_fingerprint]
+                index += 1
+            self._first[window] = index
+        # Slots which left all windows
+        expired = min(self._first.values())
+        for _ in range(expired):
+            self._slots.popleft()
+        for window in self.windows:
+            self._first[window] -= expired
+
+    def top(self, window, num=10, order_by='count'):
+        """Return the fingerprints with the highest value in a window
+
+        window[in]      one of windows
+        num[in]         number of fingerprints to return, all when None
+        order_by[in]    one of WINDOW_ORDER_BY
+
+        Returns a list of tuples (fingerprint, WindowStats).
+        """
+        if order_by not in WINDOW_ORDER_BY:
+            raise UtilError("Unknown window order: %s. Supported values: %s"
+                            % (order_by, ", ".join(WINDOW_ORDER_BY)))
+        ranked = sorted(self._sums[window].iteritems(),
+                        key=lambda item: (item[1].get_value(order_by),
+                                          item[1].count),
+                        reverse=True)
+        if num is None:
+            return ranked
+        return ranked[:num]
+
+    def get_seconds(self, window):
+        """Return the seconds covered by a window
+
+        Shorter than the window until it was filled once.
+
+        Returns a float.
+        """
+        if self.now is None:
+            return float(window)
+        return float(max(min(window, self.now - self.started), 1))
+
+    def get_count(self, window):
+        """Return the number of queries in a window
+        """
+        return sum([stats.count for stats in self._sums[window].itervalues()])
+
+    def get_rows(self, window, num=10, order_by='count'):
+        """Return the report of the top fingerprints of a window
+
+        window[in]      one of windows
+        num[in]         number of fingerprints to report
+        order_by[in]    one of WINDOW_ORDER_BY
+
+        Returns a tuple (columns, rows) suitable for format.print_list().
+        """
+        seconds = self.get_seconds(window)
+        rows = []
+        for rank, (query_fingerprint, stats) in enumerate(
+                self.top(window, num, order_by)):
+            row = [rank + 1, fingerprint_id(query_fingerprint), stats.count,
+                   "%.2f" % (stats.count / seconds)]
+            if stats.timed:
+                row.extend([
+                    "%.6f" % stats.query_time,
+                    "%.6f" % (stats.query_time / stats.timed),
+                    "%.6f" % stats.histogram.percentile(95),
+                ])
+            else:
+                row.extend([None] * 3)
+            row.append(query_fingerprint)
+            rows.append(tuple(row))
+        return WINDOW_COLUMNS, rows
@@ -22,14 +22,24 @@ METHODS
     format_tabular_list - Format and write row data as a separated-value list or
                           as a grid layout like mysql client query results
                           Writes to a file specified (e.g. sys.stdout)
+    format_load_data_list - Write row data in the format read by LOAD DATA
+                            INFILE
 """
 
 import csv
 import os
+import re
 
 _MAX_WIDTH = 78
 _TWO_COLUMN_DISPLAY = "{0:{1}}  {2:{3}}"
 
+# Characters escaped with a backslash for LOAD DATA INFILE, the fields are
+# terminated by the separator or enclosed by double quotes
+_LOAD_DATA_ESCAPES = {'\\': '\\\\', '\0': '\\0', '\n': '\\n', '\r': '\\r',
+                      '\t': '\\t', '"': '\\"'}
+_LOAD_DATA_TAB_CRE = re.compile('[\\\\\0\n\r\t]')
+_LOAD_DATA_CSV_CRE = re.compile('[\\\\\0\n\r"]')
+
 def _format_col_separator(file, columns, col_widths, quiet=False):
     """Format a row of the header with column separators
 
@@ -130,6 +140,47 @@ def format_tabular_list(file, columns, rows, options={}):
             _format_col_separator(file, columns, col_widths, quiet)
 
 
+def _load_data_escape(match):
+    """Escape a character of a LOAD DATA INFILE field
+    """
+    return _LOAD_DATA_ESCAPES[match.group(0)]
+
+
+def format_load_data_list(file, rows, separator='\t'):
+    """Write a list of rows in the format read by LOAD DATA INFILE.
+
+    The fields are escaped with a backslash and NULL values are written as
+    \\N. With the tab separator the format is the default one of LOAD DATA
+    INFILE, else the fields are enclosed by double quotes (FIELDS
+    TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'). No header is written.
+
+    file[in]           file to write to
+    rows[in]           list of rows to write
+    separator[in]      field separator, tab (default) or comma
+    """
+    if separator == '\t':
+        escape_cre = _LOAD_DATA_TAB_CRE
+        enclosure = "%s"
+    else:
+        escape_cre = _LOAD_DATA_CSV_CRE
+        enclosure = '"%s"'
+    lines = []
+    for row in rows:
+        fields = []
+        for value in row:
+            if value is None:
+                fields.append("\\N")
+                continue
+            if not isinstance(value, basestring):
+                value = str(value)
+            if escape_cre.search(value):
+                value = escape_cre.sub(_load_data_escape, value)
+            fields.append(enclosure % value)
+        lines.append(separator.join(fields))
+    if lines:
+        file.write("\n".join(lines) + "\n")
+
+
 def format_vertical_list(file, columns, rows):
     """Format a list in a vertical format.
 
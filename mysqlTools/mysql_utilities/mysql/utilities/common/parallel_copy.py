@@ -0,0 +1,403 @@
+#
+# Copyright (c) 2011, 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""Module to copy the data of tables using a pool of worker processes.
+
+The rows of the tables are copied in chunks, each chunk is a task for a
+worker. A worker keeps its connections to the source and the destination
+servers for all its tasks.
+
+A table with a primary key is split in ranges of key values and the
+workers read their range from the source. With the default locking, the
+workers read the same consistent snapshot, started while the source is
+locked with FLUSH TABLES WITH READ LOCK (see start_snapshot_pool()), and
+also read the tables without a key. Otherwise the tables without a key are
+read by the caller and sent to the workers.
+
+Only a few chunks are waiting for a worker at any time, so the memory used
+does not depend on the size of the tables.
+"""
+
+import collections
+import multiprocessing
+import Queue
+import time
+
+from mysql.utilities.exception import UtilError
+from mysql.utilities.common.sql_transform import quote_with_backticks
+from mysql.utilities.common.sql_transform import is_quoted_with_backticks
+from mysql.utilities.common.table import Table
+
+# Tasks waiting for a worker, per worker
+_PENDING_PER_WORKER = 2
+
+# Consistent snapshot of the workers, see start_snapshot_pool()
+_FLUSH_TABLES_READ_LOCK = "FLUSH TABLES WITH READ LOCK"
+_SESSION_ISOLATION_LEVEL = \
+    "SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ"
+_START_TRANSACTION = "START TRANSACTION WITH CONSISTENT SNAPSHOT"
+# Seconds to wait for the workers to connect and start their snapshot
+_SNAPSHOT_TIMEOUT = 60
+
+# Connections and tables of a worker process, see _get_server()
+_servers = {}
+_tables = {}
+
+# Connections and tables of a worker process reading a snapshot, see
+# init_snapshot_worker()
+_snapshot = {}
+
+
+def _get_server(conn_val, destination):
+    """Get the connection of the worker to a server
+
+    conn_val[in]       connection values (see Table.get_dest_values())
+    destination[in]    True for the destination server, its connection
+                       does not check foreign keys
+
+    Returns a connected Server instance
+    """
+    key = (destination,) + tuple(sorted(conn_val.items()))
+    server = _servers.get(key)
+    if server is None:
+        from mysql.utilities.common.server import Server
+
+        server = Server({'conn_info': conn_val, 'role': "thread"})
+        server.connect()
+        if destination:
+            server.disable_foreign_key_checks(True)
+        _servers[key] = server
+    return server
+
+
+def _get_table(server, q_table, columns=None):
+    """Get a Table instance of the worker
+
+    server[in]         Server instance
+    q_table[in]        quoted table name (db.table)
+    columns[in]        column metadata (EXPLAIN rows), read from the server
+                       if None
+    """
+    key = (id(server), q_table)
+    tbl = _tables.get(key)
+    if tbl is None:
+        tbl = Table(server, q_table, {'quiet': True})
+        tbl.get_column_metadata(columns)
+        _tables[key] = tbl
+    return tbl
+
+
+def get_snapshot_servers(conn_val):
+    """Connect a worker reading a snapshot to the source server
+
+    A worker reads the rows in a transaction which must not be committed,
+    while reading the metadata of a table commits (see Server.exec_query()),
+    so it uses two connections.
+
+    conn_val[in]       connection values of the source server
+
+    Returns tuple (Server for the metadata, Server for the rows)
+    """
+    from mysql.utilities.common.server import Server
+
+    servers = []
+    for _ in range(2):
+        server = Server({'conn_info': conn_val, 'role': "thread"})
+        server.connect()
+        servers.append(server)
+    return tuple(servers)
+
+
+def init_snapshot_worker(conn_val, started, locked):
+    """Start the consistent snapshot of a worker process
+
+    The worker connects to the source and waits for the source to be
+    locked to start its transaction, so all the workers read the same
+    snapshot. It reports None on the started queue once connected and once
+    the transaction is started, or the error message.
+
+    conn_val[in]       connection values of the source server
+    started[in]        multiprocessing.Queue
+    locked[in]         multiprocessing.Event set when the source is locked
+    """
+    try:
+        meta, source = get_snapshot_servers(conn_val)
+        started.put(None)
+        locked.wait()
+        # The statements must not commit, see get_snapshot_servers()
+        for query in (_SESSION_ISOLATION_LEVEL, _START_TRANSACTION):
+            source.exec_query(query, {'fetch': False}).close()
+        _snapshot['meta'] = meta
+        _snapshot['source'] = source
+        _snapshot['tables'] = {}
+        started.put(None)
+    except UtilError, err:
+        started.put(err.errmsg)
+
+
+def get_snapshot_table(q_table, columns):
+    """Get a Table instance of the worker reading its snapshot
+
+    q_table[in]        quoted table name (db.table)
+    columns[in]        column metadata (EXPLAIN rows)
+    """
+    tbl = _snapshot['tables'].get(q_table)
+    if tbl is None:
+        tbl = Table(_snapshot['meta'], q_table, {'quiet': True})
+        tbl.get_column_metadata(columns)
+        tbl.get_keyset_columns()
+        # The rows are read in the transaction of the snapshot
+        tbl.server = _snapshot['source']
+        _snapshot['tables'][q_table] = tbl
+    return tbl
+
+
+def _wait_snapshot_workers(started, workers):
+    """Wait for all the workers to report on the started queue
+    """
+    for _ in range(workers):
+        try:
+            error = started.get(True, _SNAPSHOT_TIMEOUT)
+        except Queue.Empty:
+            raise UtilError("Timeout waiting for the workers to start their "
+                            "snapshot.")
+        if error is not None:
+            raise UtilError("Cannot start the workers: %s" % error)
+
+
+def start_snapshot_pool(source, workers, lock=True,
+                        initializer=init_snapshot_worker, while_locked=None):
+    """Start a pool of worker processes reading the same snapshot
+
+    The workers connect to the source, the source is locked with FLUSH
+    TABLES WITH READ LOCK, the workers start their consistent snapshot and
+    the source is unlocked.
+
+    source[in]         Server instance
+    workers[in]        number of worker processes (connections)
+    lock[in]           if False, the source is not locked (e.g. it is
+                       already locked by LOCK TABLES): the snapshots of the
+                       workers may differ
+    initializer[in]    initializer of the workers, called with the
+                       arguments of init_snapshot_worker() which it must
+                       call
+    while_locked[in]   function called while the source is still locked,
+                       once the snapshots are started
+
+    Returns multiprocessing.Pool
+    """
+    started = multiprocessing.Queue()
+    locked = multiprocessing.Event()
+    conn_val = {
+        "host"        : source.host,
+        "user"        : source.user,
+        "passwd"      : source.passwd,
+        "unix_socket" : source.socket,
+        "port"        : source.port
+    }
+    pool = multiprocessing.Pool(workers, initializer,
+                                (conn_val, started, locked))
+    source_locked = False
+    try:
+        _wait_snapshot_workers(started, workers)
+        if lock:
+            source.exec_query(_FLUSH_TABLES_READ_LOCK)
+            source_locked = True
+        locked.set()
+        _wait_snapshot_workers(started, workers)
+        if while_locked is not None:
+            while_locked()
+    except:
+        locked.set()
+        pool.terminate()
+        pool.join()
+        raise
+    finally:
+        if source_locked:
+            source.exec_query("UNLOCK TABLES")
+    return pool
+
+
+def _copy_chunk(task):
+    """Copy a chunk of rows in a worker process
+
+    task[in]           tuple (source connection values, destination
+                       connection values, quoted table name, column
+                       metadata, new database name, key range, rows); if
+                       rows is None, the rows are read from the source for
+                       the key range, or the whole table is read from the
+                       snapshot of the worker if the key range is None
+
+    Returns number of rows copied
+    """
+    source_val, dest_val, q_table, columns, new_db, key_range, rows = task
+    try:
+        if rows is not None:
+            row_lists = [rows]
+        elif _snapshot:
+            tbl = get_snapshot_table(q_table, columns)
+            if key_range is None:
+                row_lists = tbl.retrieve_rows(1)
+            else:
+                row_lists = [tbl.retrieve_key_range(*key_range)]
+        else:
+            source = _get_server(source_val, False)
+            row_lists = [_get_table(source, q_table,
+                                    columns).retrieve_key_range(*key_range)]
+        dest = _get_server(dest_val, True)
+        dest_tbl = _get_table(dest, q_table, columns)
+        num_rows = 0
+        for rows in row_lists:
+            dest_tbl.exec_bulk_insert(dest, rows, new_db)
+            dest.exec_query("COMMIT")
+            num_rows += len(rows)
+    except UtilError, err:
+        # Subclasses like UtilDBError can not be unpickled
+        raise UtilError(err.errmsg, err.errno)
+    return num_rows
+
+
+class _TableProgress(object):
+    """Progress of the copy of a table
+    """
+    def __init__(self, name):
+        """Constructor
+        """
+        self.name = name
+        self.start = time.time()
+        self.rows = 0
+        self.pending = 0
+        self.submitted = False
+
+
+class ParallelCopy(object):
+    """Copy the data of tables with a pool of worker processes
+
+    Tables are copied at the same time when there are more workers than
+    chunks of a table.
+    """
+    def __init__(self, workers, quiet=False, read_in_workers=False,
+                 source=None):
+        """Constructor
+
+        workers[in]          number of worker processes (connections)
+        quiet[in]            if True, do not print the progress
+        read_in_workers[in]  if True, tables with a primary key are read by
+                             the workers from their own connection to the
+                             source; only when the copy does not rely on a
+                             consistent snapshot of the source
+        source[in]           Server instance of the source for a copy from
+                             a consistent snapshot: the workers start the
+                             same snapshot and read all the tables in it,
+                             the rows are not read by the caller
+        """
+        self.workers = workers
+        self.quiet = quiet
+        self.read_in_workers = read_in_workers
+        self.snapshot = source is not None
+        if self.snapshot:
+            self.pool = start_snapshot_pool(source, workers)
+        else:
+            self.pool = multiprocessing.Pool(workers)
+        self.pending = collections.deque()
+        self.start = time.time()
+        self.rows = 0
+        self.tables = 0
+
+    def copy_table(self, tbl, destination, new_db):
+        """Copy the data of a table
+
+        The chunks of the table are submitted to the workers, the copy may
+        not be finished when this method returns (see finish()).
+
+        tbl[in]            Table instance of the source table
+        destination[in]    destination Server instance
+        new_db[in]         name of the destination database, default is
+                           the database of the source table
+        """
+        if new_db is None:
+            new_db = tbl.q_db_name
+        elif not is_quoted_with_backticks(new_db):
+            new_db = quote_with_backticks(new_db)
+        source_val = tbl.get_dest_values()
+        dest_val = tbl.get_dest_values(destination)
+        columns = tbl.server.exec_query("EXPLAIN %s" % tbl.q_table)
+        progress = _TableProgress(tbl.q_table)
+        has_key = tbl.get_keyset_columns() is not None
+        if self.snapshot and not has_key:
+            # The whole table is read by a worker, in its snapshot
+            self._submit(progress, (None, dest_val, tbl.q_table, columns,
+                                    new_db, None, None))
+        elif (self.snapshot or self.read_in_workers) and has_key:
+            for key_range in tbl.get_key_ranges():
+                self._submit(progress, (source_val, dest_val, tbl.q_table,
+                                        columns, new_db, key_range, None))
+        else:
+            for rows in tbl.retrieve_rows(1):
+                if rows:
+                    self._submit(progress, (None, dest_val, tbl.q_table,
+                                            columns, new_db, None, rows))
+        progress.submitted = True
+        if not progress.pending:
+            self._report(progress)
+
+    def _submit(self, progress, task):
+        """Submit a task, waiting for a task to finish if too many wait
+        """
+        while len(self.pending) >= self.workers * _PENDING_PER_WORKER:
+            self._wait()
+        progress.pending += 1
+        self.pending.append((progress,
+                             self.pool.apply_async(_copy_chunk, (task,))))
+
+    def _wait(self):
+        """Wait for the oldest task to finish
+        """
+        progress, result = self.pending.popleft()
+        try:
+            num_rows = result.get()
+        except:
+            self.pool.terminate()
+            self.pool.join()
+            raise
+        progress.rows += num_rows
+        progress.pending -= 1
+        self.rows += num_rows
+        if progress.submitted and not progress.pending:
+            self._report(progress)
+
+    def _report(self, progress):
+        """Print the number of rows copied for a table and the throughput
+        """
+        self.tables += 1
+        if self.quiet:
+            return
+        seconds = max(time.time() - progress.start, 0.001)
+        print "# Copied %d rows of TABLE %s in %.1f seconds (%d rows/s)." % \
+              (progress.rows, progress.name, seconds, progress.rows / seconds)
+
+    def finish(self):
+        """Wait for all the copies to finish and stop the workers
+        """
+        while self.pending:
+            self._wait()
+        self.pool.close()
+        self.pool.join()
+        if not self.quiet and self.tables > 1:
+            seconds = max(time.time() - self.start, 0.001)
+            print "# Copied %d rows of %d tables in %.1f seconds " \
+                  "(%d rows/s)." % (self.rows, self.tables, seconds,
+                                    self.rows / seconds)
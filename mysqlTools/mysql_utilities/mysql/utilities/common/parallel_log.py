@@ -0,0 +1,353 @@
+#
+# Copyright (c) 2011, 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""Module to parse a large General or Slow Query Log using all processors.
+
+The log file is split in byte ranges which start with an entry. Each range
+is parsed by a worker process and the partial results (counts, histograms,
+digests) are merged in the order of the log.
+
+Both logs carry state from one entry to the next: the current database of
+the Slow Query Log and the user, host and database of each session of the
+General Query Log. A worker does not know this state at the start of its
+range, so it uses placeholder values (see inherited()) which are replaced
+once the state at the end of the previous ranges is known.
+"""
+
+import os
+import re
+import mmap
+import itertools
+import multiprocessing
+
+from mysql.utilities.exception import UtilError
+from mysql.utilities.common.digest import QueryDigest
+from mysql.utilities.common.parser import GeneralQueryLog, SlowQueryLogReader
+
+# Size of the ranges, there are at least as many ranges as processes
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+
+_SLOW_ENTRY_START = '\n# User@Host: '
+_GENERAL_ENTRY_START_CRE = re.compile(r"\n\d{6}\s+\d{1,2}:\d{2}:\d{2}\s")
+
+# Session fields kept by GeneralQueryLog
+_SESSION_FIELDS = ('database', 'user', 'host')
+
+# Prefix of placeholder values, a NUL never appears in the logs
+_INHERITED = '\0inherited'
+
+
+def inherited(session, field):
+    """Return the placeholder for state set before the range
+
+    session[in]     session ID, or None for the Slow Query Log
+    field[in]       'database', 'user' or 'host'
+
+    Returns a string.
+    """
+    return "%s %s %s" % (_INHERITED, session, field)
+
+
+def resolve_value(value, state):
+    """Replace a placeholder by the value it stands for
+
+    value[in]       a value read from the log, possibly a placeholder
+    state[in]       state at the end of the previous ranges, see
+                    update_state()
+
+    Returns the value, or the value of the placeholder from state.
+    """
+    if isinstance(value, str) and value.startswith(_INHERITED):
+        _, session, field = value.split(' ')
+        return state.get(session, {}).get(field)
+    return value
+
+
+def update_state(state, range_state):
+    """Update the state with the state at the end of the next range
+
+    state[in,out]   dictionary session => {field: value}
+    range_state[in] state returned for the next range; a session mapped
+                    to None ended in the range
+    """
+    for session, fields in range_state.iteritems():
+        if fields is None:
+            state.pop(session, None)
+        else:
+            state[session] = dict(
+                [(field, resolve_value(value, state))
+                 for field, value in fields.iteritems()])
+
+
+class LogRange(object):
+    """File type reading a byte range of a memory mapped log
+
+    Supports what the log parsers use: read(), readline(), seek() and
+    tell(), relative to the start of the range.
+    """
+    def __init__(self, log_map, start, end):
+        """Constructor
+
+        log_map[in]     a mmap object of the log file
+        start[in]       offset of the first byte of the range
+        end[in]         offset after the last byte, the start of a line
+        """
+        self._map = log_map
+        self.start = start
+        self.end = end
+        log_map.seek(start)
+
+    def read(self, size=-1):
+        """Read at most size bytes, all when negative
+        """
+        left = self.end - self._map.tell()
+        if size < 0 or size > left:
+            size = left
+        return self._map.read(size)
+
+    def readline(self):
+        """Read a line
+        """
+        if self._map.tell() >= self.end:
+            return ''
+        return self._map.readline()
+
+    def seek(self, offset):
+        """Move to offset from the start of the range
+        """
+        self._map.seek(self.start + offset)
+
+    def tell(self):
+        """Return the offset from the start of the range
+        """
+        return self._map.tell() - self.start
+
+    def close(self):
+        """Nothing to do, the mmap object is closed by its owner
+        """
+        pass
+
+
+class _GeneralQueryLogRange(GeneralQueryLog):
+    """GeneralQueryLog for a range starting in the middle of a log
+
+    Sessions which did not connect in the range get placeholder values for
+    their user, host and database.
+    """
+    def __init__(self, stream):
+        """Constructor
+        """
+        super(_GeneralQueryLogRange, self).__init__(stream)
+        self._ended = set()
+
+    def _new_session(self, session_id):
+        """Create a session, inherited when started before the range
+        """
+        session = super(_GeneralQueryLogRange, self)._new_session(session_id)
+        if session_id not in self._ended:
+            for field in _SESSION_FIELDS:
+                session[field] = inherited(session_id, field)
+        return session
+
+    def _handle_quit(self, entry, session, argument):
+        """Remember the sessions ending in the range
+        """
+        super(_GeneralQueryLogRange, self)._handle_quit(entry, session,
+                                                        argument)
+        self._ended.add(entry['session_id'])
+
+    def get_state(self):
+        """Return the sessions at the end of the range
+
+        Returns a dictionary, see update_state().
+        """
+        state = dict([(str(session_id), None) for session_id in self._ended])
+        for session_id, session in self._sessions.iteritems():
+            state[str(session_id)] = dict([(field, session[field])
+                                           for field in _SESSION_FIELDS])
+        return state
+
+
+def _find_entry_start(log_map, offset, log_type):
+    """Return the offset of the first entry starting after offset
+
+    For the Slow Query Log an entry starts with its '# Time:' line, when
+    there is one, else with '# User@Host:'. For the General Query Log an
+    entry starts with a line starting with a timestamp.
+
+    Returns an integer or None when no entry follows.
+    """
+    if log_type == 'slow':
+        pos = log_map.find(_SLOW_ENTRY_START, offset)
+        if pos < 0:
+            return None
+        prev = log_map.rfind('\n', 0, pos) + 1
+        if log_map[prev:prev + 7] == '# Time:':
+            return prev
+        return pos + 1
+    match = _GENERAL_ENTRY_START_CRE.search(log_map, offset)
+    if match is None:
+        return None
+    return match.start() + 1
+
+
+def split_log_file(file_name, log_type, num_ranges):
+    """Split a log file in ranges starting with an entry
+
+    file_name[in]   path of the log file
+    log_type[in]    'slow' or 'general'
+    num_ranges[in]  number of ranges wanted, there can be less when the
+                    log has few entries
+
+    Returns a list of tuples (start, end).
+    """
+    with open(file_name, 'rb') as log_file:
+        size = os.fstat(log_file.fileno()).st_size
+        if not size:
+            return []
+        log_map = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        offsets = [0]
+        for num in range(1, num_ranges):
+            offset = _find_entry_start(log_map,
+                                       max(size * num // num_ranges,
+                                           offsets[-1]),
+                                       log_type)
+            if offset is None:
+                break
+            if offset > offsets[-1]:
+                offsets.append(offset)
+    finally:
+        log_map.close()
+    offsets.append(size)
+    return zip(offsets[:-1], offsets[1:])
+
+
+def _map_range(task):
+    """Parse a range in a worker process
+
+    task[in]        tuple (file_name, log_type, start, end, func)
+
+    Returns a tuple (result of func, state at the end of the range).
+    """
+    file_name, log_type, start, end, func = task
+    with open(file_name, 'rb') as log_file:
+        log_map = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        stream = LogRange(log_map, start, end)
+        if log_type == 'slow':
+            log = SlowQueryLogReader(stream,
+                                     database=inherited(None, 'database'))
+            result = func(log)
+            state = {'None': {'database': log.current_database}}
+        else:
+            log = _GeneralQueryLogRange(stream)
+            result = func(log)
+            state = log.get_state()
+    except UtilError, err:
+        # Subclasses like LogParserError can not be unpickled
+        raise UtilError(err.errmsg, err.errno)
+    finally:
+        log_map.close()
+    return result, state
+
+
+def map_log_ranges(file_name, log_type, func, processes=None,
+                   range_size=DEFAULT_RANGE_SIZE):
+    """Parse the ranges of a log file in parallel
+
+    file_name[in]   path of the log file, a regular file
+    log_type[in]    'slow' or 'general'
+    func[in]        function called in the worker with the parser of a
+                    range, a SlowQueryLogReader or GeneralQueryLog; it
+                    must be defined at module level and return a picklable
+                    result
+    processes[in]   number of worker processes, default is the number of
+                    processors; with 1 the ranges are parsed in this
+                    process
+    range_size[in]  size of the ranges in bytes
+
+    Results of func can contain placeholders for the state set before
+    their range. The state at the end of the previous ranges is passed
+    along to replace them with resolve_value().
+
+    Returns a generator of tuples (result, state) in the order of the log.
+    """
+    if not processes:
+        processes = multiprocessing.cpu_count()
+    size = os.path.getsize(file_name)
+    num_ranges = max(processes, -(-size // range_size))
+    tasks = [(file_name, log_type, start, end, func)
+             for start, end in split_log_file(file_name, log_type,
+                                              num_ranges)]
+    state = {}
+    if processes == 1:
+        for result, range_state in itertools.imap(_map_range, tasks):
+            yield result, state
+            update_state(state, range_state)
+        return
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result, range_state in pool.imap(_map_range, tasks):
+            yield result, state
+            update_state(state, range_state)
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+class _DigestLog(object):
+    """Picklable function returning the QueryDigest of a range
+    """
+    def __init__(self, max_fingerprints):
+        """Constructor
+        """
+        self.max_fingerprints = max_fingerprints
+
+    def __call__(self, log):
+        """Return the QueryDigest of log
+        """
+        digest = QueryDigest(self.max_fingerprints)
+        digest.add_log(log)
+        return digest
+
+
+def parallel_digest(file_name, log_type, processes=None,
+                    max_fingerprints=10000, range_size=DEFAULT_RANGE_SIZE):
+    """Create the QueryDigest of a log file using several processes
+
+    file_name[in]           path of the log file, a regular file
+    log_type[in]            'slow' or 'general'
+    processes[in]           number of worker processes, default is the
+                            number of processors
+    max_fingerprints[in]    see QueryDigest
+    range_size[in]          size of the ranges in bytes
+
+    The result is the same as parsing the log in one process, except that
+    General Query Log entries without timestamp of sessions active before
+    their range have no datetime.
+
+    Returns a QueryDigest-instance.
+    """
+    digest = QueryDigest(max_fingerprints)
+    for part, state in map_log_ranges(file_name, log_type,
+                                      _DigestLog(max_fingerprints),
+                                      processes, range_size):
+        part.replace_values(lambda value: resolve_value(value, state))
+        digest.merge(part)
+    return digest
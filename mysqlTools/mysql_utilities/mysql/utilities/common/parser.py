@@ -17,11 +17,17 @@
 """Module with parsers for General and Slow Query Log.
 """
 
+import os
 import sys
 import re
+import io
+import gzip
+import mmap
 import decimal
 import datetime
 
+from cStringIO import StringIO
+
 from mysql.utilities.exception import LogParserError
 
 _DATE_PAT = r"\d{6}\s+\d{1,2}:\d{2}:\d{2}"
@@ -41,6 +47,15 @@ _SLOW_STATS_CRE = re.compile(r"#\sQuery_time:\s(\d*\.\d{1,6})\s*"
             r"Rows_sent:\s(\d*)\s*"
             r"Rows_examined:\s(\d*)")
 
+# Entries of the conversion caches and bytes read at once by
+# SlowQueryLogReader
+_SLOW_CACHE_SIZE = 4096
+_SLOW_CHUNK_SIZE = 4 * 1024 * 1024
+_SLOW_ENTRY_SEP = '\n# User@Host: '
+
+# Bytes at the start of a followed log compared to detect truncation
+_TAIL_HEAD_SIZE = 1024
+
 _GENERAL_ENTRY_CRE = re.compile(
             r'(?:('+ _DATE_PAT +'))?\s*'
             r'(\d+)\s([\w ]+)\t*(?:(.+))?$')
@@ -699,6 +714,534 @@ class SlowQueryLog(LogParserBase):
         
         return entry
 
+
+def open_log_file(file_name):
+    """Open a log file for the fast parsers
+
+    file_name[in]   path of the log file; '-' reads stdin and a name ending
+                    with '.gz' is decompressed on the fly
+
+    Regular files are memory mapped, so lines are read without copying the
+    file through a Python buffer. Empty files, which can not be mapped, are
+    opened normally.
+
+    Returns a file type or mmap object supporting read() and readline().
+    """
+    if file_name == '-':
+        return sys.stdin
+    if file_name.endswith('.gz'):
+        # GzipFile.readline() is slow on Python 2, buffer it in C
+        return io.BufferedReader(gzip.open(file_name, 'rb'), 1024 * 1024)
+    with open(file_name, 'rb') as log_file:
+        try:
+            return mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            # Empty file
+            return open(file_name, 'rb')
+
+
+class SlowQueryRecord(object):
+    """Compact entry of the Slow Query Log returned by SlowQueryLogReader
+
+    Attributes are the keys of SlowQueryLogEntry, except that query_time and
+    lock_time are float microseconds instead of Decimal seconds.
+    """
+    __slots__ = ('datetime', 'database', 'user', 'host', 'query',
+                 'query_time', 'lock_time', 'rows_sent', 'rows_examined')
+
+    def __init__(self, dt, database, user, host, query, query_time,
+                 lock_time, rows_sent, rows_examined):
+        """Constructor
+        """
+        self.datetime = dt
+        self.database = database
+        self.user = user
+        self.host = host
+        self.query = query
+        self.query_time = query_time
+        self.lock_time = lock_time
+        self.rows_sent = rows_sent
+        self.rows_examined = rows_examined
+
+    def to_entry(self):
+        """Return the record as a SlowQueryLogEntry
+
+        Returns a SlowQueryLogEntry-instance, with Decimal times in seconds
+        like SlowQueryLog returns.
+        """
+        entry = SlowQueryLogEntry()
+        for name in self.__slots__:
+            entry[name] = getattr(self, name)
+        for name in ('query_time', 'lock_time'):
+            if entry[name] is not None:
+                entry[name] = (decimal.Decimal(int(round(entry[name]))) /
+                               1000000)
+        return entry
+
+    def __str__(self):
+        """String representation of SlowQueryRecord
+        """
+        return str(self.to_entry()).replace('SlowQueryLogEntry',
+                                            self.__class__.__name__)
+
+
+class SlowQueryLogReader(object):
+    """Fast parser for the MySQL Slow Query Log
+
+    SlowQueryLogReader reads the same entries as SlowQueryLog but is built
+    for multi-GB logs:
+    - the log is read in large chunks split per entry, no readline() and
+      seek() per line
+    - entries are SlowQueryRecord objects using __slots__, times are float
+      microseconds instead of Decimal seconds
+    - '# Time:', 'SET timestamp=' and '# User@Host:' lines are converted
+      once and reused while they repeat
+    - the stream can be a mmap object (see open_log_file())
+
+    For example:
+        for record in SlowQueryLogReader(open_log_file("slow.log.gz")):
+            print record.query_time, record.query
+
+    Pass entries=True to get SlowQueryLogEntry-instances instead, that is
+    the entry API of SlowQueryLog.
+    """
+    def __init__(self, stream, entries=False, database=None):
+        """Constructor
+
+        stream[in]      a file type or mmap object
+        entries[in]     if True, iterate SlowQueryLogEntry-instances
+        database[in]    current database before the first entry, for a
+                        stream starting in the middle of a log
+        """
+        self._stream = stream
+        self._entries = entries
+        self._current_database = database
+        self._time_cache = {}
+        # '# Time:' lines, converted when asked for
+        self._start_time = None
+        self._last_seen_time = None
+
+    @property
+    def start_datetime(self):
+        """Returns timestamp of first read log entry
+
+        Returns datetime.datetime-object or None.
+        """
+        return self._get_datetime(self._start_time)
+
+    @property
+    def last_seen_datetime(self):
+        """Returns timestamp of last read log entry
+
+        Returns datetime.datetime-object or None.
+        """
+        return self._get_datetime(self._last_seen_time)
+
+    @property
+    def current_database(self):
+        """Returns the database of the last 'use' read
+
+        Entries without a 'use' line get this database.
+
+        Returns a string or None.
+        """
+        return self._current_database
+
+    def __iter__(self):
+        """Iterate over the entries
+
+        Returns a generator of SlowQueryRecord (or SlowQueryLogEntry)
+        """
+        records = self._records()
+        if self._entries:
+            return (record.to_entry() for record in records)
+        return records
+
+    def _records(self):
+        """Generate SlowQueryRecord-objects
+
+        The log is read in large chunks which are split on
+        '\\n# User@Host: ', so each piece is one entry: connection line,
+        statistics line and query, followed by the '# Time:' line of the
+        next entry when the second changed. The work per entry is a few
+        string operations instead of a loop over its lines.
+        """
+        # Conversions are cached on the exact text: the same second and
+        # the same connection repeat for many entries. A '# Time:' line
+        # is only converted for entries without 'SET timestamp='.
+        timestamp_cache = {}
+        userhost_cache = {}
+        time_line = None
+        database = self._current_database
+        # A leading '\n' lets a log starting with '# User@Host' split
+        rest = '\n'
+        first = True
+        while rest is not None:
+            chunk = self._stream.read(_SLOW_CHUNK_SIZE)
+            pieces = (rest + chunk).split(_SLOW_ENTRY_SEP)
+            if chunk:
+                # The last piece may continue in the next chunk
+                rest = pieces.pop()
+            else:
+                rest = None
+                if pieces[-1].endswith('\n'):
+                    pieces[-1] = pieces[-1][:-1]
+            if first and pieces:
+                # Anything before the first entry: headers and '# Time:'
+                time_line = self._parse_trailer(pieces.pop(0))
+                first = False
+            for piece in pieces:
+                userhost, _, query = piece.partition('\n')
+                try:
+                    user, host = userhost_cache[userhost]
+                except KeyError:
+                    user, host = self._parse_userhost(
+                        '# User@Host: ' + userhost.rstrip('\r'))
+                    if len(userhost_cache) >= _SLOW_CACHE_SIZE:
+                        userhost_cache.clear()
+                    userhost_cache[userhost] = (user, host)
+                entry_time_line = time_line
+                time_line = None
+
+                if query.startswith('# Query_time:'):
+                    # # Query_time: 0.000333  Lock_time: 0.000000
+                    #   Rows_sent: 1  Rows_examined: 0
+                    stats, _, query = query.partition('\n')
+                    fields = stats.split()
+                    try:
+                        query_time = float(fields[2]) * 1000000
+                        lock_time = float(fields[4]) * 1000000
+                        rows_sent = int(fields[6])
+                        rows_examined = int(fields[8])
+                    except (IndexError, ValueError):
+                        raise LogParserError('Failed parsing Slow Query '
+                                             'line: %s' % stats[:30])
+                else:
+                    query_time = lock_time = None
+                    rows_sent = rows_examined = None
+
+                # The '# Time:' line or a server header after the query
+                # belong to the next entry
+                trailer = query.rfind('\n# Time:')
+                if 'started with:' in query:
+                    trailer = query.rfind('\n', 0, query.find('started with:'))
+                    time_line = self._parse_trailer(query[trailer + 1:])
+                    query = query[:max(trailer, 0)]
+                elif trailer >= 0:
+                    if query.find('\n', trailer + 1) < 0:
+                        time_line = query[trailer + 1:].rstrip('\r')
+                        if self._start_time is None:
+                            self._start_time = time_line
+                        self._last_seen_time = time_line
+                        query = query[:trailer]
+                elif query.startswith('# Time:') and '\n' not in query:
+                    time_line = self._parse_trailer(query)
+                    query = ''
+
+                if '\r' in query:
+                    query = query.replace('\r\n', '\n').rstrip('\r')
+                if query.startswith('use '):
+                    # Kept as SlowQueryLog does, including the ';'
+                    database = query.partition('\n')[0].split(' ')[1]
+                    self._current_database = database
+                    set_timestamp = query.find('\nSET timestamp=') + 1
+                elif query.startswith('SET timestamp='):
+                    set_timestamp = 0
+                else:
+                    set_timestamp = -1
+                if set_timestamp >= 0:
+                    end = query.find('\n', set_timestamp)
+                    line = query[set_timestamp:end if end >= 0 else None]
+                    try:
+                        entry_dt = timestamp_cache[line]
+                    except KeyError:
+                        if len(timestamp_cache) >= _SLOW_CACHE_SIZE:
+                            timestamp_cache.clear()
+                        entry_dt = timestamp_cache[line] = \
+                            datetime.datetime.fromtimestamp(
+                                int(line[14:].rstrip(';')))
+                else:
+                    entry_dt = self._get_datetime(entry_time_line)
+                yield SlowQueryRecord(entry_dt, database, user, host, query,
+                                      query_time, lock_time, rows_sent,
+                                      rows_examined)
+
+    def _parse_trailer(self, text):
+        """Return the last '# Time:' line of text
+
+        text[in]        lines found between two entries, for example a
+                        server header and a '# Time:' line
+
+        Returns a string or None.
+        """
+        time_line = None
+        for line in text.split('\n'):
+            if line.startswith('# Time:'):
+                time_line = line.rstrip('\r')
+        if time_line is not None:
+            if self._start_time is None:
+                self._start_time = time_line
+            self._last_seen_time = time_line
+        return time_line
+
+    def _get_datetime(self, time_line):
+        """Return the datetime of a '# Time:' line, cached
+
+        time_line[in]   a string or None
+
+        Returns datetime.datetime-object or None.
+        """
+        if time_line is None:
+            return None
+        try:
+            return self._time_cache[time_line]
+        except KeyError:
+            if len(self._time_cache) >= _SLOW_CACHE_SIZE:
+                self._time_cache.clear()
+            entry_dt = self._time_cache[time_line] = \
+                self._parse_time(time_line)
+            return entry_dt
+
+    def _parse_userhost(self, line):
+        """Return (user, host) of a '# User@Host:' line
+
+        Raises LogParserError on errors.
+        """
+        info = _SLOW_USERHOST_CRE.match(line)
+        if info is None:
+            raise LogParserError('Failed parsing Slow Query line: %s' %
+                                 line[:30])
+        priv_user, unpriv_user, host, ip = info.groups()
+        return (priv_user or unpriv_user, host or ip)
+
+    def _parse_time(self, line):
+        """Return the datetime of a '# Time:' line
+
+        Both '# Time: 111102 12:48:46' and, from MySQL 5.7,
+        '# Time: 2011-11-02T12:48:46.123456Z' are understood. Fields are
+        sliced instead of going through datetime.strptime().
+
+        Raises LogParserError on errors.
+        """
+        fields = line.split()
+        try:
+            if 'T' in fields[2]:
+                day, clock = fields[2].split('T')
+                year, month, mday = day.split('-')
+                clock = clock.rstrip('Z')[:8]
+            else:
+                day, clock = fields[2], fields[3]
+                year, month, mday = '20' + day[0:2], day[2:4], day[4:6]
+            hour, minute, second = clock.split(':')
+            return datetime.datetime(int(year), int(month), int(mday),
+                                     int(hour), int(minute), int(second))
+        except (IndexError, ValueError):
+            raise LogParserError('Failed parsing Slow Query line: %s' %
+                                 line[:30])
+
+
+class _FeedStream(object):
+    """File type returning the text fed to it, used by LogTail
+
+    A parser keeps its state (sessions, current database) while new text
+    is fed after it reached the end of the previous text.
+    """
+    def __init__(self):
+        """Constructor
+        """
+        self._buffer = StringIO('')
+
+    def feed(self, text):
+        """Replace the text which is read
+        """
+        self._buffer = StringIO(text)
+
+    def read(self, size=-1):
+        """Read at most size bytes
+        """
+        return self._buffer.read(size)
+
+    def readline(self):
+        """Read a line
+        """
+        return self._buffer.readline()
+
+    def seek(self, offset):
+        """Move to offset of the text
+        """
+        self._buffer.seek(offset)
+
+
+class LogTail(object):
+    """Follow a General or Slow Query Log while the server writes it
+
+    Each call of read_entries() reads only the bytes appended since the
+    previous call and returns the entries they complete. The log file can
+    be rotated (renamed and created again, the inode changes) or truncated
+    (its size shrinks): the rest of the old file is read and the new file
+    is followed from its start.
+
+    The last entry read is returned once the next entry starts or when no
+    new bytes were written since the previous call, so a query is not
+    returned while the server is still writing it.
+
+    For example:
+        tail = LogTail("/var/lib/mysql/slow.log", 'slow')
+        while True:
+            for record in tail.read_entries():
+                print record.query
+            time.sleep(1)
+
+    Slow Query Log entries are SlowQueryRecord objects, General Query Log
+    entries GeneralQueryLogEntry-instances.
+    """
+    def __init__(self, file_name, log_type, from_start=False):
+        """Constructor
+
+        file_name[in]   path of the log file
+        log_type[in]    'slow' or 'general'
+        from_start[in]  if True, read the entries already in the log,
+                        else only the ones written from now on
+
+        Raises LogParserError on errors.
+        """
+        if log_type not in ('slow', 'general'):
+            raise LogParserError("Unknown log type: %s" % log_type)
+        self._file_name = file_name
+        self._log_type = log_type
+        self._file = None
+        self._inode = None
+        self._head = ''
+        self._pending = ''
+        self._database = None
+        self._general_stream = None
+        self._general_log = None
+        self.rotations = 0
+        self.truncations = 0
+        if log_type == 'general':
+            self._general_stream = _FeedStream()
+            self._general_log = GeneralQueryLog(self._general_stream)
+        self._open(from_start)
+
+    def _open(self, from_start=True):
+        """Open the log file, at its end unless from_start is True
+        """
+        try:
+            # Unlike file, io does not keep the end of file once reached
+            self._file = io.open(self._file_name, 'rb')
+        except IOError, err:
+            raise LogParserError("Can not open log file %s: %s" %
+                                 (self._file_name, err.strerror))
+        self._inode = os.fstat(self._file.fileno()).st_ino
+        self._head = self._file.read(_TAIL_HEAD_SIZE)
+        if not from_start:
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file.seek(0)
+
+    def _read_head(self):
+        """Return the first bytes of the log
+        """
+        pos = self._file.tell()
+        self._file.seek(0)
+        head = self._file.read(_TAIL_HEAD_SIZE)
+        self._file.seek(pos)
+        return head
+
+    def _check_file(self):
+        """Return 'rotated' or 'truncated' when the log file changed
+
+        A truncated log is noticed when it is smaller than the position
+        read, or when it grew again but its first bytes changed.
+
+        Returns a string or None.
+        """
+        try:
+            stat = os.stat(self._file_name)
+        except OSError:
+            # Renamed, the new file is not created yet
+            return None
+        if stat.st_ino != self._inode:
+            return 'rotated'
+        if stat.st_size < self._file.tell():
+            return 'truncated'
+        head = self._read_head()
+        if not head.startswith(self._head):
+            return 'truncated'
+        self._head = head
+        return None
+
+    def _entry_start(self, text):
+        """Return the offset of the last entry starting in text, or 0
+        """
+        if self._log_type == 'slow':
+            pos = text.rfind(_SLOW_ENTRY_SEP)
+            if pos < 0:
+                return 0
+            prev = text.rfind('\n', 0, pos) + 1
+            if text.startswith('# Time:', prev):
+                return prev
+            return pos + 1
+        end = len(text)
+        while end > 0:
+            start = text.rfind('\n', 0, end - 1) + 1
+            if _GENERAL_ENTRY_CRE.match(text, start, end - 1):
+                return start
+            end = start
+        return 0
+
+    def _parse(self, text):
+        """Return the entries of text, which ends with a complete entry
+        """
+        if not text:
+            return []
+        if self._log_type == 'slow':
+            reader = SlowQueryLogReader(StringIO(text),
+                                        database=self._database)
+            entries = list(reader)
+            self._database = reader.current_database
+            return entries
+        self._general_stream.feed(text)
+        return list(self._general_log)
+
+    def read_entries(self):
+        """Return the entries written since the previous call
+
+        Returns a list of SlowQueryRecord or GeneralQueryLogEntry.
+        """
+        change = self._check_file()
+        if change == 'truncated':
+            # What follows the position read belongs to the new content
+            data = ''
+        else:
+            # With 'rotated', the rest of the old file
+            data = self._file.read()
+        text = self._pending + data
+        if change is not None or not data:
+            self._pending = ''
+        else:
+            cut = self._entry_start(text)
+            text, self._pending = text[:cut], text[cut:]
+        entries = self._parse(text)
+
+        if change == 'rotated':
+            self.rotations += 1
+            self._file.close()
+            self._open()
+            entries.extend(self.read_entries())
+        elif change == 'truncated':
+            self.truncations += 1
+            self._file.seek(0)
+            self._head = ''
+            entries.extend(self.read_entries())
+        return entries
+
+    def close(self):
+        """Close the log file
+        """
+        self._file.close()
+
+
 class LogEntryBase(dict):
     """Class inherited by GeneralQueryEntryLog and SlowQueryEntryLog
     
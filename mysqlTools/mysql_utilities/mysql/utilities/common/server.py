@@ -24,6 +24,7 @@ server operations used in multiple utilities.
 import os
 import re
 import mysql.connector
+from mysql.connector.constants import ClientFlag
 from mysql.utilities.exception import UtilError, UtilDBError, UtilRplError
 from mysql.utilities.common.options import parse_connection
 
@@ -441,6 +442,8 @@ class Server(object):
                            default value = False
             charset        Default character set for the connection.
                            (default latin1)
+            local_infile   if True, allow LOAD DATA LOCAL INFILE on the
+                           connection (default False)
         """
         assert not options.get("conn_info") == None
         
@@ -449,6 +452,7 @@ class Server(object):
         self.host = None
         self.charset = options.get("charset", "latin1")
         self.role = options.get("role", "Server")
+        self.local_infile = options.get("local_infile", False)
         conn_values = get_connection_dictionary(options.get("conn_info"))
         try:
             self.host = conn_values["host"]
@@ -610,6 +614,8 @@ class Server(object):
             if self.passwd and self.passwd != "":
                 parameters['passwd'] = self.passwd
             parameters['charset'] = self.charset
+            if self.local_infile:
+                parameters['client_flags'] = [ClientFlag.LOCAL_FILES]
             self.db_conn = mysql.connector.connect(**parameters)
         except mysql.connector.Error, e:
             # Reset any previous value if the connection cannot be established,
@@ -692,10 +698,14 @@ class Server(object):
                            (default is True)
             raw            If True, use a buffered raw cursor
                            (default is True)
+            executemany    If True, params is a list of parameter tuples
+                           and the query is executed for each of them
+                           (default is False)
 
         Returns result set or cursor
         """
         params = options.get('params', ())
+        executemany = options.get('executemany', False)
         columns = options.get('columns', False)
         fetch = options.get('fetch', True)
         raw = options.get('raw', True)
@@ -715,7 +725,9 @@ class Server(object):
             cur = self.db_conn.cursor(raw=True)
 
         try:
-            if params == ():
+            if executemany:
+                res = cur.executemany(query_str, params)
+            elif params == ():
                 res = cur.execute(query_str)
             else:
                 res = cur.execute(query_str, params)
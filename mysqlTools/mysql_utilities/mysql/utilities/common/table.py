@@ -19,6 +19,7 @@
 This module contains abstractions of a MySQL table and an index.
 """
 
+import binascii
 import multiprocessing
 import re
 import sys
@@ -33,6 +34,30 @@ _MAXBULK_VALUES = 25000
 _MAXTHREADS_INSERT = 6
 _MAXROWS_PER_THREAD = 100000
 _MAXAVERAGE_CALC = 100
+_MAXROWS_PER_CHUNK = 10000
+
+# Primary key column types read in key order by chunks (see
+# Table.retrieve_rows), compared as numbers or as quoted strings
+_KEYSET_NUMERIC_TYPES = ("tinyint", "smallint", "mediumint", "int",
+                         "integer", "bigint", "decimal")
+_KEYSET_STRING_TYPES = ("char", "varchar", "binary", "varbinary", "date",
+                        "datetime", "timestamp", "time", "year")
+_NUMBER_CRE = re.compile(r"^-?[0-9]+(\.[0-9]+)?$")
+
+# Column types and how their values are written in INSERT statements (see
+# Table.get_column_metadata), other types are written as they are read
+_STRING_TYPES = ("char", "varchar", "binary", "varbinary", "enum", "set")
+_BLOB_TYPES = ("tinyblob", "blob", "mediumblob", "longblob", "tinytext",
+               "text", "mediumtext", "longtext")
+_TEMPORAL_TYPES = ("date", "time", "datetime", "timestamp")
+_HEX_TYPES = ("bit", "geometry", "point", "linestring", "polygon",
+              "multipoint", "multilinestring", "multipolygon",
+              "geometrycollection")
+
+# Characters escaped in quoted string values
+_ESCAPE_CRE = re.compile(r"[\\'\0\n\r\032]")
+_ESCAPES = {"\\": "\\\\", "'": "\\'", "\0": "\\0", "\n": "\\n",
+            "\r": "\\r", "\032": "\\Z"}
 
 _FOREIGN_KEY_QUERY = """
   SELECT CONSTRAINT_NAME, COLUMN_NAME, REFERENCED_TABLE_SCHEMA,
@@ -58,6 +83,114 @@ def _parse_object_name(qualified_name):
     else:
         return (None, None)
 
+
+
+def _escape_char(match):
+    """Get the escape sequence of a character matched by _ESCAPE_CRE
+    """
+    return _ESCAPES[match.group()]
+
+
+def _encode_string(value):
+    """Encode a value as a quoted SQL string
+
+    value[in]          the column value
+
+    Returns string - the escaped and quoted value or NULL
+    """
+    if value is None:
+        return "NULL"
+    if not isinstance(value, basestring):
+        value = str(value)
+    if _ESCAPE_CRE.search(value):
+        value = _ESCAPE_CRE.sub(_escape_char, value)
+    return "'%s'" % value
+
+
+def _encode_number(value):
+    """Encode a value as it is read, e.g. a number
+
+    value[in]          the column value
+
+    Returns string - the value or NULL
+    """
+    if value is None:
+        return "NULL"
+    return str(value)
+
+
+def _encode_hex(value):
+    """Encode a binary value (BIT or spatial column) as a hexadecimal literal
+
+    value[in]          the column value
+
+    Returns string - the hexadecimal literal or NULL
+    """
+    if value is None:
+        return "NULL"
+    if not value:
+        return "''"
+    return "0x" + binascii.hexlify(value)
+
+
+def _encode_blob(value):
+    """Encode a blob value, written by an UPDATE after the INSERT
+
+    Returns string - NULL
+    """
+    return "NULL"
+
+
+def _get_keyset_condition(keyset, row, quote, after=True):
+    """Build the condition selecting the rows following a row in key order
+
+    keyset[in]         list of tuples (position, quoted name, numeric) of
+                       the primary key columns in key order
+    row[in]            the last row read
+    quote[in]          function returning the quoted SQL string of a value
+    after[in]          if False, select the rows up to the row (included)
+                       instead of the rows following it
+
+    Returns string - the WHERE condition
+    """
+    literals = []
+    for pos, _, numeric in keyset:
+        value = row[pos]
+        if numeric and _NUMBER_CRE.match(str(value)):
+            literals.append(str(value))
+        else:
+            literals.append(quote(value))
+    # (a > x) OR (a = x AND b > y) OR ... as the row constructor form
+    # (a, b) > (x, y) does not use the index with older servers
+    alternatives = []
+    for num in range(len(keyset)):
+        terms = ["%s = %s" % (keyset[i][1], literals[i]) for i in range(num)]
+        if after:
+            operator = ">"
+        elif num == len(keyset) - 1:
+            operator = "<="
+        else:
+            operator = "<"
+        terms.append("%s %s %s" % (keyset[num][1], operator, literals[num]))
+        alternatives.append("(%s)" % " AND ".join(terms))
+    return " OR ".join(alternatives)
+
+
+def _get_keyset_quote(keyset):
+    """Get the function quoting the key values of a keyset
+
+    keyset[in]         list of tuples (position, quoted name, numeric)
+
+    Returns function or None if all the key columns are numeric
+    """
+    if all([numeric for _, _, numeric in keyset]):
+        return None
+    from mysql.connector.conversion import MySQLConverter
+
+    converter = MySQLConverter()
+    return lambda value: converter.quote(converter.escape(value))
+
+
 class Index(object):
     """
     The Index class encapsulates an index for a given table as defined by
@@ -316,9 +449,12 @@ class Table(object):
         self.fulltext_indexes = []
         self.text_columns = []
         self.blob_columns = []
+        self.hex_columns = []
+        self.column_encoders = []
         self.column_format = None
         self.column_names = []
         self.q_column_names = []
+        self._keyset = ()  # Not read yet, see get_keyset_columns()
         if options.get('get_cols', False):
             self.get_column_metadata()
         self.dest_vals = None
@@ -371,8 +507,10 @@ class Table(object):
         
           column names
           column format for building VALUES clause
+          column encoders writing the values in the VALUES clause
           blob fields - for use in generating INSERT/UPDATE for blobs
-          text fields - for use in checking for single quotes
+          text fields - string fields, quoted and escaped
+          hex fields - BIT and spatial fields, written in hexadecimal
 
         columns[in]        if None, use EXPLAIN else use column list.
         """
@@ -381,6 +519,11 @@ class Table(object):
             columns = self.server.exec_query("explain %s" % self.q_table)
         stop = len(columns)
         self.column_names = []
+        self.q_column_names = []
+        self.text_columns = []
+        self.blob_columns = []
+        self.hex_columns = []
+        self.column_encoders = [_encode_number] * stop
         col_format_values = [''] * stop
         if columns is not None:
             for col in range(0, stop):
@@ -392,15 +535,22 @@ class Table(object):
                     self.column_names.append(columns[col][0])
                     self.q_column_names.append(
                                 quote_with_backticks(columns[col][0]))
-                col_type_prefix = columns[col][1][0:4].lower()
-                if col_type_prefix in ("char", "enum", "set("):
+                col_type = re.match("[a-z]*", columns[col][1].lower()).group()
+                if col_type in _STRING_TYPES:
                     self.text_columns.append(col)
+                    self.column_encoders[col] = _encode_string
                     col_format_values[col] = "'%s'"
-                elif col_type_prefix in ("blob", "text"):
+                elif col_type in _BLOB_TYPES:
                     self.blob_columns.append(col)
+                    self.column_encoders[col] = _encode_blob
                     col_format_values[col] = "%s"
-                elif col_type_prefix in ("date", "time"):
+                elif col_type in _TEMPORAL_TYPES:
+                    self.column_encoders[col] = _encode_string
                     col_format_values[col] = "'%s'"
+                elif col_type in _HEX_TYPES:
+                    self.hex_columns.append(col)
+                    self.column_encoders[col] = _encode_hex
+                    col_format_values[col] = "%s"
                 else:
                     col_format_values[col] = "%s"
         self.column_format = "%s%s%s" % \
@@ -432,78 +582,69 @@ class Table(object):
         row[in]            a row to process
         new_db[in]         new database name
         name[in]           name of the table
-        conn_val[in]       connection information for the destination server
-        query[in]          the INSERT string for executemany()
         blob_col[in]       number of the column containing the blob
 
-        Returns tuple (UPDATE string, blob data)
+        Returns string - UPDATE statement or None if the blobs are empty
         """        
-        from mysql.connector.conversion import MySQLConverter
-
         if self.column_format is None:
             self.get_column_metadata()
 
-        blob_insert = "UPDATE %s.%s SET " % (new_db, name)
+        sets = []
         where_values = []
-        do_commas = False
-        has_data = False
-        stop = len(row)
-        for col in range(0,stop):
-            col_name = quote_with_backticks(self.column_names[col])
+        for col in range(0, len(row)):
+            col_name = self.q_column_names[col]
             if col in self.blob_columns:
                 if row[col] is not None and len(row[col]) > 0:
-                    if do_commas:
-                        blob_insert += ", "
-                    blob_insert += "%s = " % col_name + "%s" % \
-                                   MySQLConverter().quote(row[col])
-                    has_data = True
-                    do_commas = True
+                    sets.append("%s = %s" % (col_name,
+                                             _encode_string(row[col])))
+            elif row[col] is None:
+                where_values.append("%s IS NULL " % col_name)
             else:
-                where_values.append("%s = '%s' " % (col_name, row[col]))
-        if has_data:
-            return blob_insert + " WHERE " + " AND ".join(where_values) + ";"
+                where_values.append("%s = %s " % (col_name,
+                                                  _encode_string(row[col])))
+        if sets:
+            return "UPDATE %s.%s SET %s WHERE %s;" % \
+                   (new_db, name, ", ".join(sets), " AND ".join(where_values))
         return None
 
 
     def get_column_string(self, row, new_db):
         """Return a formatted list of column data.
 
+        Each value is written by the encoder of its column type: strings
+        and dates are escaped and quoted, BIT and spatial values are
+        written in hexadecimal, NULL values as NULL and blobs are set by the
+        UPDATE statements returned.
+
         row[in]            a row to process
         new_db[in]         new database name
 
-        Returns (string) column list
+        Returns (tuple) - (column list string, blob UPDATE statements)
         """
         
         if self.column_format is None:
             self.get_column_metadata()
 
         blob_inserts = []
-        values = list(row)
-
         # Find blobs
         for col in self.blob_columns:
             # Save blob updates for later...
             blob = self._build_update_blob(row, new_db, self.q_tbl_name, col)
             if blob is not None:
                 blob_inserts.append(blob)
-            values[col] = "NULL"
-
-        # Replace single quotes located in the value for a text field with the
-        # correct special character escape sequence. This fixes SQL errors
-        # related to using single quotes in a string value that is single
-        # quoted. For example, 'this' is it' is changed to 'this\' is it'
-        for col in self.text_columns:
-            #Check if the value is not None before replacing quotes
-            if values[col]:
-                values[col] = values[col].replace("'", "\\'")
-
-        # Build string
-        val_str = self.column_format % tuple(values)
-
-        # Change 'None' occurrences with "NULL"
-        val_str = val_str.replace(", None", ", NULL")
-        val_str = val_str.replace("(None", "(NULL")
-        
+
+        # Rows without NULL values, blobs, hexadecimal values or characters
+        # to escape are written with the column format
+        if not self.blob_columns and not self.hex_columns and \
+           None not in row:
+            for col in self.text_columns:
+                if _ESCAPE_CRE.search(row[col]):
+                    break
+            else:
+                return (self.column_format % tuple(row), blob_inserts)
+
+        val_str = " (%s)" % ", ".join([encode(value) for encode, value
+                                       in zip(self.column_encoders, row)])
         return (val_str, blob_inserts)
 
 
@@ -511,7 +652,9 @@ class Table(object):
         """Create bulk insert statements for the data
 
         Reads data from a table (rows) and builds group INSERT statements for
-        bulk inserts.
+        bulk inserts. The values of a statement are collected in a list and
+        joined once, a new statement is started when the statement reaches
+        _MAXBULK_VALUES rows or the maximum packet size.
 
         Note: This method does not print any information to stdout.
 
@@ -526,40 +669,63 @@ class Table(object):
 
         data_inserts = []
         blob_inserts = []
-        row_count = 0
-        data_size = 0
-        val_str = None
+        insert_str = self._insert % (new_db, self.q_tbl_name)
+        max_size = int(self.max_packet_size) - 512 # add buffer
+        values = []
+        data_size = len(insert_str)
         for row in rows:
-            if row_count == 0:
-                insert_str = self._insert % (new_db, self.q_tbl_name)
-                if val_str:
-                    row_count += 1
-                    insert_str += val_str
+            val_str, blobs = self.get_column_string(row, new_db)
+            if blobs:
+                blob_inserts.extend(blobs)
+
+            row_size = len(val_str) + 3
+            if values and (len(values) >= _MAXBULK_VALUES or
+                           data_size + row_size > max_size):
+                data_inserts.append(insert_str + ", ".join(values))
+                values = []
                 data_size = len(insert_str)
+            values.append(val_str)
+            data_size += row_size
 
-            col_data = self.get_column_string(row, new_db)
-            val_str = col_data[0]
+        if values:
+            data_inserts.append(insert_str + ", ".join(values))
 
-            if len(col_data[1]) > 0:
-                blob_inserts.extend(col_data[1])
+        return (data_inserts, blob_inserts)
 
-            row_size = len(val_str)
-            next_size = data_size + row_size + 3
-            if (row_count >= _MAXBULK_VALUES) or \
-                (next_size > (int(self.max_packet_size) - 512)): # add buffer
-                data_inserts.append(insert_str)
-                row_count = 0
-            else:
-                row_count += 1
-                if row_count > 1:
-                    insert_str += ", "
-                insert_str += val_str
-                data_size += row_size + 3
 
-        if row_count > 0 :
-            data_inserts.append(insert_str)
+    def _get_insert_batches(self, rows):
+        """Split rows in batches inserted by one statement
 
-        return (data_inserts, blob_inserts)
+        The size of a batch is bound by _MAXBULK_VALUES rows and by the
+        maximum packet size, estimated from the length of the values with
+        a margin for their escaping.
+
+        rows[in]           a list of rows
+
+        Returns generator of lists of rows
+        """
+        max_size = int(self.max_packet_size) - 512
+        batch = []
+        data_size = 0
+        for row in rows:
+            row_size = 4
+            for value in row:
+                if value is None:
+                    row_size += 6
+                elif isinstance(value, basestring):
+                    length = len(value)
+                    row_size += length + length / 8 + 4
+                else:
+                    row_size += 24
+            if batch and (len(batch) >= _MAXBULK_VALUES or
+                          data_size + row_size > max_size):
+                yield batch
+                batch = []
+                data_size = 0
+            batch.append(row)
+            data_size += row_size
+        if batch:
+            yield batch
 
 
     def get_segment_size(self, num_conn=1):
@@ -604,7 +770,7 @@ class Table(object):
         return (num_rows / max_threads) + max_threads
 
 
-    def _bulk_insert(self, rows, new_db, destination=None):
+    def _bulk_insert(self, row_lists, new_db, destination=None):
         """Import data using bulk insert
 
         Reads data from a table and builds group INSERT statements for writing
@@ -615,7 +781,9 @@ class Table(object):
 
         Note: This method does not print any information to stdout.
 
-        rows[in]           a list of rows to process
+        row_lists[in]      lists of rows to process, e.g. the generator
+                           returned by retrieve_rows(); the statements of
+                           each list are executed before reading the next
         new_db[in]         new database name
         destination[in]    the destination server
         """
@@ -644,6 +812,51 @@ class Table(object):
         if self.column_format is None:
             self.get_column_metadata()
 
+        for rows in row_lists:
+            self.exec_bulk_insert(dest, rows, new_db)
+
+        # Now, turn on foreign keys if they were on at the start
+        dest.disable_foreign_key_checks(False)
+        my_lock.unlock()
+        del dest
+
+
+    def exec_bulk_insert(self, dest, rows, new_db):
+        """Insert rows in the table on a connection using bulk insert
+
+        The rows are passed as parameters of an INSERT statement executed
+        with executemany(), which sends batches of rows (see
+        _get_insert_batches) without building the SQL text of each value,
+        blobs included. Tables with BIT or spatial columns, whose values
+        cannot be passed as string parameters, use the group INSERT
+        statements of make_bulk_insert followed by the blob data updates.
+
+        Note: This method does not print any information to stdout.
+
+        dest[in]           connected destination Server instance
+        rows[in]           a list of rows to process
+        new_db[in]         new database name
+        """
+        if self.column_format is None:
+            self.get_column_metadata()
+
+        if not self.hex_columns:
+            insert = self._insert % (new_db, self.q_tbl_name)
+            insert = "%s(%s)" % (insert.replace("%", "%%"),
+                                 ", ".join(["%s"] * len(self.column_names)))
+            for batch in self._get_insert_batches(rows):
+                options = {
+                    'fetch'       : False,
+                    'executemany' : True,
+                    'params'      : batch,
+                }
+                try:
+                    dest.exec_query(insert, options).close()
+                except UtilError, e:
+                    raise UtilError("Problem inserting data. "
+                                         "Error = %s" % e.errmsg)
+            return
+
         data_lists = self.make_bulk_insert(rows, new_db)
         insert_data = data_lists[0]
         blob_data = data_lists[1]
@@ -659,18 +872,11 @@ class Table(object):
         # Now insert the blob data if there is any
         for blob_insert in blob_data:
             try:
-                # Must convert blob data to a raw string for cursor to handle.
-                res = dest.exec_query(blob_insert[0] % "%r" % blob_insert[1],
-                                      self.query_options)
+                res = dest.exec_query(blob_insert, self.query_options)
             except UtilError, e:
                 raise UtilError("Problem updating blob field. "
                                      "Error = %s" % e.errmsg)
 
-        # Now, turn on foreign keys if they were on at the start
-        dest.disable_foreign_key_checks(False)
-        my_lock.unlock()
-        del dest
-
 
     def insert_rows(self, rows, new_db, destination=None, spawn=False):
         """Insert rows in the table using bulk copy.
@@ -702,9 +908,9 @@ class Table(object):
         proc = None
         if spawn:
             proc = multiprocessing.Process(target=self._bulk_insert,
-                                          args=(rows, new_db, destination))
+                                          args=([rows], new_db, destination))
         else:
-            self._bulk_insert(rows, new_db, destination)
+            self._bulk_insert([rows], new_db, destination)
 
         return proc
 
@@ -749,22 +955,16 @@ class Table(object):
 
         if cloning:
             self._clone_data(new_db)
+        elif num_conn <= 1:
+            # Stream the rows to the destination as they are read
+            self._bulk_insert(self.retrieve_rows(num_conn), new_db,
+                              destination)
         else:
-            # Read and copy the data
-            pthreads = []
-            for rows in self.retrieve_rows(num_conn):
-                p = self.insert_rows(rows, new_db, destination, num_conn > 1)
-                if p is not None:
-                    p.start()
-                    pthreads.append(p)
-    
-            if num_conn > 1:
-                # Wait for all to finish
-                num_complete = 0
-                while num_complete < len(pthreads):
-                    for p in pthreads:
-                        if not p.is_alive():
-                            num_complete += 1
+            from mysql.utilities.common.parallel_copy import ParallelCopy
+
+            copy = ParallelCopy(num_conn, self.quiet)
+            copy.copy_table(self, destination, new_db)
+            copy.finish()
 
 
     def retrieve_rows(self, num_conn=1):
@@ -776,12 +976,23 @@ class Table(object):
 
         Note: if num_conn < 1 - retrieve the data one row at-a-time
 
+        With one connection the rows are read in lists of at most
+        _MAXROWS_PER_CHUNK rows, so a large table is not held in memory: in
+        primary key order with one query per list if the table has a
+        primary key, else from an unbuffered cursor. An empty table gives
+        one empty list.
+
         num_conn[in]       Number of threads(connections) to use
-                           Default = 1 (one large segment)
+                           Default = 1 (lists of _MAXROWS_PER_CHUNK rows)
 
         Returns (yield) row data
         """
 
+        if num_conn == 1:
+            for rows in self._retrieve_chunks(_MAXROWS_PER_CHUNK):
+                yield rows
+            return
+
         segment_size = self.get_segment_size(num_conn)
 
         # Execute query to get all of the data
@@ -797,11 +1008,6 @@ class Table(object):
                     raise StopIteration()
                 rows.append(row)
                 #print "ROWS 1:", rows
-            elif num_conn == 1:
-                rows = cur.fetchall()
-                #print "ROWS 2:", rows
-                yield rows
-                raise StopIteration()
             else:
                 rows = cur.fetchmany(segment_size)
                 if rows == []:
@@ -814,6 +1020,156 @@ class Table(object):
         cur.close()
 
 
+    def get_keyset_columns(self):
+        """Get the primary key columns used to read the table in key order.
+
+        Returns list of tuples (position, quoted name, numeric) in key order
+                or None if the table has no primary key or a key column
+                which can not be compared in key order (e.g. ENUM, FLOAT)
+        """
+        if self._keyset != ():
+            return self._keyset
+        self._keyset = None
+        if self.column_format is None:
+            self.get_column_metadata()
+        col_types = {}
+        for row in self.get_primary_index():
+            col_types[row[0]] = row[1].lower()
+        # SHOW INDEXES lists the key columns in key order
+        key_cols = [row[4] for row in self.get_tbl_indexes()
+                    if row[2] == "PRIMARY"]
+        if not key_cols:
+            return None
+        keyset = []
+        for col in key_cols:
+            type_name = re.match("[a-z]*", col_types.get(col, "")).group(0)
+            if type_name in _KEYSET_NUMERIC_TYPES:
+                numeric = True
+            elif type_name in _KEYSET_STRING_TYPES:
+                numeric = False
+            else:
+                return None
+            keyset.append((self.column_names.index(col),
+                           quote_with_backticks(col), numeric))
+        self._keyset = keyset
+        return keyset
+
+
+    def _retrieve_chunks(self, chunk_size):
+        """Retrieve the table data in lists of rows.
+
+        Each list is read with a query selecting the rows following the
+        last row read in primary key order, so the source connection is
+        free between lists. Tables without a usable primary key are read
+        with an unbuffered cursor.
+
+        The queries do not commit, a transaction started on the source
+        (e.g. for a consistent snapshot) applies to all the lists.
+
+        chunk_size[in]     maximum number of rows in a list
+
+        Returns (yield) lists of rows, one empty list for an empty table
+        """
+        keyset = self.get_keyset_columns()
+        if keyset is None:
+            cur = self.server.exec_query("SELECT * FROM %s" % self.q_table,
+                                         self.query_options)
+            rows = cur.fetchmany(chunk_size)
+            yield rows
+            while rows:
+                rows = cur.fetchmany(chunk_size)
+                if rows:
+                    yield rows
+            cur.close()
+            return
+
+        quote = _get_keyset_quote(keyset)
+        order_by = ", ".join([col for _, col, _ in keyset])
+        condition = None
+        first = True
+        while True:
+            query = "SELECT * FROM %s" % self.q_table
+            if condition:
+                query += " WHERE %s" % condition
+            query += " ORDER BY %s LIMIT %d" % (order_by, chunk_size)
+            cur = self.server.exec_query(query, self.query_options)
+            rows = cur.fetchall()
+            cur.close()
+            if rows or first:
+                yield rows
+            if len(rows) < chunk_size:
+                break
+            first = False
+            condition = _get_keyset_condition(keyset, rows[-1], quote)
+
+
+    def get_key_ranges(self, chunk_size=_MAXROWS_PER_CHUNK):
+        """Split the table in ranges of primary key values.
+
+        The ranges are found reading the primary index only, each range but
+        the last has chunk_size rows. Use get_keyset_columns() first to
+        check that the table can be read in key order.
+
+        chunk_size[in]     number of rows of the ranges
+
+        Returns (yield) tuples (lower, upper) of key values in key order,
+                the lower key is excluded and None for the first range,
+                the upper key is included and None for the last range
+        """
+        keyset = self.get_keyset_columns()
+        if keyset is None:
+            raise UtilError("Table %s cannot be read in primary key order."
+                            % self.q_table)
+        # Positions of the key values in the key rows selected
+        key_cols = [(num, col, numeric)
+                    for num, (_, col, numeric) in enumerate(keyset)]
+        quote = _get_keyset_quote(keyset)
+        order_by = ", ".join([col for _, col, _ in keyset])
+        lower = None
+        while True:
+            query = "SELECT %s FROM %s" % (order_by, self.q_table)
+            if lower is not None:
+                query += " WHERE %s" % _get_keyset_condition(key_cols, lower,
+                                                             quote)
+            query += " ORDER BY %s LIMIT %d, 1" % (order_by, chunk_size - 1)
+            res = self.server.exec_query(query)
+            if not res:
+                yield (lower, None)
+                break
+            upper = tuple(res[0])
+            yield (lower, upper)
+            lower = upper
+
+
+    def retrieve_key_range(self, lower, upper):
+        """Retrieve the rows of a range of primary key values.
+
+        lower[in]          key values after which the range starts, or None
+        upper[in]          last key values of the range, or None
+
+        Returns list of rows in key order
+        """
+        keyset = self.get_keyset_columns()
+        key_cols = [(num, col, numeric)
+                    for num, (_, col, numeric) in enumerate(keyset)]
+        quote = _get_keyset_quote(keyset)
+        conditions = []
+        if lower is not None:
+            conditions.append(_get_keyset_condition(key_cols, lower, quote))
+        if upper is not None:
+            conditions.append(_get_keyset_condition(key_cols, upper, quote,
+                                                    False))
+        query = "SELECT * FROM %s" % self.q_table
+        if conditions:
+            query += " WHERE %s" % " AND ".join(["(%s)" % cond
+                                                 for cond in conditions])
+        query += " ORDER BY %s" % ", ".join([col for _, col, _ in keyset])
+        cur = self.server.exec_query(query, self.query_options)
+        rows = cur.fetchall()
+        cur.close()
+        return rows
+
+
     def get_dest_values(self, destination = None):
         """Get the destination connection values if not already set.
 
@@ -123,6 +123,15 @@ parser.add_option("--event-type", action="store", dest="event_type",
                   "list of event types. Supported values: "
                   + ", ".join(audit_log.EVENT_TYPES))
 
+# Use an index of the log records for repeated searches
+parser.add_option("--index", action="store_true", dest="index",
+                  default=False,
+                  help="Use an index of the log records to find the "
+                  "matching entries without reading the whole log. The index "
+                  "is stored in the file AUDIT_LOG_FILE.idx, created by the "
+                  "first search and updated with the new entries by the "
+                  "next ones.")
+
 # Add regexp option
 add_regexp(parser)
 
@@ -251,6 +260,8 @@ options = {
     'use_regexp': opt.use_regexp,
     'query_type': query_types,
     'event_type': event_types,
+    'stats': opt.stats,
+    'index': opt.index,
 }
 
 try:
@@ -263,19 +274,18 @@ try:
         # Open the audit log file
         log.open_log()
 
-        # Parse the audit log file and apply filters
-        log.parse_log()
-
-        # Close the audit log
-        log.close_log()
-
         if opt.stats:
-            # Show audit log stats
+            # Parse the audit log file and show audit log stats
+            log.parse_log()
             log.show_statistics()
         else:
-            # Print the resulting data (to the sdtout) in the specified format
+            # Parse the audit log file, apply filters and print the
+            # resulting data (to the sdtout) in the specified format
             log.output_formatted_log()
 
+        # Close the audit log
+        log.close_log()
+
 except UtilError:
     _, e, _ = sys.exc_info()
     print("ERROR: %s" % e.errmsg)
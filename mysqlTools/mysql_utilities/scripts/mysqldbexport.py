@@ -30,6 +30,9 @@ import os
 import sys
 import time
 from mysql.utilities.command.dbexport import export_databases
+from mysql.utilities.common.compression import COMPRESSION_TYPES
+from mysql.utilities.common.compression import CompressedWriter
+from mysql.utilities.common.compression import get_compression
 from mysql.utilities.common.options import parse_connection, add_regexp
 from mysql.utilities.common.options import setup_common_options
 from mysql.utilities.common.options import add_skip_options, check_skip_options
@@ -110,6 +113,28 @@ parser.add_option("--file-per-table", action="store_true", dest="file_per_tbl",
                   default=False, help="write table data to separate files. "
                   "Valid only for --export=data or --export=both.")
 
+# Parallel export
+parser.add_option("--threads", action="store", dest="threads", type="int",
+                  default=1, help="use multiple threads (connections) to "
+                  "export the data in a consistent snapshot, splitting large "
+                  "tables in several files, and write the files and the "
+                  "binary log position to export_manifest.json. Valid only "
+                  "for --file-per-table (default: 1)")
+
+# Compressed output
+parser.add_option("--compress", action="store", dest="compress",
+                  type="choice", choices=COMPRESSION_TYPES, default=None,
+                  help="compress the output with gzip, bz2 or zstd (gzip is "
+                  "used if the zstandard module is not installed). The files "
+                  "of --file-per-table are compressed and listed with their "
+                  "checksum in export_manifest.json.")
+
+# LOAD DATA INFILE files
+parser.add_option("--load-data", action="store_true", dest="load_data",
+                  default=False, help="write only the rows of the tables, in "
+                  "the format read by LOAD DATA INFILE. Valid only for "
+                  "--file-per-table with --format=csv or --format=tab.")
+
 # Add the exclude database option
 parser.add_option("-x", "--exclude", action="append", dest="exclude",
                   type="string", default=None, help="exclude one or more "
@@ -173,11 +198,35 @@ check_rpl_options(parser, opt)
 # Fail if we have arguments and all databases option listed.
 check_all(parser, opt, args, "databases")
 
+# The warnings and errors are not written to the compressed output
+messages = sys.stderr if opt.compress else sys.stdout
+
 if opt.skip_blobs and not opt.export == "data":
-    print("# WARNING: --skip-blobs option ignored for metadata export.")
+    messages.write("# WARNING: --skip-blobs option ignored for metadata "
+                   "export.\n")
 
 if opt.file_per_tbl and opt.export in ("definitions", "both"):
-    print("# WARNING: --file-per-table option ignored for metadata export.")
+    messages.write("# WARNING: --file-per-table option ignored for metadata "
+                   "export.\n")
+
+compress = get_compression(opt.compress)
+if compress != opt.compress:
+    messages.write("# WARNING: The zstandard module is not installed, the "
+                   "output is compressed with %s.\n" % compress)
+
+if opt.load_data and (not opt.file_per_tbl or
+                      opt.format not in ("csv", "tab")):
+    parser.error("The --load-data option requires --file-per-table and "
+                 "--format=csv or --format=tab.")
+
+if opt.load_data and opt.compress:
+    parser.error("The --load-data option cannot be used with --compress.")
+
+if opt.threads < 1:
+    parser.error("The --threads value must be positive.")
+
+if opt.threads > 1 and not opt.file_per_tbl:
+    parser.error("The --threads option requires --file-per-table.")
 
 if "data" in skips and opt.export == "data":
     print("ERROR: You cannot use --export=data and --skip-data when exporting "
@@ -204,6 +253,9 @@ options = {
     "verbosity"        : opt.verbosity,
     "debug"            : opt.verbosity >= 3,
     "file_per_tbl"     : opt.file_per_tbl,
+    "load_data"        : opt.load_data,
+    "threads"          : opt.threads,
+    "compress"         : compress,
     "exclude_patterns" : opt.exclude,
     "all"              : opt.all,
     "use_regexp"       : opt.use_regexp,
@@ -233,6 +285,13 @@ for db in args:
     db = remove_backtick_quoting(db) if is_quoted_with_backticks(db) else db
     db_list.append(db)
 
+# The standard output is compressed unless only the data is exported, to
+# the files of the tables
+output = None
+if compress and not (opt.file_per_tbl and opt.export == "data"):
+    output = CompressedWriter(sys.stdout, compress, False)
+    sys.stdout = output
+
 try:
     # record start time
     if opt.verbosity >= 3:
@@ -247,7 +306,12 @@ try:
 
 except UtilError:
     _, e, _ = sys.exc_info()
-    print("ERROR: %s" % e.errmsg)
+    messages.write("ERROR: %s\n" % e.errmsg)
     sys.exit(1)
 
+finally:
+    if output is not None:
+        output.close()
+        sys.stdout = output.file
+
 sys.exit()
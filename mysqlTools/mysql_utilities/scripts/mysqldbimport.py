@@ -86,6 +86,22 @@ parser.add_option("-b", "--bulk-insert", action="store_true",
                   dest="bulk_insert", default=False, help="use bulk insert "
                   "statements for data (default:False)")
 
+# Transaction size
+parser.add_option("--commit-size", action="store", dest="commit_size",
+                  type="int", default=100, help="number of data statements "
+                  "executed in one transaction (default: 100)")
+
+# Threaded/connection mode
+parser.add_option("--threads", action="store", dest="threads", type="int",
+                  default=1, help="use multiple threads (connections) to "
+                  "load the data of the tables (default: 1)")
+
+# LOAD DATA INFILE mode
+parser.add_option("--load-data", action="store_true", dest="load_data",
+                  default=False, help="load the data of csv and tab files "
+                  "with LOAD DATA LOCAL INFILE, also the files of the tables "
+                  "written by the --load-data option of mysqldbexport.")
+
 # Header row
 parser.add_option("-h", "--no-headers", action="store_true", dest="no_headers",
                   default=False, help="files do not contain column headers")
@@ -143,6 +159,14 @@ if "data" in skips and opt.import_type == "data":
           "importing table data.")
     sys.exit(1)
 
+if opt.commit_size < 1 or opt.threads < 1:
+    parser.error("The --commit-size and --threads values must be "
+                 "positive.")
+
+if opt.load_data and opt.format not in ("csv", "tab"):
+    parser.error("The --load-data option requires --format=csv or "
+                 "--format=tab.")
+
 if "create_db" in skips and opt.do_drop:
     print("ERROR: You cannot combine --drop-first and --skip=create_db.")
     exit (1)
@@ -172,6 +196,9 @@ options = {
     "def_engine"    : opt.def_engine,
     "skip_rpl"      : opt.skip_rpl,
     "skip_gtid"     : opt.skip_gtid,
+    "commit_size"   : opt.commit_size,
+    "threads"       : opt.threads,
+    "load_data"     : opt.load_data,
 }
 
 # Parse server connection values
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+#
+# Copyright (c) 2012, 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+
+"""
+This file contains the query digest utility which groups the queries of a
+General or Slow Query Log by fingerprint and reports the top queries
+ordered by count, time or rows.
+"""
+
+from mysql.utilities.common.tools import check_python_version
+
+# Check Python version compatibility
+check_python_version(min_version=(2, 7, 0), max_version=(3, 0, 0))
+
+import multiprocessing
+import optparse
+import os.path
+import sys
+import time
+
+from mysql.utilities.exception import UtilError
+from mysql.utilities.common.digest import QueryDigest, ORDER_BY
+from mysql.utilities.common.digest import SlidingDigest, WINDOW_ORDER_BY
+from mysql.utilities.common.format import print_list
+from mysql.utilities.common.options import add_format_option
+from mysql.utilities.common.options import CaseInsensitiveChoicesOption
+from mysql.utilities.common.parallel_log import parallel_digest
+from mysql.utilities.common.parser import GeneralQueryLog
+from mysql.utilities.common.parser import SlowQueryLogReader, open_log_file
+from mysql.utilities.common.parser import LogTail
+from mysql.utilities import VERSION_FRM
+
+# Constants
+NAME = "MySQL Utilities - mysqlquerydigest "
+DESCRIPTION = "mysqlquerydigest - report the top queries of a query log "
+USAGE = "%prog [options] QUERY_LOG_FILE "
+
+LOG_TYPES = ('auto', 'slow', 'general')
+
+# Setup the command parser
+parser = optparse.OptionParser(
+    version=VERSION_FRM.format(program=os.path.basename(sys.argv[0])),
+    description=DESCRIPTION,
+    usage=USAGE,
+    add_help_option=False,
+    option_class=CaseInsensitiveChoicesOption)
+
+# Default option to provide help information
+parser.add_option("--help", action="help", help="display this help message "
+                  "and exit")
+
+# Setup utility-specific options:
+add_format_option(parser, "display the output in either grid (default), "
+                  "tab, csv, or vertical format", "grid")
+
+parser.add_option("--log-type", action="store", dest="log_type",
+                  type="choice", choices=LOG_TYPES, default="auto",
+                  help="type of the query log: auto (default), slow or "
+                  "general. A slow log can also be read from a .gz file or "
+                  "from stdin ('-').")
+
+parser.add_option("--order-by", action="store", dest="order_by",
+                  type="choice", choices=ORDER_BY, default=None,
+                  help="order fingerprints by one of: " + ", ".join(ORDER_BY)
+                  + ". Default is total_time for the slow log and count "
+                  "for the general log.")
+
+parser.add_option("-n", "--top", action="store", dest="top", type="int",
+                  default=10, help="number of fingerprints to report. "
+                  "Default is 10.")
+
+parser.add_option("--max-fingerprints", action="store",
+                  dest="max_fingerprints", type="int", default=10000,
+                  help="fingerprints kept in memory, the least important "
+                  "ones are dropped above twice this number. Default is "
+                  "10000.")
+
+parser.add_option("--processes", action="store", dest="processes",
+                  type="int", default=multiprocessing.cpu_count(),
+                  help="number of processes parsing parts of the log in "
+                  "parallel. Compressed logs and stdin are read by one "
+                  "process. Default is the number of processors.")
+
+parser.add_option("--follow", action="store_true", dest="follow",
+                  default=False, help="follow the log as the server writes "
+                  "it, also when it is rotated or truncated, and report the "
+                  "top queries of the last 1, 5 and 15 minutes. Stop with "
+                  "CTRL+C.")
+
+parser.add_option("--interval", action="store", dest="interval",
+                  type="float", default=10.0, help="seconds between two "
+                  "reports in --follow mode. Default is 10.")
+
+
+def detect_log_type(stream):
+    """Return 'slow' if the stream looks like a Slow Query Log
+    """
+    log_type = 'general'
+    for _ in range(10):
+        line = stream.readline()
+        if not line:
+            break
+        if line.startswith(('# Time:', '# User@Host:', '# Query_time:')):
+            log_type = 'slow'
+            break
+    stream.seek(0)
+    return log_type
+
+
+def follow_log(file_name, log_type, order_by, opt):
+    """Report the top queries of sliding windows while the log grows
+    """
+    tail = LogTail(file_name, log_type)
+    sliding = SlidingDigest(max_fingerprints=opt.max_fingerprints)
+    try:
+        while True:
+            time.sleep(opt.interval)
+            now = time.time()
+            for entry in tail.read_entries():
+                sliding.add_entry(entry, now)
+            sliding.advance(now)
+            print("# %s: %d queries since start." %
+                  (time.strftime("%Y-%m-%d %H:%M:%S"),
+                   sliding.digest.entries))
+            for window in sliding.windows:
+                count = sliding.get_count(window)
+                print("# Last %d minutes: %d queries, %.2f per second." %
+                      (window // 60, count,
+                       count / sliding.get_seconds(window)))
+                if count:
+                    columns, rows = sliding.get_rows(window, opt.top,
+                                                     order_by)
+                    print_list(sys.stdout, opt.format, columns, rows)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tail.close()
+
+
+# Parse the command line arguments.
+opt, args = parser.parse_args()
+
+# Only one positional argument is allowed: the query log file
+if len(args) != 1:
+    parser.error("You must specify one query log file to be processed.")
+if args[0] != '-' and not os.path.isfile(args[0]):
+    parser.error("The specified argument is not a file: %s" % args[0])
+if args[0] == '-' and opt.log_type == 'general':
+    parser.error("The general log can not be read from stdin.")
+if opt.top < 1 or opt.max_fingerprints < 1 or opt.processes < 1:
+    parser.error("The --top, --max-fingerprints and --processes values "
+                 "must be positive.")
+if opt.follow:
+    if args[0] == '-' or args[0].endswith('.gz'):
+        parser.error("The --follow option needs an uncompressed log file.")
+    if opt.order_by and opt.order_by not in WINDOW_ORDER_BY:
+        parser.error("The --follow option supports --order-by values: %s."
+                     % ", ".join(WINDOW_ORDER_BY))
+    if opt.interval <= 0:
+        parser.error("The --interval value must be positive.")
+
+try:
+    stream = open_log_file(args[0])
+    log_type = opt.log_type
+    if log_type == 'auto':
+        log_type = 'slow' if args[0] == '-' else detect_log_type(stream)
+    order_by = opt.order_by or ('total_time' if log_type == 'slow'
+                                else 'count')
+
+    if opt.follow:
+        stream.close()
+        follow_log(args[0], log_type, order_by, opt)
+        sys.exit(0)
+
+    if opt.processes > 1 and args[0] != '-' and not args[0].endswith('.gz'):
+        stream.close()
+        digest = parallel_digest(args[0], log_type, opt.processes,
+                                 opt.max_fingerprints)
+    else:
+        if log_type == 'slow':
+            log = SlowQueryLogReader(stream)
+        else:
+            log = GeneralQueryLog(stream)
+        digest = QueryDigest(max_fingerprints=opt.max_fingerprints)
+        digest.add_log(log)
+        stream.close()
+
+    print("# %s log: %d queries, %d fingerprints, ordered by %s." %
+          (log_type, digest.entries, len(digest.stats), order_by))
+    if digest.dropped_fingerprints:
+        print("# %d fingerprints (%d queries) dropped to bound memory, "
+              "counts may be low by up to %d." %
+              (digest.dropped_fingerprints, digest.dropped_entries,
+               digest.max_dropped_count))
+    columns, rows = digest.get_rows(opt.top, order_by)
+    print_list(sys.stdout, opt.format, columns, rows)
+
+except UtilError:
+    _, e, _ = sys.exc_info()
+    print("ERROR: %s" % e.errmsg)
+    sys.exit(1)
+
+sys.exit(0)
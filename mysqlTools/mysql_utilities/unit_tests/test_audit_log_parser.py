@@ -0,0 +1,227 @@
+#
+# Copyright (c) 2011, 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""
+This files contains unit tests for the streaming parser of the audit log.
+"""
+
+import sys
+import os.path
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOTPATH = os.path.split(_HERE)[0]
+sys.path.append(_ROOTPATH)
+
+import datetime
+import shutil
+import tempfile
+import types
+import unittest
+
+from mysql.utilities.exception import UtilError
+from mysql.utilities.common import audit_log_parser
+from mysql.utilities.common.audit_log_parser import AuditLogParser
+from mysql.utilities.common.audit_log_index import AuditLogIndex
+
+STD_DATA = os.path.join(_ROOTPATH, 'mysql-test', 'std_data')
+AUDIT_LOG = os.path.join(STD_DATA, 'audit.log.13488316109086370')
+INVALID_LOG = os.path.join(STD_DATA, 'audit.log.invalid')
+
+
+def _parse(log_name, **options):
+    """Parse an audit log, return the parser
+    """
+    opts = {
+        'log_name': log_name,
+        'verbosity': 0,
+        'format': 'GRID',
+        'users': None,
+        'start_date': None,
+        'end_date': None,
+        'pattern': None,
+        'event_type': None,
+        'query_type': None,
+    }
+    opts.update(options)
+    log = AuditLogParser(opts)
+    log.open_log()
+    try:
+        log.parse_log()
+    finally:
+        log.close_log()
+    return log
+
+
+def _matches(record, event_type=None, start_date=None, end_date=None):
+    """Apply the criteria without any shortcut
+    """
+    if event_type and record['NAME'].lower() not in event_type:
+        return False
+    if start_date and record['TIMESTAMP'] < start_date:
+        return False
+    if end_date and record['TIMESTAMP'] > end_date:
+        return False
+    return True
+
+
+class TestAuditLogParser(unittest.TestCase):
+    def setUp(self):
+        self.all_rows = _parse(AUDIT_LOG).rows
+
+    def test_iter_log(self):
+        log = AuditLogParser({'log_name': AUDIT_LOG, 'format': 'GRID',
+                              'users': None, 'start_date': None,
+                              'end_date': None, 'pattern': None,
+                              'event_type': None, 'query_type': None})
+        log.open_log()
+        rows = log.iter_log()
+        self.assertTrue(isinstance(rows, types.GeneratorType))
+        self.assertEqual(self.all_rows, list(rows))
+        log.close_log()
+        self.assertEqual([], log.rows)
+
+    def test_raw_filters(self):
+        event_type = ['query', 'connect']
+        start_date = '2012-09-27T13:33:47'
+        end_date = '2012-09-28T11:26:50'
+        log = _parse(AUDIT_LOG, event_type=event_type,
+                     start_date=start_date, end_date=end_date)
+        exp = [row for row in self.all_rows
+               if _matches(row, event_type=event_type, start_date=start_date,
+                           end_date=end_date)]
+        self.assertTrue(exp)
+        self.assertEqual(exp, log.rows)
+
+        log = _parse(AUDIT_LOG, format='raw', end_date=end_date)
+        self.assertTrue(log.rows[0].lstrip().startswith('<AUDIT_RECORD'))
+        self.assertEqual(len([row for row in self.all_rows
+                              if _matches(row, end_date=end_date)]),
+                         len(log.rows))
+
+    def test_masked_values(self):
+        log = _parse(AUDIT_LOG, pattern=r'.*<.*')
+        self.assertTrue(log.rows)
+        for row in log.rows:
+            self.assertTrue('&lt;' not in row.get('SQLTEXT', ''))
+
+    def test_users(self):
+        log = _parse(AUDIT_LOG, users=['tester'])
+        self.assertTrue(log.rows)
+        ids = set([conn_id for _, _, conn_id in log.connection_ids])
+        for row in log.rows:
+            self.assertTrue(row.get('USER') == 'tester'
+                            or row.get('PRIV_USER') == 'tester'
+                            or row.get('CONNECTION_ID') in ids)
+
+    def test_invalid(self):
+        self.assertRaises(UtilError, _parse, INVALID_LOG)
+        self.assertRaises(UtilError, _parse, INVALID_LOG,
+                          event_type=['connect'])
+
+    def test_seek_datetime(self):
+        start = datetime.datetime(2013, 1, 1)
+        log_file = tempfile.NamedTemporaryFile(suffix='.log')
+        log_file.write('<?xml version="1.0" encoding="UTF-8"?>\n<AUDIT>\n')
+        for num in range(3000):
+            log_file.write(
+                '  <AUDIT_RECORD TIMESTAMP="%s" NAME="Query" '
+                'CONNECTION_ID="%d" STATUS="0" SQLTEXT="select %d"/>\n'
+                % ((start + datetime.timedelta(seconds=num)).isoformat(),
+                   num % 5, num))
+        log_file.write('</AUDIT>\n')
+        log_file.flush()
+        self.assertTrue(os.path.getsize(log_file.name) >
+                        2 * audit_log_parser._SEEK_MIN_RANGE)
+
+        log = _parse(log_file.name, start_date='2013-01-01T00:40:00',
+                     end_date='2013-01-01T00:40:09')
+        self.assertEqual(['select %d' % num for num in range(2400, 2410)],
+                         [row['SQLTEXT'] for row in log.rows])
+        log_file.close()
+
+
+class TestAuditLogIndex(unittest.TestCase):
+    SEARCHES = [
+        {},
+        {'users': ['tester']},
+        {'users': ['root'], 'query_type': ['show']},
+        {'event_type': ['query', 'connect']},
+        {'query_type': ['select', 'create']},
+        {'start_date': '2012-09-27T13:33:47',
+         'end_date': '2012-09-28T11:26:50'},
+        {'start_date': '2012-09-28T00:00:00', 'event_type': ['quit'],
+         'users': ['tester']},
+        {'pattern': r'.*<.*', 'format': 'raw'},
+    ]
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_name = os.path.join(self.tmp_dir, 'audit.log')
+        self.lines = open(AUDIT_LOG).readlines()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_log(self, lines, mode='w'):
+        log_file = open(self.log_name, mode)
+        log_file.writelines(lines)
+        log_file.close()
+
+    def _check_searches(self):
+        for search in self.SEARCHES:
+            exp = _parse(self.log_name, **search)
+            log = _parse(self.log_name, index=True, **search)
+            self.assertEqual(exp.rows, log.rows, msg=repr(search))
+            self.assertEqual(exp.header_rows, log.header_rows)
+            self.assertEqual(exp.connection_ids, log.connection_ids)
+
+    def test_searches(self):
+        self._write_log(self.lines)
+        self._check_searches()
+        self.assertTrue(os.path.exists(self.log_name + '.idx'))
+
+    def test_update(self):
+        half = len(self.lines) // 2
+        self._write_log(self.lines[:half])
+        index = AuditLogIndex(self.log_name)
+        index.open()
+        reader = AuditLogParser({'log_name': self.log_name})
+        num_records = index.update(reader._parse_line)
+        self.assertTrue(num_records > 0)
+        self.assertEqual(0, index.update(reader._parse_line))
+
+        # Records appended to the log, the last one being written
+        self._write_log(self.lines[half:-2] + [self.lines[-2][:20]], 'a')
+        num_records += index.update(reader._parse_line)
+        self._write_log([self.lines[-2][20:], self.lines[-1]], 'a')
+        num_records += index.update(reader._parse_line)
+        self.assertEqual(len(_parse(self.log_name).rows), num_records)
+        index.close()
+        self._check_searches()
+
+    def test_rotated(self):
+        self._write_log(self.lines)
+        _parse(self.log_name, index=True)
+        # Replaced by a log with the same head but less records
+        os.unlink(self.log_name)
+        self._write_log(self.lines[:len(self.lines) // 2])
+        self._check_searches()
+        # Overwritten by a longer log
+        self._write_log(self.lines[:10] + self.lines)
+        self._check_searches()
+
+
+if __name__ == "__main__":
+    unittest.main()
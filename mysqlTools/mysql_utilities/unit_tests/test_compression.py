@@ -0,0 +1,105 @@
+#
+# Copyright (c) 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""
+This files contains unit tests for the compressed export files and their
+checksums.
+"""
+
+import sys
+import os.path
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOTPATH = os.path.split(_HERE)[0]
+sys.path.append(_ROOTPATH)
+
+import gzip
+import hashlib
+import shutil
+import tempfile
+import unittest
+
+from mysql.utilities.command import dbexport
+from mysql.utilities.command import dbimport
+from mysql.utilities.common import compression
+
+_LINES = ["# Data for table `db1`.`t%d`:\n" % num for num in range(3)] + \
+         ["INSERT INTO `db1`.`t1` VALUES (%d, 'x');\n" % num
+          for num in range(20000)] + ["last line"]
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, file_name, compress):
+        file_name = os.path.join(self.tmpdir, file_name)
+        writer = compression.CompressedWriter(open(file_name, "wb"),
+                                              compress)
+        writer.writelines(_LINES)
+        writer.close()
+        return file_name, writer.checksum()
+
+    def test_round_trip(self):
+        for compress in (None, "gzip", "bz2"):
+            file_name, checksum = self._write("export.sql", compress)
+            self.assertEqual(compress,
+                             compression.detect_compression(file_name))
+            self.assertEqual(hashlib.sha256(open(file_name, "rb").read())
+                             .hexdigest(), checksum)
+            reader = compression.open_compressed(file_name, True)
+            self.assertEqual(None, reader.checksum())
+            self.assertEqual(_LINES, list(reader))
+            self.assertEqual(checksum, reader.checksum())
+            # The file can be read again from the start
+            reader.seek(0)
+            self.assertEqual(_LINES[0], reader.readline())
+            reader.close()
+
+    def test_gzip_streams(self):
+        file_name = os.path.join(self.tmpdir, "export.sql.gz")
+        for lines in (_LINES[:2], _LINES[2:]):
+            gzip_file = gzip.open(file_name, "ab")
+            gzip_file.writelines(lines)
+            gzip_file.close()
+        reader = compression.open_compressed(file_name)
+        self.assertEqual(_LINES, list(reader))
+        reader.close()
+
+    def test_extension(self):
+        self.assertEqual(".gz", compression.get_file_extension("gzip"))
+        self.assertEqual("", compression.get_file_extension(None))
+        self.assertEqual("db1.t1.chunk0002.csv.bz2",
+                         dbexport._get_file_name("db1.t1", "csv", 2, "bz2"))
+
+    def test_manifest_checksum(self):
+        file_name, checksum = self._write("db1.t1.sql.gz", "gzip")
+        manifest = {'format': "sql", 'compression': "gzip",
+                    'tables': [{'table': "`db1`.`t1`",
+                                'files': [{'file': "db1.t1.sql.gz",
+                                           'sha256': checksum}]}]}
+        dbexport.write_manifest(manifest, os.path.join(
+            self.tmpdir, dbexport.MANIFEST_FILE))
+        self.assertEqual(checksum, dbimport._get_manifest_checksum(file_name))
+        self.assertEqual(checksum, dbimport._get_file_checksum(file_name))
+        self.assertEqual(None, dbimport._get_manifest_checksum(
+            os.path.join(self.tmpdir, "db1.t2.sql.gz")))
+
+
+if __name__ == "__main__":
+    unittest.main()
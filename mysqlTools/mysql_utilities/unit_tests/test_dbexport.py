@@ -0,0 +1,190 @@
+#
+# Copyright (c) 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""
+This files contains unit tests for the parallel export of the data of
+tables.
+"""
+
+import sys
+import os.path
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOTPATH = os.path.split(_HERE)[0]
+sys.path.append(_ROOTPATH)
+
+import multiprocessing
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+from mysql.utilities.exception import UtilError
+from mysql.utilities.command import dbexport
+from mysql.utilities.common import parallel_copy
+
+
+class _Cursor(object):
+    def close(self):
+        pass
+
+
+class _Server(object):
+    """Server recording the statements executed, in a queue for the servers
+    of the workers
+    """
+    host = 'localhost'
+    user = 'root'
+    passwd = None
+    socket = None
+    port = 3306
+
+    def __init__(self, log=None, fail=None):
+        self.log = log
+        self.fail_query = fail
+        self.executed = []
+
+    def exec_query(self, query, options={}):
+        if query == self.fail_query:
+            raise UtilError("Query failed.")
+        if self.log is not None:
+            self.log.put(query)
+        self.executed.append(query)
+        if query == "SHOW MASTER STATUS":
+            return [("mysql-bin.000003", "154", "", "")]
+        if not options.get('fetch', True):
+            return _Cursor()
+        return []
+
+    def supports_gtid(self):
+        return "OFF"
+
+
+class TestFiles(unittest.TestCase):
+    def test_file_name(self):
+        self.assertEqual("db1.t1.sql",
+                         dbexport._get_file_name("db1.t1", "sql"))
+        self.assertEqual("db1.t1.chunk0012.csv",
+                         dbexport._get_file_name("db1.t1", "csv", 12))
+
+    def test_group_key_ranges(self):
+        key_ranges = [(None, ("10",)), (("10",), ("20",)), (("20",), None)]
+        self.assertEqual([key_ranges[:2], key_ranges[2:]],
+                         list(dbexport._group_key_ranges(key_ranges, 2)))
+        self.assertEqual([key_ranges],
+                         list(dbexport._group_key_ranges(key_ranges)))
+
+    def test_manifest(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(tmpdir, "manifest.json")
+            manifest = {
+                'format'   : "csv",
+                'snapshot' : {'binlog_file': "mysql-bin.000003",
+                              'binlog_position': 154,
+                              'gtid_executed': None},
+                'tables'   : [{'table': "`db1`.`t1`",
+                               'files': [{'file': "db1.t1.chunk0001.csv",
+                                          'rows': 2, 'lower': None,
+                                          'upper': ["caf\xe9", "1"]}]}],
+            }
+            dbexport.write_manifest(manifest, file_name)
+            read = dbexport.read_manifest(file_name)
+            self.assertEqual(154, read['snapshot']['binlog_position'])
+            tbl_file = read['tables'][0]['files'][0]
+            self.assertEqual(u"caf\xe9",
+                             tbl_file['upper'][0])
+            self.assertEqual("db1.t1.chunk0001.csv", tbl_file['file'])
+            self.assertRaises(UtilError, dbexport.read_manifest,
+                              os.path.join(tmpdir, "missing.json"))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_load_data_rows(self):
+        output = StringIO.StringIO()
+        num_rows = dbexport._export_table_rows([[("1", None)], [("2", "b")]],
+                                               None, "tab", False, False,
+                                               load_data=True,
+                                               outfile=output)
+        self.assertEqual(2, num_rows)
+        self.assertEqual("1\t\\N\n2\tb\n", output.getvalue())
+
+
+class TestParallelExport(unittest.TestCase):
+    def setUp(self):
+        self.get_snapshot_servers = parallel_copy.get_snapshot_servers
+        self.log = multiprocessing.Queue()
+        self.fail_query = None
+
+        def _get_snapshot_servers(conn_val):
+            # Called in the worker processes
+            return (_Server(), _Server(self.log, self.fail_query))
+        parallel_copy.get_snapshot_servers = _get_snapshot_servers
+
+    def tearDown(self):
+        parallel_copy.get_snapshot_servers = self.get_snapshot_servers
+
+    def _get_worker_queries(self):
+        queries = []
+        while not self.log.empty():
+            queries.append(self.log.get())
+        return queries
+
+    def test_snapshot(self):
+        source = _Server()
+        export = dbexport._ParallelExport(source, 2, quiet=True)
+        export.finish()
+        # The snapshots are started while the source is locked
+        self.assertEqual(["FLUSH TABLES WITH READ LOCK", "SHOW MASTER STATUS",
+                          "UNLOCK TABLES"], source.executed)
+        self.assertEqual({'binlog_file': "mysql-bin.000003",
+                          'binlog_position': 154, 'gtid_executed': None},
+                         export.snapshot)
+        self.assertEqual(sorted([parallel_copy._SESSION_ISOLATION_LEVEL,
+                                 parallel_copy._START_TRANSACTION] * 2),
+                         sorted(self._get_worker_queries()))
+
+    def test_read_positions(self):
+        source = _Server()
+
+        def _read_positions():
+            source.exec_query("SELECT @@GLOBAL.GTID_EXECUTED")
+            return "positions"
+        export = dbexport._ParallelExport(source, 2, True, True,
+                                          _read_positions)
+        export.finish()
+        # The positions are read before the source is unlocked
+        self.assertEqual(["FLUSH TABLES WITH READ LOCK", "SHOW MASTER STATUS",
+                          "SELECT @@GLOBAL.GTID_EXECUTED", "UNLOCK TABLES"],
+                         source.executed)
+        self.assertEqual("positions", export.positions)
+
+    def test_no_lock(self):
+        source = _Server()
+        export = dbexport._ParallelExport(source, 2, False, True)
+        export.finish()
+        self.assertEqual(["SHOW MASTER STATUS"], source.executed)
+
+    def test_error(self):
+        self.fail_query = parallel_copy._START_TRANSACTION
+        source = _Server()
+        self.assertRaises(UtilError, dbexport._ParallelExport, source, 2,
+                          True, True)
+        # The source is unlocked
+        self.assertEqual("UNLOCK TABLES", source.executed[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,331 @@
+#
+# Copyright (c) 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""
+This files contains unit tests for the execution of the statements of an
+import file.
+"""
+
+import sys
+import os.path
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOTPATH = os.path.split(_HERE)[0]
+sys.path.append(_ROOTPATH)
+
+import StringIO
+import unittest
+
+from mysql.utilities.exception import UtilError
+from mysql.utilities.command import dbimport
+from mysql.utilities.common.format import format_load_data_list
+
+
+class _Cursor(object):
+    def close(self):
+        pass
+
+
+class _Server(object):
+    """Server recording the statements executed and the commits
+    """
+    def __init__(self, fail=None, log=None):
+        self.fail_query = fail
+        self.executed = []
+        self.log = log
+
+    def exec_query(self, query, options={}):
+        if query == self.fail_query:
+            raise UtilError("Query failed.")
+        if query == "COMMIT":
+            self.executed.append(query)
+            return []
+        if options.get('fetch', True):
+            # Statements executed with a fetch are committed
+            self.executed.append(query)
+            self.executed.append("COMMIT")
+            return []
+        self.executed.append(query)
+        if self.log is not None:
+            self.log.append(query)
+        return _Cursor()
+
+    def get_connection_values(self):
+        return {'user': 'root', 'host': 'localhost'}
+
+    def disable_foreign_key_checks(self, disable=True):
+        self.executed.append("SET foreign_key_checks = OFF")
+
+    def disconnect(self):
+        pass
+
+
+class _Lines(object):
+    """File which can only be iterated
+    """
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __iter__(self):
+        return iter(self.lines)
+
+
+class TestStatementQueue(unittest.TestCase):
+    def test_commit_size(self):
+        server = _Server()
+        queue = dbimport._StatementQueue(server, "sql", {'commit_size': 2})
+        queue.extend(["CREATE TABLE db1.t1 (a int);"] +
+                     ["INSERT INTO db1.t1 VALUES (%d);" % num
+                      for num in range(5)] + ["USE db1;"] +
+                     ["INSERT INTO db1.t1 VALUES (5);"])
+        self.assertEqual([], server.executed)
+        queue.close()
+        self.assertEqual(["CREATE TABLE db1.t1 (a int);", "COMMIT",
+                          "INSERT INTO db1.t1 VALUES (0);",
+                          "INSERT INTO db1.t1 VALUES (1);", "COMMIT",
+                          "INSERT INTO db1.t1 VALUES (2);",
+                          "INSERT INTO db1.t1 VALUES (3);", "COMMIT",
+                          "INSERT INTO db1.t1 VALUES (4);",
+                          "USE db1;", "COMMIT",
+                          "INSERT INTO db1.t1 VALUES (5);", "COMMIT"],
+                         server.executed)
+
+    def test_batches(self):
+        server = _Server()
+        queue = dbimport._StatementQueue(server, "sql", {})
+        num_statements = dbimport._BATCH_STATEMENTS * 2 + 1
+        for num in range(num_statements):
+            queue.append("INSERT INTO db1.t1 VALUES (%d);" % num)
+            # Only the statements of the current batch are held
+            self.assertTrue(len(queue.statements) <
+                            dbimport._BATCH_STATEMENTS)
+        queue.close()
+        inserts = [query for query in server.executed
+                   if query.startswith("INSERT")]
+        self.assertEqual(num_statements, len(inserts))
+        self.assertEqual(num_statements // dbimport._COMMIT_SIZE + 1,
+                         server.executed.count("COMMIT"))
+
+    def test_error(self):
+        server = _Server("INSERT INTO db1.t1 VALUES (2);")
+        queue = dbimport._StatementQueue(server, "sql", {})
+        queue.extend(["INSERT INTO db1.t1 VALUES (%d);" % num
+                      for num in range(4)])
+        self.assertRaises(UtilError, queue.close)
+        # The statements executed before the error are committed
+        self.assertEqual(["INSERT INTO db1.t1 VALUES (0);",
+                          "INSERT INTO db1.t1 VALUES (1);", "COMMIT"],
+                         server.executed)
+
+    def test_dryrun(self):
+        server = _Server()
+        queue = dbimport._StatementQueue(server, "sql", {}, True)
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            queue.append("INSERT INTO db1.t1 VALUES (1);")
+            queue.close()
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        self.assertEqual([], server.executed)
+
+
+class TestParallelStatementQueue(unittest.TestCase):
+    def setUp(self):
+        self.get_thread_server = dbimport._get_thread_server
+        self.servers = []
+        self.log = []
+
+        def _get_thread_server(conn_val, local_infile=False):
+            server = _Server(self.fail_query, self.log)
+            server.disable_foreign_key_checks(True)
+            server.exec_query("SET SESSION unique_checks = 0", {})
+            del server.executed[:]
+            self.servers.append(server)
+            return server
+        dbimport._get_thread_server = _get_thread_server
+        self.fail_query = None
+
+    def tearDown(self):
+        dbimport._get_thread_server = self.get_thread_server
+
+    def _import(self, statements, threads=3):
+        destination = _Server()
+        queue = dbimport._ParallelStatementQueue(destination, "sql",
+                                                 {'commit_size': 2}, threads)
+        queue.extend(statements)
+        queue.close()
+        return destination
+
+    def test_import(self):
+        inserts = ["INSERT INTO `db1`.`t%d` VALUES (%d);" % (num % 3, num)
+                   for num in range(30)]
+        statements = ["USE `db1`;",
+                      "CREATE TABLE `db1`.`t1` (a int);",
+                      "CREATE ALGORITHM=UNDEFINED DEFINER=`root`@`localhost` "
+                      "SQL SECURITY DEFINER VIEW `db1`.`v1` AS select 1;",
+                      "CREATE DEFINER=`root`@`localhost` TRIGGER "
+                      "`db1`.`trg` AFTER INSERT ON `db1`.`t1` FOR EACH ROW "
+                      "SET @a = 1;",
+                      "GRANT SELECT ON `db1`.`v1` TO 'joe'@'%'"] + inserts
+        destination = self._import(statements)
+        self.assertEqual(3, len(self.servers))
+        # The views, triggers and grants are executed after the data
+        self.assertEqual(["USE `db1`;", "CREATE TABLE `db1`.`t1` (a int);"]
+                         + statements[2:5],
+                         [query for query in destination.executed
+                          if query != "COMMIT"])
+        executed = [query for server in self.servers
+                    for query in server.executed
+                    if query.startswith("INSERT")]
+        self.assertEqual(sorted(inserts), sorted(executed))
+
+    def test_blob_updates(self):
+        statements = ["INSERT INTO t1 VALUES (%d, NULL);" % num
+                      for num in range(20)]
+        statements += ["UPDATE t1 SET b = 'x' WHERE a = %d;" % num
+                       for num in range(20)]
+        self._import(["USE db1;"] + statements)
+        # The rows are inserted before their blobs are set
+        self.assertEqual(sorted(statements[:20]), sorted(self.log[:20]))
+        self.assertEqual(sorted(statements[20:]), sorted(self.log[20:]))
+        # Unqualified tables are read after the USE of the database
+        for server in self.servers:
+            if server.executed:
+                self.assertEqual("USE db1", server.executed[0])
+
+    def test_use_databases(self):
+        self._import(["USE db1;", "INSERT INTO t1 VALUES (1);",
+                      "USE db2;", "CREATE TABLE t2 (a int);",
+                      "INSERT INTO t2 VALUES (2);"])
+        # Each batch is executed in the database current when it was read
+        used = {}
+        for server in self.servers:
+            db_name = None
+            for query in server.executed:
+                if query.startswith("USE"):
+                    db_name = query
+                elif query.startswith("INSERT"):
+                    used[query] = db_name
+        self.assertEqual({"INSERT INTO t1 VALUES (1);": "USE db1",
+                          "INSERT INTO t2 VALUES (2);": "USE db2"}, used)
+
+    def test_gtid_session(self):
+        session = ["SET @MYSQLUTILS_TEMP_LOG_BIN = @@SESSION.SQL_LOG_BIN;",
+                   "SET @@SESSION.SQL_LOG_BIN = 0;"]
+        inserts = ["INSERT INTO `db1`.`t%d` VALUES (%d);" % (num % 3, num)
+                   for num in range(30)]
+        destination = self._import(
+            session + ["SET @@GLOBAL.GTID_PURGED = 'uuid:1-5';"] + inserts +
+            ["SET @@SESSION.SQL_LOG_BIN = @MYSQLUTILS_TEMP_LOG_BIN;"])
+        self.assertTrue("SET @@GLOBAL.GTID_PURGED = 'uuid:1-5';" in
+                        destination.executed)
+        # The rows are not binary logged by the threads either
+        for server in self.servers:
+            executed = [query for query in server.executed
+                        if query != "COMMIT"]
+            if [query for query in executed if query.startswith("INSERT")]:
+                self.assertEqual(session, executed[:2])
+            self.assertFalse([query for query in executed
+                              if "GTID_PURGED" in query])
+
+    def test_error(self):
+        self.fail_query = "INSERT INTO `db1`.`t1` VALUES (5);"
+        statements = ["INSERT INTO `db1`.`t1` VALUES (%d);" % num
+                      for num in range(10)]
+        self.assertRaises(UtilError, self._import, statements)
+
+
+class _LoadServer(_Server):
+    """Server reading the files of the LOAD DATA statements
+    """
+    def __init__(self):
+        _Server.__init__(self)
+        self.loaded = []
+
+    def exec_query(self, query, options={}):
+        if query.startswith("LOAD DATA"):
+            file_name = query.split("'")[1]
+            self.loaded.append(open(file_name).read())
+        return _Server.exec_query(self, query, options)
+
+
+class TestLoadData(unittest.TestCase):
+    def test_format(self):
+        rows = [("1", None, "a\tb\nc\\d"), (2, "", 'say "hi",\0')]
+        output = StringIO.StringIO()
+        format_load_data_list(output, rows)
+        self.assertEqual('1\t\\N\ta\\tb\\nc\\\\d\n'
+                         '2\t\tsay "hi",\\0\n', output.getvalue())
+        output = StringIO.StringIO()
+        format_load_data_list(output, rows, ',')
+        self.assertEqual('"1",\\N,"a\tb\\nc\\\\d"\n'
+                         '"2","","say \\"hi\\",\\0"\n', output.getvalue())
+
+    def test_statement(self):
+        self.assertEqual("LOAD DATA LOCAL INFILE '/tmp/db1.t1.tab' INTO "
+                         "TABLE `db1`.`t1` FIELDS TERMINATED BY '\\t' "
+                         "ESCAPED BY '\\\\' LINES TERMINATED BY '\\n'",
+                         dbimport._build_load_data("/tmp/db1.t1.tab",
+                                                   "`db1`.`t1`", "tab"))
+        self.assertEqual("LOAD DATA LOCAL INFILE 'it\\'s.csv' INTO TABLE "
+                         "`db1`.`t1` CHARACTER SET latin1 FIELDS TERMINATED "
+                         "BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY "
+                         "'\\\\' LINES TERMINATED BY '\\n' (`a`, `b c`)",
+                         dbimport._build_load_data("it's.csv", "`db1`.`t1`",
+                                                   "csv", ["`a`", "b c"],
+                                                   "latin1"))
+
+    def test_table_name(self):
+        self.assertEqual("`db1`.`t1`",
+                         dbimport._get_load_data_table("/tmp/db1.t1.csv"))
+        self.assertEqual("`db1`.`t1.old`",
+                         dbimport._get_load_data_table("db1.t1.old.tab"))
+        self.assertRaises(UtilError, dbimport._get_load_data_table, "t1.csv")
+
+    def test_load(self):
+        destination = _Server()
+        loader = _LoadServer()
+        queue = dbimport._StatementQueue(destination, "csv", {})
+        queue.append("CREATE TABLE `db1`.`t1` (a int, b text);")
+        load_file = dbimport._LoadDataFile("`db1`.`t1`", ["`a`", "`b`"])
+        num_rows = dbimport._DATA_BATCH_ROWS + 1
+        for num in range(num_rows):
+            load_file.append([str(num), "x"])
+        load_file.load(loader, queue)
+        # The table is created before its rows are loaded
+        self.assertEqual(["CREATE TABLE `db1`.`t1` (a int, b text);",
+                          "COMMIT"], destination.executed)
+        self.assertEqual(1, len(loader.loaded))
+        self.assertEqual(num_rows, loader.loaded[0].count("\tx\n"))
+        self.assertTrue(loader.executed[0].endswith("(`a`, `b`)"))
+        self.assertFalse(os.path.exists(load_file.file_name))
+
+
+class TestReadNext(unittest.TestCase):
+    def test_sql(self):
+        lines = _Lines(["# Source on localhost: ... connected.\n",
+                        "USE `db1`;\n",
+                        "INSERT INTO `db1`.`t1` VALUES (1);\n",
+                        "INSERT INTO `db1`.`t1` VALUES (2);\n"])
+        self.assertEqual([("DATA", "USE `db1`;"),
+                          ("DATA", "INSERT INTO `db1`.`t1` VALUES (1);"),
+                          ("DATA", "INSERT INTO `db1`.`t1` VALUES (2);")],
+                         list(dbimport.read_next(lines, "sql")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,249 @@
+#
+# Copyright (c) 2011, 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""
+This files contains unit tests for the query digest of the MySQL General
+and Slow Query Log.
+"""
+
+import sys
+import os.path
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOTPATH = os.path.split(_HERE)[0]
+sys.path.append(_ROOTPATH)
+
+import datetime
+import decimal
+import unittest
+
+from mysql.utilities.exception import UtilError
+from mysql.utilities.common.parser import (
+    GeneralQueryLog,
+    SlowQueryLog,
+    SlowQueryLogEntry,
+    SlowQueryLogReader,
+    open_log_file,
+    )
+from mysql.utilities.common.digest import *
+
+FINGERPRINTS = (
+    ("SELECT * FROM t1 WHERE id = 10", "select * from t1 where id = ?"),
+    ("select *\n  from t1\twhere  id=-1.5e3;", "select * from t1 where id=-?"),
+    ("SELECT a FROM t2 WHERE b = 'it''s' AND c = \"x\\\"y\"",
+     "select a from t2 where b = ? and c = ?"),
+    ("SELECT a FROM t3 WHERE b IN (1, 2,3) AND c in ('a')",
+     "select a from t3 where b in(?+) and c in(?+)"),
+    ("INSERT INTO t4 (a, b) VALUES (1, 'x'), (2, NULL)",
+     "insert into t4 (a, b) values(?+)"),
+    ("SELECT /* app:42 */ c1 FROM t5 -- trailing\n WHERE x = 0x1F",
+     "select c1 from t5 where x = ?"),
+    ("use test;\nSET timestamp=1320234534;\nSELECT t1.c2 FROM t1",
+     "select t1.c2 from t1"),
+    ("use test;\nSET timestamp=1320234534;\n"
+     "# administrator command: Init DB;", "administrator command: init db"),
+)
+
+
+def _slow_entry(query, query_time, user='app', database='shop',
+                rows_sent=1, rows_examined=10):
+    """Create a SlowQueryLogEntry
+    """
+    entry = SlowQueryLogEntry()
+    entry['query'] = query
+    entry['query_time'] = decimal.Decimal(query_time)
+    entry['lock_time'] = decimal.Decimal('0.000100')
+    entry['rows_sent'] = rows_sent
+    entry['rows_examined'] = rows_examined
+    entry['user'] = user
+    entry['host'] = 'localhost'
+    entry['database'] = database
+    entry['datetime'] = datetime.datetime(2011, 11, 2, 12, 0,
+                                          int(float(query_time) * 10) % 60)
+    return entry
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_fingerprint(self):
+        for query, exp in FINGERPRINTS:
+            self.assertEqual(exp, fingerprint(query))
+
+    def test_identifiers_kept(self):
+        self.assertEqual("select c1 from t2_2013 where t1.c3 = ?",
+                         fingerprint("SELECT c1 FROM t2_2013 "
+                                     "WHERE t1.c3 = 5"))
+
+    def test_fingerprint_id(self):
+        self.assertEqual(16, len(fingerprint_id("select ?")))
+        self.assertEqual(fingerprint_id(fingerprint("SELECT 1")),
+                         fingerprint_id(fingerprint("select 2")))
+
+
+class TestLogHistogram(unittest.TestCase):
+    def test_percentile(self):
+        hist = LogHistogram()
+        self.assertEqual(None, hist.percentile(95))
+        for value in range(1, 101):
+            hist.add(value / 100.0)
+        self.assertAlmostEqual(0.95, hist.percentile(95), delta=0.05)
+        self.assertAlmostEqual(0.50, hist.percentile(50), delta=0.025)
+        self.assertAlmostEqual(1.00, hist.percentile(100), delta=0.05)
+
+    def test_zero(self):
+        hist = LogHistogram()
+        hist.add(0.0)
+        self.assertTrue(hist.percentile(50) <= 0.000001)
+
+
+class TestQueryDigest(unittest.TestCase):
+    def test_aggregate(self):
+        digest = QueryDigest()
+        digest.add_entry(_slow_entry("SELECT * FROM t1 WHERE id = 1", '0.5',
+                                     user='app'))
+        digest.add_entry(_slow_entry("SELECT * FROM t1 WHERE id = 2", '1.5',
+                                     user='web', rows_sent=0))
+        digest.add_entry(_slow_entry("SELECT * FROM t2", '0.1'))
+        self.assertEqual(3, digest.entries)
+        self.assertEqual(2, len(digest.stats))
+
+        stats = digest.top(1)[0]
+        self.assertEqual("select * from t1 where id = ?", stats.fingerprint)
+        self.assertEqual(2, stats.count)
+        self.assertAlmostEqual(2.0, stats.query_time)
+        self.assertAlmostEqual(1.5, stats.max_query_time)
+        self.assertEqual(1, stats.rows_sent)
+        self.assertEqual(20, stats.rows_examined)
+        self.assertEqual(datetime.datetime(2011, 11, 2, 12, 0, 5),
+                         stats.first_seen)
+        self.assertEqual(datetime.datetime(2011, 11, 2, 12, 0, 15),
+                         stats.last_seen)
+        self.assertEqual({'app': 1, 'web': 1}, dict(stats.users))
+        self.assertEqual({'shop': 2}, dict(stats.databases))
+
+    def test_order_by(self):
+        digest = QueryDigest()
+        for _ in range(3):
+            digest.add_entry(_slow_entry("SELECT 1", '0.1'))
+        digest.add_entry(_slow_entry("SELECT SLEEP(2)", '2.0'))
+        self.assertEqual("select ?", digest.top(1, 'count')[0].fingerprint)
+        self.assertEqual("select sleep(?)",
+                         digest.top(1, 'max_time')[0].fingerprint)
+        self.assertRaises(UtilError, digest.top, 1, 'unknown')
+
+    def test_bounded(self):
+        digest = QueryDigest(max_fingerprints=10)
+        digest.add_entry(_slow_entry("SELECT * FROM hot", '9.0'))
+        for num in range(100):
+            digest.add_entry(_slow_entry("SELECT * FROM t%d" % num, '0.1'))
+        self.assertTrue(len(digest.stats) <= 20)
+        self.assertEqual(101, digest.entries)
+        self.assertEqual(digest.entries,
+                         digest.dropped_entries +
+                         sum([s.count for s in digest.stats.values()]))
+        self.assertEqual("select * from hot", digest.top(1)[0].fingerprint)
+
+    def test_merge(self):
+        exp = QueryDigest()
+        parts = [QueryDigest(), QueryDigest()]
+        for num in range(10):
+            entry = _slow_entry("SELECT * FROM t%d" % (num % 3),
+                                '0.%d' % num, user='u%d' % (num % 2))
+            exp.add_entry(entry)
+            parts[num % 2].add_entry(entry)
+        digest = QueryDigest()
+        for part in parts:
+            digest.merge(part)
+        self.assertEqual(exp.entries, digest.entries)
+        self.assertEqual(exp.get_rows(None, 'total_time'),
+                         digest.get_rows(None, 'total_time'))
+        self.assertEqual(exp.stats["select * from t0"].histogram.buckets,
+                         digest.stats["select * from t0"].histogram.buckets)
+
+    def test_get_rows(self):
+        digest = QueryDigest()
+        digest.add_entry(_slow_entry("SELECT * FROM t1 WHERE id = 1", '0.5'))
+        columns, rows = digest.get_rows(5, 'total_time')
+        self.assertEqual(REPORT_COLUMNS, columns)
+        self.assertEqual(1, len(rows))
+        row = dict(zip(columns, rows[0]))
+        self.assertEqual(1, row['rank'])
+        self.assertEqual('0.500000', row['total_time'])
+        self.assertEqual('10.0', row['examined_per_sent'])
+        self.assertEqual('app:1', row['users'])
+
+    def test_sample_logs(self):
+        digest = QueryDigest()
+        digest.add_log(SlowQueryLog(open(os.path.join(_HERE,
+                                                      'sample-slow.log'))))
+        self.assertEqual(12, digest.entries)
+        stats = digest.stats["show databases"]
+        self.assertEqual(2, stats.count)
+        self.assertEqual({'test': 1, None: 1}, dict(stats.databases))
+
+        digest = QueryDigest()
+        digest.add_log(GeneralQueryLog(open(os.path.join(
+            _HERE, 'sample-general.log'))))
+        self.assertEqual(2, digest.stats["show tables"].count)
+        self.assertEqual(0, digest.stats["show tables"].timed)
+
+    def test_slow_log_reader(self):
+        sample = os.path.join(_HERE, 'sample-slow.log')
+        exp = QueryDigest()
+        exp.add_log(SlowQueryLog(open(sample)))
+        digest = QueryDigest()
+        digest.add_log(SlowQueryLogReader(open_log_file(sample)))
+        self.assertEqual(exp.get_rows(20, 'total_time'),
+                         digest.get_rows(20, 'total_time'))
+
+
+class TestSlidingDigest(unittest.TestCase):
+    def test_windows(self):
+        sliding = SlidingDigest(windows=(60, 300), slot_seconds=10)
+        for second in range(0, 600, 5):
+            sliding.add_entry(_slow_entry("SELECT 1", '0.5'), 1000 + second)
+        sliding.add_entry(_slow_entry("SELECT SLEEP(2)", '2.0'), 1599)
+        self.assertEqual(121, sliding.digest.entries)
+        # Slots of 10 seconds: the last 60 seconds hold six slots
+        self.assertEqual(13, sliding.get_count(60))
+        self.assertEqual(61, sliding.get_count(300))
+        fingerprint_, stats = sliding.top(60, 1, 'total_time')[0]
+        self.assertEqual("select ?", fingerprint_)
+        self.assertAlmostEqual(6.0, stats.query_time)
+        self.assertAlmostEqual(0.5, stats.histogram.percentile(95),
+                               delta=0.025)
+
+        # Slots leave the windows without new entries
+        sliding.advance(1659)
+        self.assertEqual(0, sliding.get_count(60))
+        self.assertEqual(49, sliding.get_count(300))
+        sliding.advance(2000)
+        self.assertEqual(0, sliding.get_count(300))
+        self.assertEqual([], sliding.top(300))
+        self.assertEqual(0, len(sliding._slots))
+
+    def test_get_rows(self):
+        sliding = SlidingDigest()
+        for second in range(10):
+            sliding.add_entry(_slow_entry("SELECT 1", '0.5'), 1000 + second)
+        columns, rows = sliding.get_rows(60, 5, 'count')
+        self.assertEqual(WINDOW_COLUMNS, columns)
+        row = dict(zip(columns, rows[0]))
+        self.assertEqual(10, row['count'])
+        self.assertEqual('1.11', row['qps'])
+        self.assertRaises(UtilError, sliding.get_rows, 60, 5, 'max_time')
+
+
+if __name__ == "__main__":
+    unittest.main()
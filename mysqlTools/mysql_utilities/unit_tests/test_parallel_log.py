@@ -0,0 +1,136 @@
+#
+# Copyright (c) 2011, 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""
+This files contains unit tests for parsing the MySQL General and Slow Query
+Log in ranges using several processes.
+"""
+
+import sys
+import os.path
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOTPATH = os.path.split(_HERE)[0]
+sys.path.append(_ROOTPATH)
+
+import mmap
+import unittest
+
+from mysql.utilities.common.parser import (
+    GeneralQueryLog,
+    SlowQueryLog,
+    )
+from mysql.utilities.common.digest import QueryDigest
+from mysql.utilities.common.parallel_log import *
+
+SLOW_LOG = os.path.join(_HERE, 'sample-slow.log')
+GENERAL_LOG = os.path.join(_HERE, 'sample-general.log')
+
+
+class TestSplitLogFile(unittest.TestCase):
+    def _check_ranges(self, file_name, log_type, starts):
+        data = open(file_name).read()
+        ranges = split_log_file(file_name, log_type, 8)
+        self.assertTrue(len(ranges) > 1)
+        self.assertEqual(0, ranges[0][0])
+        self.assertEqual(len(data), ranges[-1][1])
+        for num, (start, end) in enumerate(ranges[1:]):
+            self.assertEqual(ranges[num][1], start)
+            self.assertTrue(data[start:].startswith(starts),
+                            msg="Range does not start with an entry: %r"
+                            % data[start:start + 20])
+
+    def test_slow(self):
+        self._check_ranges(SLOW_LOG, 'slow', ('# Time:', '# User@Host:'))
+
+    def test_general(self):
+        self._check_ranges(GENERAL_LOG, 'general', '1111')
+
+    def test_one_range(self):
+        self.assertEqual([(0, os.path.getsize(SLOW_LOG))],
+                         split_log_file(SLOW_LOG, 'slow', 1))
+
+
+class TestLogRange(unittest.TestCase):
+    def test_read(self):
+        log_file = open(GENERAL_LOG, 'rb')
+        log_map = mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = log_file.read()
+        lines = data.splitlines(True)
+        start = len(lines[0])
+        end = start + len(lines[1]) + len(lines[2])
+        stream = LogRange(log_map, start, end)
+        self.assertEqual(lines[1], stream.readline())
+        self.assertEqual(lines[2], stream.readline())
+        self.assertEqual('', stream.readline())
+        stream.seek(0)
+        self.assertEqual(0, stream.tell())
+        self.assertEqual(data[start:end], stream.read())
+        self.assertEqual('', stream.read(10))
+        log_map.close()
+        log_file.close()
+
+
+class TestState(unittest.TestCase):
+    def test_resolve_value(self):
+        state = {'3': {'user': 'root', 'database': None}}
+        self.assertEqual('root', resolve_value(inherited(3, 'user'), state))
+        self.assertEqual(None, resolve_value(inherited(3, 'database'),
+                                             state))
+        self.assertEqual(None, resolve_value(inherited(4, 'user'), state))
+        self.assertEqual('web', resolve_value('web', state))
+        self.assertEqual(None, resolve_value(None, state))
+
+    def test_update_state(self):
+        state = {'3': {'user': 'root', 'database': None},
+                 '4': {'user': 'app', 'database': 'shop'}}
+        update_state(state, {'3': {'user': inherited(3, 'user'),
+                                   'database': 'test'},
+                             '4': None,
+                             '5': {'user': 'web', 'database': None}})
+        self.assertEqual({'3': {'user': 'root', 'database': 'test'},
+                          '5': {'user': 'web', 'database': None}}, state)
+
+
+class TestParallelDigest(unittest.TestCase):
+    def _check_digest(self, file_name, log_type, log, processes):
+        exp = QueryDigest()
+        exp.add_log(log)
+        # Small ranges so entries inherit state from previous ranges
+        digest = parallel_digest(file_name, log_type, processes,
+                                 range_size=200)
+        self.assertEqual(exp.entries, digest.entries)
+        self.assertEqual(exp.get_rows(None, 'count'),
+                         digest.get_rows(None, 'count'))
+        for query_fingerprint, stats in exp.stats.iteritems():
+            result = digest.stats[query_fingerprint]
+            self.assertEqual(stats.users, result.users)
+            self.assertEqual(stats.databases, result.databases)
+
+    def test_slow(self):
+        self._check_digest(SLOW_LOG, 'slow', SlowQueryLog(open(SLOW_LOG)),
+                           1)
+
+    def test_general(self):
+        self._check_digest(GENERAL_LOG, 'general',
+                           GeneralQueryLog(open(GENERAL_LOG)), 1)
+
+    def test_processes(self):
+        self._check_digest(SLOW_LOG, 'slow', SlowQueryLog(open(SLOW_LOG)),
+                           2)
+
+
+if __name__ == "__main__":
+    unittest.main()
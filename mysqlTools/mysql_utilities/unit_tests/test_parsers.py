@@ -26,6 +26,8 @@ _ROOTPATH = os.path.split(_HERE)[0]
 sys.path.append(_ROOTPATH)
 
 import tempfile
+import shutil
+import gzip
 import inspect
 import datetime
 import decimal
@@ -810,6 +812,156 @@ class TestSlowQueryLog(BaseParserTestCase):
         self.assertEqual(exp,self.log.next())
         self.assertRaises(StopIteration,self.log.next)
 
+class TestSlowQueryLogReader(BaseParserTestCase):
+    """Test SlowQueryLogReader class"""
+
+    def setUp(self):
+        self.sample = os.path.join(_HERE, 'sample-slow.log')
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_same_entries(self):
+        """Entries are the same as the ones of SlowQueryLog"""
+        exp = list(SlowQueryLog(open(self.sample)))
+        reader = SlowQueryLogReader(open_log_file(self.sample), entries=True)
+        result = list(reader)
+        self.assertEqual(len(exp), len(result))
+        for i, entry in enumerate(exp):
+            self.assertTrue(isinstance(result[i], SlowQueryLogEntry))
+            self.assertEqual(entry, result[i],
+                             msg="Failed parsing entry #%d" % i)
+        self.assertEqual(datetime.datetime(2011, 11, 2, 12, 48, 46),
+                         reader.start_datetime)
+
+    def test_records(self):
+        """Records hold float microseconds"""
+        records = list(SlowQueryLogReader(open_log_file(self.sample)))
+        self.assertTrue(isinstance(records[0], SlowQueryRecord))
+        self.assertEqual(12, len(records))
+        entry = list(SlowQueryLog(open(self.sample)))[0]
+        self.assertEqual(float(entry['query_time']) * 1000000,
+                         records[0].query_time)
+        self.assertEqual(entry['rows_examined'], records[0].rows_examined)
+        self.assertEqual(entry['query'], records[0].query)
+
+    def test_gzip(self):
+        """Read a compressed log"""
+        file_name = os.path.join(self.tmpdir, 'slow.log.gz')
+        gz_file = gzip.open(file_name, 'wb')
+        gz_file.write(open(self.sample).read())
+        gz_file.close()
+        exp = list(SlowQueryLogReader(open_log_file(self.sample)))
+        result = list(SlowQueryLogReader(open_log_file(file_name)))
+        self.assertEqual([str(record) for record in exp],
+                         [str(record) for record in result])
+
+    def test_empty(self):
+        """Read an empty log"""
+        file_name = os.path.join(self.tmpdir, 'empty.log')
+        open(file_name, 'w').close()
+        reader = SlowQueryLogReader(open_log_file(file_name))
+        self.assertEqual([], list(reader))
+        self.assertEqual(None, reader.start_datetime)
+
+    def test_parse_time(self):
+        """Get the datetime of '# Time:' lines"""
+        reader = SlowQueryLogReader(None)
+        tests = [
+            ('# Time: 111102 12:48:46',
+             datetime.datetime(2011, 11, 2, 12, 48, 46)),
+            ('# Time: 111102  9:48:46',
+             datetime.datetime(2011, 11, 2, 9, 48, 46)),
+            ('# Time: 2011-11-02T12:48:46.123456Z',
+             datetime.datetime(2011, 11, 2, 12, 48, 46)),
+        ]
+        for data, exp in tests:
+            self.assertEqual(exp, reader._parse_time(data))
+        self.assertRaises(LogParserError, reader._parse_time,
+                          'ham spam ham spam')
+
+
+class TestLogTail(BaseParserTestCase):
+    """Test LogTail class"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.tmpdir, 'mysql.log')
+        open(self.file_name, 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def _slow_entry(self, num):
+        return ("# Time: 111102 12:48:%02d\n"
+                "# User@Host: root[root] @ localhost []\n"
+                "# Query_time: 0.000333  Lock_time: 0.000000 "
+                "Rows_sent: 1  Rows_examined: 0\n"
+                "SET timestamp=1320234526;\nSELECT %d;\n" % (num, num))
+
+    def _write(self, text, mode='a'):
+        log_file = open(self.file_name, mode)
+        log_file.write(text)
+        log_file.close()
+
+    def test_from_start(self):
+        """Read the entries already in the log or only the new ones"""
+        self._write(self._slow_entry(1))
+        self.assertEqual(0, len(LogTail(self.file_name, 'slow')
+                                .read_entries()))
+        tail = LogTail(self.file_name, 'slow', True)
+        self.assertEqual(1, len(tail.read_entries() + tail.read_entries()))
+        self.assertRaises(LogParserError, LogTail, self.file_name, 'spam')
+
+    def test_follow(self):
+        """Follow a Slow Query Log which is written, rotated and truncated"""
+        tail = LogTail(self.file_name, 'slow')
+        queries = []
+        self._write(self._slow_entry(1) + self._slow_entry(2)[:60])
+        # The last entry is returned once the next one starts
+        queries.extend([record.query for record in tail.read_entries()])
+        self.assertEqual(1, len(queries))
+        self._write(self._slow_entry(2)[60:] + self._slow_entry(3))
+        queries.extend([record.query for record in tail.read_entries()])
+        # or when nothing was written
+        queries.extend([record.query for record in tail.read_entries()])
+
+        os.rename(self.file_name, self.file_name + '.1')
+        # Written by the server before it reopened the log
+        log_file = open(self.file_name + '.1', 'a')
+        log_file.write(self._slow_entry(4))
+        log_file.close()
+        self._write(self._slow_entry(5))
+        queries.extend([record.query for record in tail.read_entries()])
+        self.assertEqual(1, tail.rotations)
+
+        self._write('', 'w')
+        queries.extend([record.query for record in tail.read_entries()])
+        self._write(self._slow_entry(6))
+        queries.extend([record.query for record in tail.read_entries()])
+        queries.extend([record.query for record in tail.read_entries()])
+        self.assertEqual(1, tail.truncations)
+        exp = ["SET timestamp=1320234526;\nSELECT %d;" % num
+               for num in range(1, 7)]
+        self.assertEqual(exp, queries)
+
+    def test_general(self):
+        """Follow a General Query Log keeping the sessions"""
+        tail = LogTail(self.file_name, 'general')
+        self._write("111102 12:48:46\t    3 Connect\troot@localhost on test\n"
+                    "\t\t    3 Query\tSELECT 1\n")
+        entries = tail.read_entries() + tail.read_entries()
+        self._write("111102 12:48:47\t    3 Query\tSELECT\n2\n"
+                    "\t\t    3 Quit\t\n")
+        entries.extend(tail.read_entries() + tail.read_entries())
+        self.assertEqual(['Connect', 'Query', 'Query', 'Quit'],
+                         [entry['command'] for entry in entries])
+        self.assertEqual('SELECT\n2', entries[2]['argument'])
+        self.assertEqual('root', entries[2]['user'])
+        self.assertEqual('test', entries[2]['database'])
+
+
 class TestLogEntryBase(BaseParserTestCase):
     entry_init_attributes =  {
         'datetime': None,
@@ -0,0 +1,290 @@
+#
+# Copyright (c) 2011, 2013, Oracle and/or its affiliates. All rights reserved.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; version 2 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+"""
+This files contains unit tests for reading the rows of a table in chunks.
+"""
+
+import sys
+import os.path
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_ROOTPATH = os.path.split(_HERE)[0]
+sys.path.append(_ROOTPATH)
+
+import re
+import shutil
+import tempfile
+import unittest
+
+from mysql.utilities.common import parallel_copy
+from mysql.utilities.common import table
+from mysql.utilities.common.table import Table
+
+_EXPLAIN = [('name', 'char(20)', 'NO', '', None, ''),
+            ('id', 'int(10) unsigned', 'NO', 'PRI', None, ''),
+            ('value', 'float', 'YES', '', None, '')]
+_EXPLAIN_NO_KEY = [row[:3] + ('',) + row[4:] for row in _EXPLAIN]
+
+
+class _Cursor(object):
+    """Unbuffered cursor of the rows selected
+    """
+    def __init__(self, rows):
+        self.rows = list(rows)
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(len(self.rows))
+
+    def close(self):
+        pass
+
+
+class _Server(object):
+    """Server with one table, keyed on the id column if primary
+    """
+    def __init__(self, num_rows, explain=_EXPLAIN, insert_file=None):
+        self.explain = explain
+        self.insert_file = insert_file
+        self.rows = [('row%d' % num, str(num), '0.5')
+                     for num in range(num_rows)]
+        self.queries = []
+        self.batches = []
+
+    def show_server_variable(self, name):
+        return []
+
+    host = 'localhost'
+    user = 'root'
+    passwd = None
+    socket = None
+    port = 3306
+
+    def exec_query(self, query, options={}):
+        if query.startswith(('explain', 'EXPLAIN')):
+            return self.explain
+        if query.startswith('SHOW INDEXES'):
+            return [('t1', '0', 'PRIMARY', '1', row[0])
+                    for row in self.explain if row[3] == 'PRI']
+        if query.startswith('INSERT'):
+            if options.get('executemany'):
+                self.batches.append(options['params'])
+                query = "\n".join([query % tuple(["'%s'" % value
+                                                   for value in row])
+                                    for row in options['params']])
+            if self.insert_file:
+                insert_file = open(self.insert_file, 'a')
+                insert_file.write(query + "\n")
+                insert_file.close()
+            return _Cursor([])
+        if query == 'COMMIT':
+            return []
+        self.queries.append(query)
+        rows = self.rows
+        match = re.search(r"`id` > (\d+)", query)
+        if match:
+            rows = [row for row in rows if int(row[1]) > int(match.group(1))]
+        match = re.search(r"`id` <= (\d+)", query)
+        if match:
+            rows = [row for row in rows if int(row[1]) <= int(match.group(1))]
+        match = re.search(r"LIMIT (?:(\d+), )?(\d+)", query)
+        if match:
+            offset = int(match.group(1) or 0)
+            rows = rows[offset:offset + int(match.group(2))]
+        if query.startswith('SELECT `id`'):
+            return [(row[1],) for row in rows]
+        return _Cursor(rows)
+
+
+class TestRetrieveRows(unittest.TestCase):
+    def _check_rows(self, server, num_queries):
+        tbl = Table(server, "`db1`.`t1`")
+        row_lists = list(tbl.retrieve_rows(1))
+        self.assertEqual(server.rows,
+                         [row for rows in row_lists for row in rows])
+        for rows in row_lists[:-1]:
+            self.assertEqual(table._MAXROWS_PER_CHUNK, len(rows))
+        self.assertEqual(num_queries, len(server.queries))
+
+    def test_keyset(self):
+        num_rows = table._MAXROWS_PER_CHUNK * 2 + 5
+        server = _Server(num_rows)
+        self._check_rows(server, 3)
+        self.assertEqual("SELECT * FROM `db1`.`t1` WHERE (`id` > %d) "
+                         "ORDER BY `id` LIMIT %d"
+                         % (num_rows - 6, table._MAXROWS_PER_CHUNK),
+                         server.queries[-1])
+
+    def test_unbuffered(self):
+        # No primary key or a key which can not be read in key order
+        self._check_rows(_Server(table._MAXROWS_PER_CHUNK + 1,
+                                 _EXPLAIN_NO_KEY), 1)
+        explain = [(name, col_type, null, 'PRI' if name == 'value' else '',
+                    default, extra)
+                   for name, col_type, null, _, default, extra in _EXPLAIN]
+        self._check_rows(_Server(10, explain), 1)
+
+    def test_empty(self):
+        for server in (_Server(0), _Server(0, _EXPLAIN_NO_KEY),
+                       _Server(table._MAXROWS_PER_CHUNK)):
+            row_lists = list(Table(server, "db1.t1").retrieve_rows(1))
+            self.assertEqual(1, len(row_lists))
+
+    def test_keyset_condition(self):
+        keyset = [(1, '`a`', True), (0, '`b`', False), (2, '`c`', True)]
+        quote = lambda value: "'%s'" % value
+        self.assertEqual("(`a` > 10) OR (`a` = 10 AND `b` > 'x') OR "
+                         "(`a` = 10 AND `b` = 'x' AND `c` > -2.5)",
+                         table._get_keyset_condition(keyset,
+                                                     ('x', '10', '-2.5'),
+                                                     quote))
+
+
+class TestBulkInsert(unittest.TestCase):
+    explain = [('a', 'int(11)', 'NO', 'PRI', None, ''),
+               ('b', 'varchar(20)', 'YES', '', None, ''),
+               ('c', 'char(5)', 'YES', '', None, ''),
+               ('d', 'datetime', 'YES', '', None, ''),
+               ('e', 'bit(8)', 'YES', '', None, ''),
+               ('f', 'decimal(5,2)', 'YES', '', None, ''),
+               ('g', 'mediumtext', 'YES', '', None, '')]
+
+    def _get_table(self, explain=None):
+        tbl = Table(_Server(0, explain or self.explain), "`db1`.`t1`")
+        tbl.get_column_metadata()
+        return tbl
+
+    def test_column_string(self):
+        tbl = self._get_table()
+        self.assertEqual([1, 2], tbl.text_columns)
+        self.assertEqual([6], tbl.blob_columns)
+        self.assertEqual([4], tbl.hex_columns)
+        row = ('1', "it's a, None", 'a\\b\n', '2013-01-02 03:04:05', '\x05',
+               None, None)
+        self.assertEqual((" (1, 'it\\'s a, None', 'a\\\\b\\n', "
+                          "'2013-01-02 03:04:05', 0x05, NULL, NULL)", []),
+                         tbl.get_column_string(row, '`db2`'))
+        row = (None, None, None, None, None, '-1.50', "x'y")
+        self.assertEqual((" (NULL, NULL, NULL, NULL, NULL, -1.50, NULL)",
+                          ["UPDATE `db2`.`t1` SET `g` = 'x\\'y' WHERE "
+                           "`a` IS NULL  AND `b` IS NULL  AND `c` IS NULL  "
+                           "AND `d` IS NULL  AND `e` IS NULL  AND "
+                           "`f` = '-1.50' ;"]),
+                         tbl.get_column_string(row, '`db2`'))
+
+    def test_make_bulk_insert(self):
+        tbl = self._get_table(_EXPLAIN)
+        rows = [('row%d' % num, str(num), None) for num in range(5)]
+        self.assertEqual((["INSERT INTO `db2`.`t1` VALUES  ('row0', 0, NULL),"
+                           "  ('row1', 1, NULL),  ('row2', 2, NULL),  "
+                           "('row3', 3, NULL),  ('row4', 4, NULL)"], []),
+                         tbl.make_bulk_insert(rows, '`db2`'))
+        self.assertEqual(([], []), tbl.make_bulk_insert([], '`db2`'))
+
+        # Statements split at the packet size
+        tbl.max_packet_size = 512 + 100
+        inserts = tbl.make_bulk_insert(rows, '`db2`')[0]
+        self.assertEqual(2, len(inserts))
+        for insert in inserts:
+            self.assertTrue(len(insert) <= 100)
+        values = ",".join([insert.split(" VALUES ", 1)[1]
+                           for insert in inserts])
+        self.assertEqual(5, values.count("('row"))
+
+    def test_exec_bulk_insert(self):
+        tbl = self._get_table(_EXPLAIN)
+        dest = _Server(0)
+        rows = [('row%d' % num, str(num), None) for num in range(10)]
+        tbl.max_packet_size = 512 + 100
+        tbl.exec_bulk_insert(dest, rows, '`db2`')
+        self.assertTrue(len(dest.batches) > 1)
+        self.assertEqual(rows, [row for batch in dest.batches
+                                for row in batch])
+
+        # BIT and spatial values are written in hexadecimal
+        tbl = self._get_table()
+        dest = _Server(0, self.explain)
+        tbl.exec_bulk_insert(dest, [('1', 'x', 'y', None, '\x01', '2', 'z')],
+                             '`db2`')
+        self.assertEqual([], dest.batches)
+
+
+class TestParallelCopy(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.insert_file = os.path.join(self.tmp_dir, 'inserts')
+        self.get_server = parallel_copy._get_server
+        self.get_snapshot_servers = parallel_copy.get_snapshot_servers
+
+    def tearDown(self):
+        parallel_copy._get_server = self.get_server
+        parallel_copy.get_snapshot_servers = self.get_snapshot_servers
+        shutil.rmtree(self.tmp_dir)
+
+    def test_key_ranges(self):
+        tbl = Table(_Server(25), "db1.t1")
+        self.assertEqual([(None, ('9',)), (('9',), ('19',)), (('19',), None)],
+                         list(tbl.get_key_ranges(10)))
+        self.assertEqual([str(num) for num in range(10, 20)],
+                         [row[1] for row in tbl.retrieve_key_range(('9',),
+                                                                   ('19',))])
+
+    def _copy(self, read_in_workers, explain=_EXPLAIN, snapshot=False):
+        num_rows = table._MAXROWS_PER_CHUNK * 3 + 7
+        source = _Server(num_rows, explain)
+        parallel_copy._get_server = lambda conn_val, destination: \
+            _Server(num_rows, explain,
+                    self.insert_file if destination else None)
+        parallel_copy.get_snapshot_servers = lambda conn_val: \
+            (_Server(num_rows, explain), _Server(num_rows, explain))
+        copy = parallel_copy.ParallelCopy(2, True, read_in_workers,
+                                          source if snapshot else None)
+        for name in ("t1", "t2"):
+            copy.copy_table(Table(source, "db1.%s" % name), source, "db2")
+        copy.finish()
+        self.assertEqual(2, copy.tables)
+        self.assertEqual(num_rows * 2, copy.rows)
+        inserted = re.findall(r"\('(row\d+)'", open(self.insert_file).read())
+        os.unlink(self.insert_file)
+        self.assertTrue(sorted([row[0] for row in source.rows] * 2)
+                        == sorted(inserted))
+        return source
+
+    def test_read_in_workers(self):
+        source = self._copy(True)
+        # The source only reads the range limits
+        for query in source.queries:
+            self.assertTrue(query.startswith("SELECT `id` FROM"))
+
+    def test_read_in_parent(self):
+        self._copy(False)
+        self._copy(True, _EXPLAIN_NO_KEY)
+
+    def test_snapshot(self):
+        for explain in (_EXPLAIN, _EXPLAIN_NO_KEY):
+            source = self._copy(False, explain, True)
+            # The workers read all the rows in their snapshot
+            self.assertEqual(["FLUSH TABLES WITH READ LOCK", "UNLOCK TABLES"],
+                             source.queries[:2])
+            for query in source.queries[2:]:
+                self.assertTrue(query.startswith("SELECT `id` FROM"))
+
+
+if __name__ == "__main__":
+    unittest.main()
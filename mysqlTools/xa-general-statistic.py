@@ -2,17 +2,21 @@
 # -*- coding: utf-8 -*-
 from __future__ import division
 import re
-import os
 import sys
-import commands
+import gzip
+import time
+import getopt
+import calendar
+from collections import Counter
 
 ########################################################
 ####
 ####Function : parase generay log
-####Author   : xiean 
+####Author   : xiean
 ####Date     : 2016-03-25
 ####Modify   : 2016-03-28  Log:Fix some bugs
 ####Modify   : 2016-03-30  Log:Add time caculate && color
+####Modify   : 2026-10-18  Log:Stream parse ,sql tokenizer ,time from log && QPS timeline
 ####Mail     : xiepaup@163.com
 ########################################################
 
@@ -21,97 +25,88 @@ _SELECT="SELECT"
 _DELETE="DELETE"
 _INSERT="INSERT"
 _UPDATE="UPDATE"
+_REPLACE="REPLACE"
 _SHOW  ="SHOW"     #Not Use Yet !
 _CREATE="CREATE"   #Not Use Yet !
 _DROP="DROP"       #Not Use Yet !
-_TOTAL_EXECUTE_TIME=""
-
-KEY_WORDS=[_SELECT,_DELETE,_INSERT,_UPDATE,_SHOW]
-
-
-sql_old   = ""
-sql_begin = ""
-tmp_line  = ""
-
-COMMAND_COUNT_DICT = {}
-TABLE_SELECT_DICT = {}
-TABLE_UPDATE_DICT = {}
-TABLE_INSERT_DICT = {}
-TABLE_DELETE_DICT = {}
-
-
-def do_increase_value(dict_name,key):
-   if key not in dict_name.keys():
-      dict_name[key]  = 1
-   else:
-      dict_name[key] += 1
-
-
-def add_table_stat(type,table_name):
-    if type == _SELECT:
-       do_increase_value(TABLE_SELECT_DICT,table_name)
-    if type == _DELETE:
-       do_increase_value(TABLE_DELETE_DICT,table_name)
-    if type == _UPDATE:
-       do_increase_value(TABLE_UPDATE_DICT,table_name)
-    if type == _INSERT:
-       do_increase_value(TABLE_INSERT_DICT,table_name)
-
-
-
-def sort_dict_by_value(dict_name):
-    return sorted(dict_name.iteritems(), key = lambda xakey:xakey[1],reverse=True)
+_TOTAL_EXECUTE_TIME=0
+_QPS_INTERVAL=0    #0 : no QPS timeline ,N : one timeline row per N seconds
+
+KEY_WORDS=[_SELECT,_DELETE,_INSERT,_UPDATE,_REPLACE,_SHOW]
+REPORT_TYPES=[_SELECT,_UPDATE,_DELETE,_INSERT,_REPLACE]
+
+#commands whose argument is a statement worth counting
+SQL_COMMANDS=("Query","Execute")
+
+'''
+   One general log entry per match ,both log formats :
+      5.1 ~ 5.6 : "160330  9:55:01\t    12 Query\tSELECT ..." ,time only written when the second changes
+      5.7 +     : "2016-03-30T09:55:01.123456Z\t   12 Query\tSELECT ..."
+   group 1/2 : old/new timestamp (to the second) ,3 : thread id ,4 : command ,5 : argument
+   A line that does not match continues the statement of the previous entry.
+'''
+ENTRY_RE  = re.compile(r'^(?:(\d{6}\s+\d{1,2}:\d\d:\d\d)|(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)\S*)?\s+(\d+) +([A-Z][a-z]+(?: [A-Za-z]+)?)(?:\t(.*))?$')
+BANNER_RE = re.compile(r'^(?:\S+, Version: |Tcp port: |Time\s+Id\s+Command)')
+
+'''
+   Single pass sql scanner ,the regex engine walks the statement once (the lookahead lets it skip any
+   position that can not start a match) and only stops at :
+      strings and comments (matched to be skipped) ,KEY UPDATE / FOR UPDATE (not a table) ,
+      a statement verb (group 1) ,or UPDATE/FROM/JOIN/INTO (group 2) with the table list after it (group 3).
+   Table names may be `quoted` and db.table qualified ,FROM a x,b AS y gives a and b.
+'''
+SQL_IDENT     = r'(?:`[^`]*`|[A-Za-z_$][\w$]*)'
+SQL_TABLE     = r'%s(?:\s*\.\s*%s)*' % (SQL_IDENT,SQL_IDENT)
+#words that can not be a table alias ,they end a FROM a x,b y table list
+SQL_NOT_ALIAS = r'(?!(?:WHERE|SET|ON|USING|GROUP|ORDER|LIMIT|HAVING|LEFT|RIGHT|INNER|OUTER|CROSS|NATURAL|JOIN|STRAIGHT_JOIN|UNION|FOR|LOCK|VALUES|VALUE|SELECT|PARTITION|FORCE|USE|IGNORE|WINDOW|INTO|FROM)\b)'
+SQL_TABLE_REF = r'%s%s(?:\s+(?:AS\s+)?%s%s)?' % (SQL_NOT_ALIAS,SQL_TABLE,SQL_NOT_ALIAS,SQL_IDENT)
+SQL_RE = re.compile(r'''(?=[SsIiDdRrUuFfJjKk'"/\-\#])(?:
+     '(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|/\*.*?\*/|--[^\n]*|\#[^\n]*
+    |\b(?:KEY|FOR)\s+UPDATE\b
+    |\b(SELECT|INSERT|DELETE|REPLACE|SHOW)\b
+    |\b(UPDATE|FROM|JOIN|INTO)\b(?:\s+(?:LOW_PRIORITY|HIGH_PRIORITY|DELAYED|IGNORE|QUICK)\b)*\s*(%s(?:\s*,\s*%s)*)?)
+''' % (SQL_TABLE_REF,SQL_TABLE_REF),re.X|re.S|re.I)
+TABLE_NAME_RE = re.compile(SQL_TABLE)
+
+NOT_TABLES    = frozenset(["DUAL"])
+
+
+COMMAND_COUNT_DICT = Counter()
+TABLE_COUNT_DICT   = dict([(t,Counter()) for t in KEY_WORDS])
+QPS_TIMELINE       = Counter()   #epoch second => statements
+_TIME_RANGE_       = [None,None] #first && last epoch second seen in log
+
+
+def sort_dict_by_value(dict_name,top_num=None):
+    return dict_name.most_common(top_num)
 
 
 def get_type_execute_times(type):
-   if type not in COMMAND_COUNT_DICT.keys():
-       return 0
-   else:
-       if type == _SELECT:
-          return COMMAND_COUNT_DICT[_SELECT]
-       if type == _DELETE:
-          return COMMAND_COUNT_DICT[_DELETE]
-       if type == _UPDATE:
-          return COMMAND_COUNT_DICT[_UPDATE]
-       if type == _INSERT:
-          return COMMAND_COUNT_DICT[_INSERT]
+    return COMMAND_COUNT_DICT[type]
 
-def get_dict_by_type(type):
-    if type not in KEY_WORDS:
-       return {}
-    if type == _SELECT:
-       return TABLE_SELECT_DICT
-    if type == _DELETE:
-       #print str(TABLE_DELETE_DICT)
-       return TABLE_DELETE_DICT
-    if type == _UPDATE:
-       #print str(TABLE_UPDATE_DICT)
-       return TABLE_UPDATE_DICT
-    if type == _INSERT:
-       #print str(TABLE_INSERT_DICT)
-       return TABLE_INSERT_DICT
 
+def get_dict_by_type(type):
+    return TABLE_COUNT_DICT.get(type,Counter())
 
 
 def print_sorted_content(type,top_num):
     counter = 0
     dict_name = get_dict_by_type(type)
-    print u"--------------------------------------------------------------------------"
-    print u"| 序列号 |执行占比 | 每秒执行 | 总执行次数|           执行表名           |"
-    print u"--------------------------------------------------------------------------"
-    for (key,value) in sort_dict_by_value(dict_name):
+    execute_times = get_type_execute_times(type) or 1
+    print "--------------------------------------------------------------------------"
+    print "| 序列号 |执行占比 | 每秒执行 | 总执行次数|           执行表名           |"
+    print "--------------------------------------------------------------------------"
+    for (key,value) in sort_dict_by_value(dict_name,top_num):
         counter += 1
-        execute_times = get_type_execute_times(type)
         percent = value/execute_times*100
+        row = "|%5d   |%7.2f%% |%9.2f |%10d |%30s|" % (counter,percent,value/_TOTAL_EXECUTE_TIME,value,key)
         if percent < 10:
-           print "|%5d   |%7.2f%% |%9.2f |%10d |%30s|" % (counter,value/execute_times*100,value/_TOTAL_EXECUTE_TIME,value,key)
-        if percent >= 10 and percent < 40:
-           print "\033[1;33;40m|%5d   |%7.2f%% |%9.2f |%10d |%30s|\033[0m" % (counter,value/execute_times*100,value/_TOTAL_EXECUTE_TIME,value,key)
-        if percent >= 40:
-           print "\033[1;31;40m|%5d   |%7.2f%% |%9.2f |%10d |%30s|\033[0m" % (counter,value/execute_times*100,value/_TOTAL_EXECUTE_TIME,value,key)
-        if counter >= top_num:
-           break
-    print u"--------------------------------------------------------------------------"
+           print row
+        elif percent < 40:
+           print "\033[1;33;40m%s\033[0m" % (row)
+        else:
+           print "\033[1;31;40m%s\033[0m" % (row)
+    print "--------------------------------------------------------------------------"
 
 
 ## main print func ...
@@ -120,134 +115,169 @@ def print_statistic_info(type,top_num):
     print_sorted_content(type,top_num)
 
 
-def print_dict_content():
-    pass
-
-
-def deal_sql_command(line):
-    ##print "!!!!!!!!!!!!!!!!!----++===>"+line
-    ## before do something ...
-    line = line.replace('(',' ( ').replace('`',' ').replace('select','SELECT').replace('insert','INSERT').replace('delete','DELETE').replace('update','UPDATE')
-    #                6194968654 Query        UPDATE `js_captcha` SET `cap_status`=1 WHERE ( cap_id = 22464157 )
-    if "FROM" in line or "JOIN" in line or "UPDATE" in line or "INSERT" in line or "DELETE" in line:
-        #print line.split("WHERE")[0]
-        tmp_key = ""
-        next_is_table = 0
-        #print line.strip()
-        #6119924097 Query	SELECT `bi_is_business_bail` FROM `js_business_info` 
-        #4547036932 Query	SELECT DISTINCT(apd_si_id) as apd_si_id FROM `js_activity_product_detail` LEFT JOIN js_sgoods_info on js_sgoods_info.si_id = js_activity_product_detail.apd_si_id 
-        ##for words in line.split("WHERE")[0].strip().split():
-        for words in line.strip().split():
-            #print words
-            if words in KEY_WORDS:
-                 begin=1
-                 tmp_key = words
-                 #print "-----------Add Key Words !" + tmp_key
-                 ## Add Some Statistic info !
-                 do_increase_value(COMMAND_COUNT_DICT,tmp_key)
-            if next_is_table == 1:
-                 next_is_table = 0
-                 #print tmp_key.split('(')[-1]+"\t"+words
-                 ## Add Some Statistic info !
-                 if words == "(":
-                    continue
-                 add_table_stat(tmp_key,words)
-            if words == "FROM":
-                 next_is_table = 1
-            if words == "JOIN":
-                 next_is_table = 1
-            if words == _UPDATE:
-                 next_is_table = 1
-            if words.upper() == "INTO" :
-                 next_is_table = 1
-
-
-
+def deal_sql_command(sql):
+    '''
+    Count one statement by its leading verb ,and every table it touches under the verb in effect
+    where the table appears : INSERT INTO a SELECT .. FROM b counts a as INSERT and b as SELECT.
+    '''
+    verb    = None
+    current = None
+    for (word,table_word,tables) in SQL_RE.findall(sql):
+        if table_word:
+            table_word = table_word.upper()
+            if table_word == _UPDATE:
+                current = _UPDATE
+                verb    = verb or _UPDATE
+        elif word:
+            current = word.upper()
+            verb    = verb or current
+            continue
+        if not tables or current is None:
+            continue
+        for table in tables.split(','):
+            table = TABLE_NAME_RE.search(table).group(0).replace('`','').replace(' ','')
+            if table.upper() not in NOT_TABLES:
+                TABLE_COUNT_DICT[current][table] += 1
+    if verb is not None:
+        COMMAND_COUNT_DICT[verb] += 1
+    return verb
+
+
+def parse_log_time(log_time):
+    '''
+    Epoch second (log time taken as UTC ,only differences matter) of an old or new format time string.
+    '''
+    if 'T' in log_time:
+        return calendar.timegm(time.strptime(log_time,'%Y-%m-%dT%H:%M:%S'))
+    return calendar.timegm(time.strptime(' '.join(log_time.split()),'%y%m%d %H:%M:%S'))
+
+
+def format_log_time(epoch):
+    return time.strftime('%Y-%m-%d %H:%M:%S',time.gmtime(epoch))
+
+
+def open_log(general_file):
+    if general_file == '-':
+        return sys.stdin
+    if general_file.endswith('.gz'):
+        return gzip.open(general_file,'rb')
+    return open(general_file,'rb',1024*1024)
+
+
+def parse_general_log(filehandle):
+    '''
+    Stream the log once ,a statement is handed to deal_sql_command when the next entry begins so
+    multi line statements are kept whole. Time strings are parsed once per distinct second.
+    '''
+    entry_match = ENTRY_RE.match
+    last_time   = None
+    epoch       = None
+    statement   = None
+    for line in filehandle:
+        m = entry_match(line)
+        if m is None:
+            if statement is not None:
+                if BANNER_RE.match(line):
+                    deal_sql_command('\n'.join(statement))
+                    statement = None
+                else:
+                    statement.append(line.rstrip('\r\n'))
+            continue
+        if statement is not None:
+            deal_sql_command('\n'.join(statement))
+            statement = None
+        (old_time,new_time,thread_id,command,argument) = m.groups()
+        log_time = old_time or new_time
+        if log_time is not None and log_time != last_time:
+            last_time = log_time
+            epoch = parse_log_time(log_time)
+            if _TIME_RANGE_[0] is None or epoch < _TIME_RANGE_[0]:
+               _TIME_RANGE_[0] = epoch
+            if _TIME_RANGE_[1] is None or epoch > _TIME_RANGE_[1]:
+               _TIME_RANGE_[1] = epoch
+        if command in SQL_COMMANDS and argument:
+            statement = [argument.rstrip('\r')]
+            if epoch is not None:
+                QPS_TIMELINE[epoch] += 1
+    if statement is not None:
+        deal_sql_command('\n'.join(statement))
+
+
+def print_qps_timeline(interval):
+    if not QPS_TIMELINE:
+        return
+    peak_second = max(QPS_TIMELINE.iteritems(),key=lambda xakey:xakey[1])
+    print "QPS avg : %.2f  peak : %d at %s" % (sum(QPS_TIMELINE.itervalues())/_TOTAL_EXECUTE_TIME,peak_second[1],format_log_time(peak_second[0]))
+    if interval <= 0:
+        return
+    (begin,end) = _TIME_RANGE_
+    rows = Counter()
+    for (epoch,count) in QPS_TIMELINE.iteritems():
+        rows[begin + (epoch - begin)//interval*interval] += count
+    print "------------------------------------------------"
+    print "|       开始时间      |   执行次数 |      QPS  |"
+    print "------------------------------------------------"
+    row_time = begin
+    while row_time <= end:
+        seconds = min(interval,end - row_time + 1)
+        print "| %19s |%11d |%10.2f |" % (format_log_time(row_time),rows[row_time],rows[row_time]/seconds)
+        row_time += interval
+    print "------------------------------------------------"
 
 
 def print_stat_info(begin_time,end_time):
-    
-    #print "===" + str(COMMAND_COUNT_DICT)
-    print u"     -----------------------------------------------------------------"
-    print u"     -                                                               -"
-    print u"     - This Time Total Monitor \033[1;31;40m%10s\033[0m seconds                    -" %(_TOTAL_EXECUTE_TIME)
-    print u"     - As Follow is Top \033[1;32;40m%3d\033[0m Execute Table Statistic Info             -" % (_TOP_TABLE_)
-    print u"     - General Log Execute Between %8s and %8s             -" % (begin_time,end_time)
-    print u"     -                                                               -"
-    print u"     -----------------------------------------------------------------"
-    print_statistic_info(_SELECT,_TOP_TABLE_)
-    print_statistic_info(_UPDATE,_TOP_TABLE_)
-    print_statistic_info(_DELETE,_TOP_TABLE_)
-    print_statistic_info(_INSERT,_TOP_TABLE_)
-    #print_sorted_content(TABLE_SELECT_DICT,15)
-
-def get_begin_time(general_file):
-    return commands.getoutput("head -n4 %s |tail -n1|awk '{print $2}'" % (general_file))
-
-def caculate_time(begin_time,end_time):
-   time_list_begin = begin_time.split(':')
-   time_list_end   = end_time.split(':')
-   if len(time_list_end) != 3 or len(time_list_begin) != 3 or begin_time == end_time:
-      print "Input End Time Error ,Please reinput !\n"
-      print "Usage: "
-      usage()
-      sys.exit()
-   else:
-      end_long_time   = int(time_list_end[0])*3600 + int(time_list_end[1])*60 + int(time_list_end[2])
-      begin_long_time = int(time_list_begin[0])*3600 + int(time_list_begin[1])*60 + int(time_list_begin[2])
+    print "     -----------------------------------------------------------------"
+    print "     -                                                               -"
+    print "     - This Time Total Monitor \033[1;31;40m%10s\033[0m seconds                    -" %(_TOTAL_EXECUTE_TIME)
+    print "     - As Follow is Top \033[1;32;40m%3d\033[0m Execute Table Statistic Info             -" % (_TOP_TABLE_)
+    print "     - General Log Between %19s and %19s   -" % (begin_time,end_time)
+    print "     -                                                               -"
+    print "     -----------------------------------------------------------------"
+    print_qps_timeline(_QPS_INTERVAL)
+    for type in REPORT_TYPES:
+        if type == _REPLACE and not COMMAND_COUNT_DICT[type]:
+            continue
+        print_statistic_info(type,_TOP_TABLE_)
 
-      return int( end_long_time - begin_long_time )
 
 def usage():
    print "====================================================================="
    print "+            Wellcome to general log parase center                  +"
-   print "+       Usage : python "+sys.argv[0] +" general.log 10:10:10 +"
-   print "+       general.log ---> 需要解析的general log 日志文件             +"
-   print "+       10:10:10    ---> 文件结束时间                               +"
+   print "+       Usage : python "+sys.argv[0] +" [-t 15] [-q 60] general.log +"
+   print "+       general.log ---> 需要解析的general log 日志文件 ,可为 .gz 或 - +"
+   print "+       -t,--top    ---> 每类语句显示前 N 个表 ,默认 15             +"
+   print "+       -q,--qps    ---> 每 N 秒一行 QPS 时间线 ,默认不显示         +"
+   print "+       起止时间取自日志本身 ,无需再输入结束时间                    +"
    print "====================================================================="
 
 
 if __name__ == "__main__":
-   if len(sys.argv) != 3:
+   try:
+      opts,args = getopt.getopt(sys.argv[1:],"Ht:q:",["help","top=","qps="])
+      for op,value in opts:
+         if op in ("-t","--top"):
+            _TOP_TABLE_ = int(value)
+         elif op in ("-q","--qps"):
+            _QPS_INTERVAL = int(value)
+         elif op in ("-H","--help"):
+            usage()
+            sys.exit()
+   except getopt.GetoptError,e:
+      print "Parse Args Error ,%s" % (e)
+      args = []
+   #the old second argument (end time) is no longer needed ,time is read from the log
+   if len(args) not in (1,2):
       usage()
-      #caculate_time('10:10:10','13:20:20')
-   else:
-      try:
-         general_file = sys.argv[1]
-         end_time = sys.argv[2]
-         filehandle = open(general_file,'r')
-         next_output = 2
-         begin_time = get_begin_time(general_file)
-         _TOTAL_EXECUTE_TIME = caculate_time(begin_time,end_time)
-         for line in filehandle:
-            line = line.strip()
-            #print "Current Line : ======="+line
-            if re.match('''[0-9]{5,8}''',line):
-                sql_begin = line
-                #print "------->"+line
-                next_output = 2
-            else:
-                if sql_old != "":
-                   tmp_line = sql_old
-                   sql_old  = ""
-                   next_output = 1
-                tmp_line += "  " + line
-                #print "===>"+ tmp_line+"----"
-                continue
-            if tmp_line != "":
-                """deal---new line"""
-                deal_sql_command(tmp_line)
-            sql_old = sql_begin
-            if next_output == 1 or tmp_line == "":
-               deal_sql_command(line)
-            tmp_line = ""
-         deal_sql_command(line)
-         print_stat_info(begin_time,end_time)
-         pass
-      except Exception,e:
-        print e
-        raise
-      finally:
-        filehandle.close()
-
-###----Get File Begin Time : head -n4 general_8.36_20160330-0955_1006.log |tail -n1|awk '{print $2}'
+      sys.exit(1)
+   general_file = args[0]
+   filehandle = open_log(general_file)
+   try:
+      parse_general_log(filehandle)
+   finally:
+      if filehandle is not sys.stdin:
+         filehandle.close()
+   if _TIME_RANGE_[0] is None:
+      print "No timestamp found in %s" % (general_file)
+      sys.exit(1)
+   _TOTAL_EXECUTE_TIME = _TIME_RANGE_[1] - _TIME_RANGE_[0] + 1
+   print_stat_info(format_log_time(_TIME_RANGE_[0]),format_log_time(_TIME_RANGE_[1]))
@@ -1,6 +1,12 @@
 import sys
 import time
+import getopt
+import gzip
+import threading
+import Queue
 import redis
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
 ###############################
 ####
@@ -13,6 +19,7 @@ import redis
 
 
 nodes_conn  = {}
+nodes_label = {}   #// display name of a node when it differs from its key , see short_node_labels()
 nodes_info = {
                  '19-7210':'10.205.142.19:7210',
                  '20-7210':'10.205.142.21:7210',
@@ -25,13 +32,163 @@ nodes_info = {
                  '31-8210':'10.205.142.31:8210',
                  '22-7210':'10.205.142.22:7210',
                  '22-6379':'10.205.142.22:6379'}
+
+#Every node is sampled in its own pool thread , a node slower than NODE_TIMEOUT seconds is reported as TIMEOUT
+SAMPLE_INTERVAL = 1.0
+NODE_TIMEOUT    = 0.8
+POOL_THREADS    = 64
+
+#Full INFO snapshots kept per node , rates are computed between consecutive snapshots
+HISTORY_SIZE    = 300
+REPORT_INTERVAL = 10            #// seconds between two window reports
+REPORT_WINDOWS  = (10,60,300)   #// seconds of the rolling min/avg/max windows
+WITH_CMDSTAT    = False         #// sample INFO all to get cmdstat_* , costs more per sample
+#CLIENT LIST captures run in CAPTURE_WORKERS background threads , at most one per node every CAPTURE_COOLDOWN seconds
+CAPTURE_WORKERS  = 2
+CAPTURE_COOLDOWN = 60
+CAPTURE_TIMEOUT  = 10
+IDLE_BUCKETS     = (1,10,60,600)
+CLIENTS_THRESHOLD = 1000
+BLOCKED_THRESHOLD = 2
+RATE_COUNTERS   = ('total_commands_processed','keyspace_hits','keyspace_misses',
+                   'total_net_input_bytes','total_net_output_bytes','expired_keys','evicted_keys',
+                   'total_connections_received','rejected_connections')
+
+
+''' Node list file , one node per line : [name] host:port , # starts a comment '''
+def load_nodes_file(fileName):
+   nodes = {}
+   for line in open(fileName):
+      line = line.split('#')[0].strip()
+      if line == '':
+         continue
+      fields = line.split()
+      addr = fields[-1]
+      name = fields[0] if len(fields) > 1 else addr
+      nodes[name] = addr
+   return nodes
+
+
+''' All connected nodes of the cluster which seed belongs to , masters and slaves , by CLUSTER NODES '''
+def discover_cluster_nodes(seed):
+   (host,port) = seed.rsplit(':',1)
+   nodes = {}
+   for line in redis.Redis(host=host,port=int(port),socket_timeout=5).execute_command('CLUSTER','NODES').splitlines():
+      fields = line.split()
+      if len(fields) < 8 or [f for f in ('fail','handshake','noaddr') if f in fields[2]]:
+         continue
+      addr = fields[1].split('@')[0]
+      if addr.startswith(':'):
+         addr = host + addr
+      #// keyed by the full address , nodes in different subnets may share the last octet
+      nodes[addr] = addr
+   return nodes
+
+
+''' Short display names last-octet-port of discovered nodes , the full address when two nodes share one '''
+def short_node_labels(nodes):
+   shorts = dict((key,'%s-%s' % (addr.split(':')[0].split('.')[-1],addr.split(':')[1])) for (key,addr) in nodes.items())
+   labels = {}
+   for (key,short) in shorts.items():
+      labels[key] = short if shorts.values().count(short) == 1 else nodes[key]
+   return labels
+
+
+def node_label(_rcKey):
+   return nodes_label.get(_rcKey,_rcKey)
+
+
 def create_connection():
    global nodes_conn,nodes_info
    for (key,val) in nodes_info.items():
-      nodes_conn[key] = redis.Redis(host=val.split(':')[0],port=val.split(':')[1])
+      nodes_conn[key] = redis.Redis(host=val.split(':')[0],port=val.split(':')[1],
+                                    socket_timeout=NODE_TIMEOUT,socket_connect_timeout=NODE_TIMEOUT)
    print "%s : Created All Connection ! " % (time.ctime())
 
 
+class NodeMetrics(object):
+   '''
+   Ring buffer of the last HISTORY_SIZE INFO snapshots of one node.
+   Every snapshot also gets the exact per second rates of RATE_COUNTERS and of every cmdstat_*
+   against the previous snapshot , rolling windows are min/avg/max over those rates.
+   '''
+   def __init__(self,historySize):
+      self.snapshots = deque(maxlen=historySize)
+      self.rates     = deque(maxlen=historySize)
+
+   def add(self,sampleTime,info):
+      if self.snapshots:
+         (prev_time,prev_info) = self.snapshots[-1]
+         rates = self.compute_rates(prev_time,prev_info,sampleTime,info)
+         if rates is not None:
+            self.rates.append((sampleTime,rates))
+      self.snapshots.append((sampleTime,info))
+
+   @staticmethod
+   def compute_rates(prevTime,prevInfo,curTime,curInfo):
+      elapsed = curTime - prevTime
+      #// restarted node , counters went back to zero
+      if elapsed <= 0 or curInfo.get('uptime_in_seconds',0) < prevInfo.get('uptime_in_seconds',0):
+         return None
+      rates = {}
+      for name in RATE_COUNTERS:
+         if name in curInfo and name in prevInfo:
+            rates[name] = (curInfo[name] - prevInfo[name]) / elapsed
+      hits   = curInfo.get('keyspace_hits',0) - prevInfo.get('keyspace_hits',0)
+      misses = curInfo.get('keyspace_misses',0) - prevInfo.get('keyspace_misses',0)
+      if hits + misses > 0:
+         rates['hit_ratio'] = 100.0 * hits / (hits + misses)
+      commands = {}
+      for (name,stat) in curInfo.items():
+         if name.startswith('cmdstat_') and isinstance(stat,dict):
+            prev_stat = prevInfo.get(name,{'calls':0,'usec':0})
+            calls = stat['calls'] - prev_stat['calls']
+            if calls > 0:
+               #// (calls per second , average usec per call over the interval)
+               commands[name[8:]] = (calls / elapsed,float(stat['usec'] - prev_stat['usec']) / calls)
+      rates['commands'] = commands
+      return rates
+
+   def latest(self,name,default=None):
+      if not self.rates:
+         return default
+      return self.rates[-1][1].get(name,default)
+
+   def window(self,name,seconds):
+      since  = time.time() - seconds
+      values = [r[name] for (t,r) in self.rates if t >= since and name in r]
+      if not values:
+         return None
+      return (min(values),sum(values) / len(values),max(values))
+
+   ''' Commands of the window ordered by calls/s , with their average usec per call '''
+   def top_commands(self,seconds,topN=5):
+      since = time.time() - seconds
+      calls = {}
+      usec  = {}
+      for (t,r) in self.rates:
+         if t < since:
+            continue
+         for (name,(callRate,usecPerCall)) in r['commands'].items():
+            calls[name] = calls.get(name,0) + callRate
+            usec[name]  = usec.get(name,0) + callRate * usecPerCall
+      samples = len([t for (t,r) in self.rates if t >= since]) or 1
+      top = sorted(calls.items(),key=lambda x: x[1],reverse=True)[:topN]
+      return [(name,c / samples,usec[name] / c) for (name,c) in top]
+
+
+nodes_metrics = {}
+
+
+''' Run in a pool thread , each sample carries the time it was taken '''
+def sample_node(_rcKey):
+   sample_time = time.time()
+   try:
+      return (_rcKey,sample_time,nodes_conn[_rcKey].info('all' if WITH_CMDSTAT else 'default'))
+   except redis.RedisError,e:
+      return (_rcKey,sample_time,e)
+
+
 def show_message(msg):
    global log_handle
    show_msg = "%s : %s" %(time.ctime()[11:19],msg)
@@ -39,18 +196,6 @@ def show_message(msg):
    log_handle.write(show_msg+"\n")
 
 
-def get_client_list(_rcKey):
-    global nodes_conn,nodes_info
-    clientFileName = './logs/%s-clientList-%s.log' % (nodes_info[_rcKey].replace(':','_'),time.ctime()[11:19].replace(':',''))
-    print clientFileName
-    clist = nodes_conn[_rcKey].client_list()
-    clientFileHandle = open(clientFileName,'w')
-    for cc in clist:
-       cc = str(cc).replace("'","").replace('{','').replace('}','')
-       clientFileHandle.write(cc+'\n')
-    clientFileHandle.close()
-
-
 def add_color(intKey):
    if intKey   <= 10:
       return intKey
@@ -64,64 +209,231 @@ def add_color(intKey):
       return "\033[31m%s\033[0m" % intKey
 
 
+def idle_bucket(idle):
+   for edge in IDLE_BUCKETS:
+      if idle < edge:
+         return '<%ss' % edge
+   return '>=%ss' % IDLE_BUCKETS[-1]
+
+
+''' Count clients by source ip , last command and idle time , return [(title,[(value,count),...]),...] '''
+def summarize_client_list(clist):
+   by_addr = {}
+   by_cmd  = {}
+   by_idle = {}
+   for client in clist:
+      addr = str(client.get('addr','')).rsplit(':',1)[0]
+      by_addr[addr] = by_addr.get(addr,0) + 1
+      by_cmd[client.get('cmd','')] = by_cmd.get(client.get('cmd',''),0) + 1
+      bucket = idle_bucket(int(client.get('idle',0)))
+      by_idle[bucket] = by_idle.get(bucket,0) + 1
+   return [(title,sorted(counter.items(),key=lambda x: x[1],reverse=True))
+           for (title,counter) in (('addr',by_addr),('cmd',by_cmd),('idle',by_idle))]
+
+
+''' Runs in a capture thread with its own connection , the monitor loop never waits for it '''
 def get_client_list(_rcKey):
-    global nodes_info,nodes_conn
-    clientFileName = './logs/%s-clientList-%s.log' % (nodes_info[_rcKey].replace(':','_'),time.ctime()[11:19].replace(':',''))
-    print clientFileName
-    clist = nodes_conn[_rcKey].client_list()
-    cinfo = nodes_conn[_rcKey].info()
-    clientFileHandle = open(clientFileName,'w')
+    global nodes_info
+    (host,port) = nodes_info[_rcKey].rsplit(':',1)
+    rConn = redis.Redis(host=host,port=int(port),socket_timeout=CAPTURE_TIMEOUT,socket_connect_timeout=CAPTURE_TIMEOUT)
+    clientFileName = './logs/%s-clientList-%s.log.gz' % (nodes_info[_rcKey].replace(':','_'),time.ctime()[11:19].replace(':',''))
+    clist = rConn.client_list()
+    cinfo = rConn.info()
+    summary = summarize_client_list(clist)
+    clientFileHandle = gzip.open(clientFileName,'wb')
+    for (title,counts) in summary:
+       clientFileHandle.write('#summary by %s : %s\n' % (title,' '.join(['%s=%s' % c for c in counts])))
     for cc in clist:
-       cc = str(cc).replace("'","").replace('{','').replace('}','')
-       clientFileHandle.write(cc+'\n')
+       clientFileHandle.write(' '.join(['%s=%s' % item for item in cc.items()])+'\n')
     for ci in cinfo:
        ci = "%-50s:%100s" % (ci,cinfo[ci])
        clientFileHandle.write(ci+'\n')
-    clientFileHandle.close() 
+    clientFileHandle.close()
+    show_message("%s clients %s , top addr %s , top cmd %s , saved %s" % (node_label(_rcKey),len(clist),
+                 ' '.join(['%s=%s' % c for c in summary[0][1][:3]]),' '.join(['%s=%s' % c for c in summary[1][1][:3]]),clientFileName))
+
+
+class ClientListCapture(object):
+   '''
+   Background CLIENT LIST capture , request() never blocks :
+   a node already queued or captured within cooldown seconds is ignored , workers caps the concurrent captures.
+   '''
+   def __init__(self,workers=CAPTURE_WORKERS,cooldown=CAPTURE_COOLDOWN):
+      self.cooldown  = cooldown
+      self.queue     = Queue.Queue()
+      self.lock      = threading.Lock()
+      self.in_flight = set()
+      self.last_time = {}
+      for i in range(workers):
+         worker = threading.Thread(target=self.run)
+         worker.daemon = True
+         worker.start()
+
+   def request(self,_rcKey):
+      with self.lock:
+         if _rcKey in self.in_flight or time.time() - self.last_time.get(_rcKey,0) < self.cooldown:
+            return False
+         self.in_flight.add(_rcKey)
+         self.last_time[_rcKey] = time.time()
+      self.queue.put(_rcKey)
+      return True
+
+   def run(self):
+      while True:
+         _rcKey = self.queue.get()
+         try:
+            get_client_list(_rcKey)
+         except Exception,e:
+            show_message("%s client list capture failed ,%s" % (node_label(_rcKey),e))
+         with self.lock:
+            self.in_flight.discard(_rcKey)
 
 
 def monitor_info():
    global nodes_conn
    conn_client = {}
-   _nodeWriteLog = {}
-   _nodeWriteSleepTime = {}
-
-   for (k,v) in nodes_conn.items():
-      _nodeWriteLog[k] = True
-      _nodeWriteSleepTime[k] = 5
+   capture = ClientListCapture(CAPTURE_WORKERS,CAPTURE_COOLDOWN)
 
+   pool = ThreadPool(min(POOL_THREADS,len(nodes_conn)))
+   #// a node whose last sample is still running is not sampled again , so a hung node can't pile up threads
+   pending = {}
+   next_tick = time.time()
+   last_report = next_tick
    while True:
       _total_cc = 0
       _total_bc = 0
       _totla_ops = 0
 
-      for (_rcKey,_rConn) in nodes_conn.items():
-         _info = _rConn.info()
+      for _rcKey in nodes_conn:
+         if _rcKey not in pending:
+            pending[_rcKey] = pool.apply_async(sample_node,(_rcKey,))
+      deadline = next_tick + NODE_TIMEOUT
+      for _rcKey in sorted(nodes_conn):
+         pending[_rcKey].wait(max(deadline - time.time(),0))
+         if not pending[_rcKey].ready():
+            conn_client[_rcKey] = "%4s:%-6s" % ('-','TIMEOUT')
+            continue
+         (_rcKey,sample_time,_info) = pending.pop(_rcKey).get()
+         if isinstance(_info,Exception):
+            conn_client[_rcKey] = "%4s:%-6s" % ('-','ERROR')
+            continue
+         nodes_metrics.setdefault(_rcKey,NodeMetrics(HISTORY_SIZE)).add(sample_time,_info)
          cc = _info['connected_clients']
          bc = _info['blocked_clients']
-         ops = _info['instantaneous_ops_per_sec']
+         #// exact ops from the total_commands_processed delta , instantaneous_ops_per_sec until two samples exist
+         ops = int(nodes_metrics[_rcKey].latest('total_commands_processed',_info['instantaneous_ops_per_sec']))
          _total_cc = _total_cc + cc
          _total_bc = _total_bc + bc
          _totla_ops = _totla_ops + ops
          conn_client[_rcKey]  = "%4s:%-6s" % (cc,ops)
 
-         if cc > 1000 or bc > 2:
-            if _nodeWriteLog[_rcKey]:
-               get_client_list(_rcKey)
-               _nodeWriteLog[_rcKey] = False
-            else:
-               if _nodeWriteSleepTime[_rcKey] > 55:
-                  _nodeWriteSleepTime[_rcKey] = 0
-                  _nodeWriteLog[_rcKey] = True
-            _nodeWriteSleepTime[_rcKey] = _nodeWriteSleepTime[_rcKey] + 1
+         if cc > CLIENTS_THRESHOLD or bc > BLOCKED_THRESHOLD:
+            capture.request(_rcKey)
 
 
       conn_client['ALL'] = "%5s:%-6s" % (_total_cc,_totla_ops)
-      msg = str(conn_client).replace("'","").replace('{','').replace('}','').replace(',','|')
+      msg = ' | '.join(['%s:%s' % (node_label(k),conn_client[k]) for k in sorted(conn_client) if k != 'ALL'] + ['ALL:%s' % conn_client['ALL']])
       show_message(msg)
-      time.sleep(1)
+      if time.time() - last_report >= REPORT_INTERVAL:
+         show_metrics_report()
+         last_report = time.time()
+      #// fixed rate ticks , the time spent sampling is not added to the interval
+      next_tick = max(next_tick + SAMPLE_INTERVAL,time.time())
+      time.sleep(max(next_tick - time.time(),0))
+
+
+def format_window(window,fmt='%.0f',scale=1):
+   if window is None:
+      return '-'
+   return '/'.join([fmt % (v / scale) for v in window])
+
+
+''' Rolling min/avg/max per node , one line per window the history can cover '''
+def show_metrics_report():
+   for _rcKey in sorted(nodes_metrics):
+      metrics = nodes_metrics[_rcKey]
+      for seconds in REPORT_WINDOWS:
+         if seconds > HISTORY_SIZE * SAMPLE_INTERVAL:
+            continue
+         fields = ['%s %4ss' % (node_label(_rcKey),seconds),
+                   'qps %s' % format_window(metrics.window('total_commands_processed',seconds)),
+                   'hit%% %s' % format_window(metrics.window('hit_ratio',seconds),'%.1f'),
+                   'in/out KB/s %s , %s' % (format_window(metrics.window('total_net_input_bytes',seconds),'%.1f',1024.0),
+                                            format_window(metrics.window('total_net_output_bytes',seconds),'%.1f',1024.0)),
+                   'expired/s %s' % format_window(metrics.window('expired_keys',seconds)),
+                   'evicted/s %s' % format_window(metrics.window('evicted_keys',seconds))]
+         top = metrics.top_commands(seconds)
+         if top:
+            fields.append('cmd ' + ' '.join(['%s:%.0f/s@%.1fus' % t for t in top]))
+         show_message(' | '.join(fields))
+
+
+def usage():
+   print '''
+Function: Monitor connected clients and ops of every redis node once a second !
+Args    :
+          -H,--help          show usage
+          -f,--file          node list file ,one node per line : [name] host:port
+          -s,--seed          discover all cluster nodes from this host:port by CLUSTER NODES
+          -i,--interval      seconds between two samples ,Default is 1
+          -t,--timeout       seconds a node may take to answer INFO ,Default is 0.8
+          -n,--threads       max poller threads ,Default is 64
+          -c,--cmdstat       sample INFO all ,report per command calls/s and usec per call
+          -r,--report        seconds between two min/avg/max reports ,Default is 10
+          -k,--history       INFO snapshots kept per node ,Default is 300
+          -w,--capture-workers   concurrent CLIENT LIST captures ,Default is 2
+          -d,--cooldown      seconds between two CLIENT LIST captures of a node ,Default is 60
+          -l,--clients       capture CLIENT LIST above this many connected clients ,Default is 1000
+          -b,--blocked       capture CLIENT LIST above this many blocked clients ,Default is 2
+          Without -f or -s the built in nodes_info list is monitored.
+'''
+
+
+def parse_args(sys_argvs):
+   global nodes_info,nodes_label,SAMPLE_INTERVAL,NODE_TIMEOUT,POOL_THREADS,WITH_CMDSTAT,REPORT_INTERVAL,HISTORY_SIZE
+   global CAPTURE_WORKERS,CAPTURE_COOLDOWN,CLIENTS_THRESHOLD,BLOCKED_THRESHOLD
+   try:
+      opts,args = getopt.getopt(sys_argvs,"Hf:s:i:t:n:cr:k:w:d:l:b:",["help","file=","seed=","interval=","timeout=","threads=",
+                                                            "cmdstat","report=","history=","capture-workers=","cooldown=",
+                                                            "clients=","blocked="])
+      for op,value in opts:
+         if op in ("-f","--file"):
+             nodes_info = load_nodes_file(value)
+         elif op in ("-s","--seed"):
+             nodes_info = discover_cluster_nodes(value)
+             nodes_label = short_node_labels(nodes_info)
+         elif op in ("-i","--interval"):
+             SAMPLE_INTERVAL = float(value)
+         elif op in ("-t","--timeout"):
+             NODE_TIMEOUT = float(value)
+         elif op in ("-n","--threads"):
+             POOL_THREADS = max(int(value),1)
+         elif op in ("-c","--cmdstat"):
+             WITH_CMDSTAT = True
+         elif op in ("-r","--report"):
+             REPORT_INTERVAL = float(value)
+         elif op in ("-k","--history"):
+             HISTORY_SIZE = max(int(value),2)
+         elif op in ("-w","--capture-workers"):
+             CAPTURE_WORKERS = max(int(value),1)
+         elif op in ("-d","--cooldown"):
+             CAPTURE_COOLDOWN = float(value)
+         elif op in ("-l","--clients"):
+             CLIENTS_THRESHOLD = int(value)
+         elif op in ("-b","--blocked"):
+             BLOCKED_THRESHOLD = int(value)
+         elif op in ("-H","--help"):
+             usage()
+             sys.exit()
+   except Exception,e:
+      print "Parse Args Error ,%s" % (e)
+      usage()
+      sys.exit(1)
+   NODE_TIMEOUT = min(NODE_TIMEOUT,SAMPLE_INTERVAL)
+
 
 if __name__ == "__main__":
+   parse_args(sys.argv[1:])
    thisTime = time.ctime()[4:19].replace(' ','_').replace(':','')
    fileName = './logs/goods_detail-%s.log' %(thisTime)
    log_handle = open(fileName,'w')
@@ -0,0 +1,173 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import threading
+import redis
+from multiprocessing.pool import ThreadPool
+
+__Version__ = "1.0.0"
+__AUTHOR__  = "xiean"
+__EMAIL__   = "xiepaup@163.com"
+
+'''
+   Function :
+            Route key commands of the redis key tools over a Redis Cluster:
+            1.        Discover the slot map of all masters by CLUSTER SLOTS
+            2.        Group keys by hash slot and send one pipeline per master , masters in parallel
+            3.        Follow MOVED (refresh the slot map) and ASK (ASKING on the target) redirects
+
+            router  = ClusterRouter('10.0.0.1',7000)
+            replies = router.pipeline_per_key(keys,lambda pipe,key: pipe.ttl(key))
+'''
+
+
+CLUSTER_SLOTS  = 16384
+MAX_REDIRECTS  = 5
+
+#CRC16/XMODEM , the hash Redis Cluster uses for key slots
+CRC16_TABLE = []
+for _i in range(256):
+   _crc = _i << 8
+   for _j in range(8):
+      _crc = ((_crc << 1) ^ 0x1021) if _crc & 0x8000 else (_crc << 1)
+   CRC16_TABLE.append(_crc & 0xFFFF)
+
+
+def crc16(data):
+   crc = 0
+   for byte in bytearray(data):
+      crc = ((crc << 8) & 0xFFFF) ^ CRC16_TABLE[((crc >> 8) ^ byte) & 0xFF]
+   return crc
+
+
+''' Only the part inside the first non empty {...} is hashed , so {user1}.a and {user1}.b share a slot '''
+def key_hash_slot(key):
+   if not isinstance(key,bytes):
+      key = key.encode('utf-8')
+   start = key.find(b'{')
+   if start >= 0:
+      end = key.find(b'}',start + 1)
+      if end > start + 1:
+         key = key[start+1:end]
+   return crc16(key) % CLUSTER_SLOTS
+
+
+def parse_redirect(reply):
+   '''
+   Return ('MOVED'|'ASK',slot,(host,port)) for a redirect error reply , None for anything else.
+   '''
+   if not isinstance(reply,redis.ResponseError):
+      return None
+   fields = str(reply).split()
+   if len(fields) != 3 or fields[0] not in ('MOVED','ASK'):
+      return None
+   (host,port) = fields[2].rsplit(':',1)
+   return (fields[0],int(fields[1]),(host,int(port)))
+
+
+class ClusterRouter(object):
+   def __init__(self,host,port,password=None,**connectionKwargs):
+      self.seed        = (host,int(port))
+      self.password    = password or None
+      self.conn_kwargs = connectionKwargs
+      self.connections = {}
+      self.slots       = [None] * CLUSTER_SLOTS
+      self.lock        = threading.Lock()
+      self.pool        = None
+      self.refresh()
+
+   def connection(self,addr):
+      with self.lock:
+         if addr not in self.connections:
+            self.connections[addr] = redis.Redis(host=addr[0],port=addr[1],password=self.password,**self.conn_kwargs)
+         return self.connections[addr]
+
+   ''' Rebuild the slot => master map from CLUSTER SLOTS of any known node '''
+   def refresh(self):
+      candidates = [self.seed] + [a for a in set(self.slots) if a is not None and a != self.seed]
+      last_error = None
+      for addr in candidates:
+         try:
+            slot_ranges = self.connection(addr).execute_command('CLUSTER','SLOTS')
+         except redis.RedisError,e:
+            last_error = e
+            continue
+         slots = [None] * CLUSTER_SLOTS
+         for slot_range in slot_ranges:
+            master_host = slot_range[2][0]
+            if isinstance(master_host,bytes) and not isinstance(master_host,str):
+               master_host = master_host.decode()
+            master = (master_host or addr[0],int(slot_range[2][1]))
+            for slot in range(int(slot_range[0]),int(slot_range[1]) + 1):
+               slots[slot] = master
+         self.slots = slots
+         if self.pool is None:
+            self.pool = ThreadPool(max(len(self.masters()),1))
+         return
+      raise redis.ConnectionError("Can not load cluster slots from %s:%s ,%s" % (self.seed[0],self.seed[1],last_error))
+
+   def masters(self):
+      return sorted(set([a for a in self.slots if a is not None]))
+
+   def node_for_key(self,key):
+      addr = self.slots[key_hash_slot(key)]
+      if addr is None:
+         raise redis.ResponseError("CLUSTERDOWN slot %s is not served" % key_hash_slot(key))
+      return addr
+
+   def connection_for_key(self,key):
+      return self.connection(self.node_for_key(key))
+
+   def group_by_node(self,keys):
+      groups = {}
+      for index in range(len(keys)):
+         groups.setdefault(self.node_for_key(keys[index]),[]).append(index)
+      return groups
+
+   def _run_node_pipeline(self,task):
+      (addr,keys,indexes,build,asking) = task
+      pipe = self.connection(addr).pipeline(transaction=False)
+      for index in indexes:
+         if asking:
+            pipe.execute_command('ASKING')
+         build(pipe,keys[index])
+      try:
+         replies = pipe.execute(raise_on_error=False)
+      except redis.RedisError,e:
+         replies = [e] * (len(indexes) * (2 if asking else 1))
+      if asking:
+         replies = replies[1::2]
+      return zip(indexes,replies)
+
+   def pipeline_per_key(self,keys,build):
+      '''
+      Call build(pipeline,key) once per key on the master serving the key , one pipeline per master
+      and all masters in parallel. build must queue exactly one command. Return replies in keys order ,
+      errors are returned as exception objects like pipeline.execute(raise_on_error=False).
+      '''
+      replies = [None] * len(keys)
+      tasks   = [(addr,keys,indexes,build,False) for (addr,indexes) in self.group_by_node(keys).items()]
+      for attempt in range(MAX_REDIRECTS + 1):
+         redirected = []
+         moved      = False
+         for node_replies in self.pool.map(self._run_node_pipeline,tasks):
+            for (index,reply) in node_replies:
+               replies[index] = reply
+               redirect = parse_redirect(reply)
+               if redirect:
+                  redirected.append((index,redirect))
+                  moved = moved or redirect[0] == 'MOVED'
+         if not redirected or attempt == MAX_REDIRECTS:
+            break
+         if moved:
+            self.refresh()
+         groups = {}
+         for (index,(kind,slot,addr)) in redirected:
+            target = addr if kind == 'ASK' else self.node_for_key(keys[index])
+            groups.setdefault((target,kind == 'ASK'),[]).append(index)
+         tasks = [(addr,keys,indexes,build,asking) for ((addr,asking),indexes) in groups.items()]
+      return replies
+
+   def close(self):
+      if self.pool is not None:
+         self.pool.close()
+         self.pool = None
@@ -1,46 +1,260 @@
 import redis
 import time
 import sys
+import getopt
+import threading
+import Queue
+from redis_cluster_router import ClusterRouter
 '''
-This Scripts is for Delete keys which miss used by dev 
-                               
+This Scripts is for Delete keys which miss used by dev
+
 Created by  xiean@2016-04-20 Email xiepaup@163.com
 '''
 
 
+DEFAULT_BATCH        = 300
+DEFAULT_WORKERS      = 4
+DEFAULT_RATE         = 3000       #// keys (or bytes with --bytes-rate) per second , 0 is unlimited
+DEFAULT_MAX_LATENCY  = 10.0       #// ms of a PING probe , above it the rate backs off
+MIN_RATE_FACTOR      = 0.05       #// backoff never goes below 5% of the wanted rate
+#Without UNLINK a collection above BIG_KEY_ELEMENTS is emptied TRIM_BATCH elements at a time before DEL
+BIG_KEY_ELEMENTS     = 5000
+TRIM_BATCH           = 500
+LENGTH_COMMANDS      = {'hash':'HLEN','list':'LLEN','set':'SCARD','zset':'ZCARD'}
+
+
+class TokenBucket(object):
+   '''
+   Token bucket shared by all workers , acquire(n) blocks until n tokens are paid.
+   Tokens may go negative so a batch bigger than the bucket still passes , the debt is slept off.
+   '''
+   def __init__(self,rate,burst=None):
+      self.rate   = float(rate)
+      self.burst  = float(burst or rate)
+      self.tokens = self.burst
+      self.last   = time.time()
+      self.lock   = threading.Lock()
+
+   def set_rate(self,rate):
+      with self.lock:
+         self.rate = float(rate)
+
+   def acquire(self,n):
+      if self.rate <= 0:
+         return
+      with self.lock:
+         now = time.time()
+         self.tokens = min(self.burst,self.tokens + (now - self.last) * self.rate)
+         self.last   = now
+         self.tokens -= n
+         wait = -self.tokens / self.rate if self.tokens < 0 else 0
+      if wait > 0:
+         time.sleep(wait)
+
+
+class AdaptiveThrottle(threading.Thread):
+   '''
+   Probe the servers every second , halve the bucket rate when the slowest PING is above maxLatency ms
+   or the busiest instantaneous_ops_per_sec is above maxOps , grow it back by 10% per healthy second (AIMD).
+   '''
+   def __init__(self,probeConns,bucket,maxLatency,maxOps):
+      threading.Thread.__init__(self)
+      self.daemon      = True
+      self.probe_conns = probeConns
+      self.bucket      = bucket
+      self.target_rate = bucket.rate
+      self.max_latency = maxLatency
+      self.max_ops     = maxOps
+      self.stopped     = threading.Event()
+
+   def run(self):
+      rate = self.target_rate
+      while not self.stopped.wait(1) and self.target_rate > 0:
+         try:
+            (latency,ops) = (0,0)
+            for probeConn in self.probe_conns:
+               begin = time.time()
+               probeConn.ping()
+               latency = max(latency,(time.time() - begin) * 1000)
+               ops = max(ops,probeConn.info('stats')['instantaneous_ops_per_sec'])
+         except redis.RedisError,e:
+            print "%s : Probe Error ,%s" % (time.ctime(),e)
+            latency = self.max_latency * 2
+            ops = 0
+         if latency > self.max_latency or (self.max_ops > 0 and ops > self.max_ops):
+            rate = max(rate * 0.5,self.target_rate * MIN_RATE_FACTOR)
+         else:
+            rate = min(rate * 1.1,self.target_rate)
+         self.bucket.set_rate(rate)
 
-def del_keys(rdbConn,keys_list):
-   rdbPiple = rdbConn.pipeline()
+
+def supports_unlink(rdbConn):
+   version = rdbConn.info('server')['redis_version']
+   return tuple([int(v) for v in version.split('.')[:2]]) >= (4,0)
+
+
+''' Empty a big collection TRIM_BATCH elements at a time , so no single command blocks the server '''
+def trim_big_key(rdbConn,key,keyType,bucket):
+   if keyType == 'hash':
+      cursor = 0
+      while True:
+         (cursor,fields) = rdbConn.hscan(key,cursor,count=TRIM_BATCH)
+         if fields:
+            bucket.acquire(len(fields))
+            rdbConn.hdel(key,*fields.keys())
+         if cursor == 0:
+            break
+   elif keyType == 'set':
+      cursor = 0
+      while True:
+         (cursor,members) = rdbConn.sscan(key,cursor,count=TRIM_BATCH)
+         if members:
+            bucket.acquire(len(members))
+            rdbConn.srem(key,*members)
+         if cursor == 0:
+            break
+   elif keyType == 'zset':
+      #// ZREMRANGEBYRANK drops the lowest ranks directly , no ZSCAN round trip needed
+      while rdbConn.zremrangebyrank(key,0,TRIM_BATCH - 1) > 0:
+         bucket.acquire(TRIM_BATCH)
+   elif keyType == 'list':
+      while rdbConn.llen(key) > 0:
+         bucket.acquire(TRIM_BATCH)
+         rdbConn.ltrim(key,TRIM_BATCH,-1)
+   rdbConn.delete(key)
+
+
+''' Queue one command per key , on a single node pipeline or routed by slot over the cluster '''
+def pipeline_per_key(rdbConn,keys_list,build):
+   if isinstance(rdbConn,ClusterRouter):
+      return rdbConn.pipeline_per_key(keys_list,build)
+   rdbPiple = rdbConn.pipeline(transaction=False)
    for key in keys_list:
-      rdbPiple.delete(key)
-   rdbPiple.execute()
+      build(rdbPiple,key)
+   return rdbPiple.execute(raise_on_error=False)
 
 
-def main(fileName,rdbConn,delCounter):
-   keys_file   = open(fileName,'r')
-   key_counter = 0
-   key_list    = []
+''' rdbConn is a redis.Redis or a ClusterRouter , cluster keys can not share a multi key command '''
+def del_keys(rdbConn,keys_list,bucket,useUnlink=True,bytesRate=False):
+   delete_command = 'UNLINK' if useUnlink else 'DEL'
+   if bytesRate:
+      if useUnlink:
+         replies = pipeline_per_key(rdbConn,keys_list,lambda pipe,key: pipe.execute_command('MEMORY','USAGE',key))
+      else:
+         replies = pipeline_per_key(rdbConn,keys_list,lambda pipe,key: pipe.debug_object(key))
+      sizes = [r if isinstance(r,(int,long)) else (r['serializedlength'] if isinstance(r,dict) else 0) for r in replies]
+      bucket.acquire(sum(sizes))
+   else:
+      bucket.acquire(len(keys_list))
+
+   big_keys = []
+   if not useUnlink:
+      types = dict(zip(keys_list,pipeline_per_key(rdbConn,keys_list,lambda pipe,key: pipe.type(key))))
+      collections = [k for k in keys_list if types[k] in LENGTH_COMMANDS]
+      lengths = pipeline_per_key(rdbConn,collections,lambda pipe,key: pipe.execute_command(LENGTH_COMMANDS[types[key]],key))
+      for (key,length) in zip(collections,lengths):
+         if isinstance(length,(int,long)) and length > BIG_KEY_ELEMENTS:
+            big_keys.append((key,types[key]))
+
+   big_key_names = set([k for (k,t) in big_keys])
+   small_keys = [k for k in keys_list if k not in big_key_names]
+   if small_keys:
+      if isinstance(rdbConn,ClusterRouter):
+         for reply in pipeline_per_key(rdbConn,small_keys,lambda pipe,key: pipe.execute_command(delete_command,key)):
+            if isinstance(reply,Exception):
+               raise reply
+      else:
+         rdbConn.execute_command(delete_command,*small_keys)
+   for (key,keyType) in big_keys:
+      if isinstance(rdbConn,ClusterRouter):
+         trim_big_key(rdbConn.connection_for_key(key),key,keyType,bucket)
+      else:
+         trim_big_key(rdbConn,key,keyType,bucket)
+
+
+''' Worker thread , one connection each , deletes batches from the queue until it gets None '''
+def delete_worker(rdbConn,batch_queue,bucket,useUnlink,bytesRate,stats):
+   while True:
+      keys_list = batch_queue.get()
+      if keys_list is None:
+         break
+      try:
+         del_keys(rdbConn,keys_list,bucket,useUnlink,bytesRate)
+         with stats['lock']:
+            stats['deleted'] += len(keys_list)
+      except Exception,e:
+         #// keep consuming on any error , a dead worker would block the producer on the full queue
+         print "%s : Delete Error ,%s" % (time.ctime(),e)
+         with stats['lock']:
+            stats['failed'] += len(keys_list)
+
+
+def read_keys_file(fileName):
+   keys_file = open(fileName,'r')
    for line in keys_file:
       line = line.strip()
       if line != '':
          #key = line.split(',')[1]
-         key = line
-         key_counter += 1
-         key_list.append(key)
+         yield line
+   keys_file.close()
+
+
+def scan_keys(rdbConns,pattern,scanCount):
+   for rdbConn in rdbConns:
+      for key in rdbConn.scan_iter(match=pattern,count=scanCount):
+         yield key
+
+
+def main(keys_source,rdbConns,delCounter,bucket,useUnlink,bytesRate):
+   batch_queue = Queue.Queue(maxsize=len(rdbConns) * 4)
+   stats   = {'deleted':0,'failed':0,'lock':threading.Lock()}
+   workers = []
+   for rdbConn in rdbConns:
+      worker = threading.Thread(target=delete_worker,args=(rdbConn,batch_queue,bucket,useUnlink,bytesRate,stats))
+      worker.daemon = True
+      worker.start()
+      workers.append(worker)
+
+   key_counter = 0
+   key_list    = []
+   last_report = time.time()
+   for key in keys_source:
+      key_counter += 1
+      key_list.append(key)
       if (key_counter % delCounter) == 0 :
-         del_keys(rdbConn,key_list)
+         batch_queue.put(key_list)
          key_list = []
-         print "%s : Deleted %12s Keys" % (time.ctime(),key_counter)
-         time.sleep(0.1)
+      if time.time() - last_report >= 1:
+         print "%s : Deleted %12s Keys , Failed %s , Rate %s/s" % (time.ctime(),stats['deleted'],stats['failed'],int(bucket.rate))
+         last_report = time.time()
+   if key_list:
+      batch_queue.put(key_list)
+   for worker in workers:
+      batch_queue.put(None)
+   for worker in workers:
+      worker.join()
+   print "%s : Deleted %12s Keys , Failed %s" % (time.ctime(),stats['deleted'],stats['failed'])
 
 def usage():
     print '''
 Function: This Scripts is used to delete keys which miss uesed by dev !
 Args    :
           -H,--help          show usage
-          -F,--file          input keys will be deleted !
+          -f,--file          input keys will be deleted !
+          -m,--match         delete keys matching this SCAN MATCH pattern instead of a file ,eg: 'tmp:*'
           -h,--host          redis ip or domain
           -p,--port          redis port
+          -a,--password      redis password
+          -c,--cluster       host:port is a cluster node ,route keys to their masters and scan every master
+          -w,--workers       delete connections ,Default is 4
+          -b,--batch         keys per pipeline ,Default is 300
+          -r,--rate          max keys deleted per second ,Default is 3000 ,0 is unlimited
+          -B,--bytes-rate    max bytes freed per second instead of --rate (MEMORY USAGE / DEBUG OBJECT)
+          -l,--max-latency   back off when a PING takes more than this ms ,Default is 10
+          -o,--max-ops       back off when instantaneous_ops_per_sec is above this ,Default is 0 (off)
+Notes   :
+          UNLINK is used on redis >= 4.0 ,older servers use DEL and empty collections with more
+          than 5000 elements by HSCAN/SSCAN/ZREMRANGEBYRANK/LTRIM steps before the DEL.
 '''
 
 if __name__ == "__main__":
@@ -49,26 +263,75 @@ if __name__ == "__main__":
        usage()
        exit()
    fileName = ""
+   pattern  = ""
    host     = ""
-   port     = ""
+   port     = 6379
+   password = None
+   workers  = DEFAULT_WORKERS
+   batch    = DEFAULT_BATCH
+   rate     = DEFAULT_RATE
+   bytesRate = False
+   maxLatency = DEFAULT_MAX_LATENCY
+   maxOps   = 0
+   cluster  = False
 
    try:
-      opts,args = getopt.getopt(sys.argv[1:],"Hf:h:p:",["help","file=","host=","port="])
+      opts,args = getopt.getopt(sys.argv[1:],"Hf:m:h:p:P:a:cw:b:r:B:l:o:",["help","file=","match=","host=","port=","password=","cluster","workers=",
+                                                                  "batch=","rate=","bytes-rate=","max-latency=","max-ops="])
       for op,value in opts:
          if op in ("-f","--file"):
              fileName = value
+         elif op in ("-m","--match"):
+             pattern = value
          elif op in ("-h","--host"):
              host = value
-         elif op in ("-P","--port"):
+         elif op in ("-p","-P","--port"):
              port = int(value)
+         elif op in ("-a","--password"):
+             password = value
+         elif op in ("-c","--cluster"):
+             cluster = True
+         elif op in ("-w","--workers"):
+             workers = max(int(value),1)
+         elif op in ("-b","--batch"):
+             batch = max(int(value),1)
+         elif op in ("-r","--rate"):
+             rate = int(value)
+         elif op in ("-B","--bytes-rate"):
+             rate = int(value)
+             bytesRate = True
+         elif op in ("-l","--max-latency"):
+             maxLatency = float(value)
+         elif op in ("-o","--max-ops"):
+             maxOps = int(value)
          elif op in ("-H","--help"):
              usage()
+             exit()
    except Exception,e:
         print "Parse Args Error ,%s" % (e)
+        exit()
 
    beginTime = time.ctime()
-   rdbConn  = redis.Redis(host=host,port=port)
-   main(fileName,rdbConn,300)
-  
+   if cluster:
+      #// the router is thread safe and already runs one pipeline per master in parallel
+      router     = ClusterRouter(host,port,password)
+      rdbConns   = [router] * workers
+      probeConns = [redis.Redis(host=m[0],port=m[1],password=password) for m in router.masters()]
+      scanConns  = [redis.Redis(host=m[0],port=m[1],password=password) for m in router.masters()]
+   else:
+      rdbConns   = [redis.Redis(host=host,port=port,password=password) for i in range(workers)]
+      probeConns = [redis.Redis(host=host,port=port,password=password)]
+      scanConns  = [redis.Redis(host=host,port=port,password=password)]
+   useUnlink = min([supports_unlink(probeConn) for probeConn in probeConns])
+   bucket    = TokenBucket(rate)
+   throttle  = AdaptiveThrottle(probeConns,bucket,maxLatency,maxOps)
+   throttle.start()
+   if pattern:
+      keys_source = scan_keys(scanConns,pattern,batch)
+   else:
+      keys_source = read_keys_file(fileName)
+   main(keys_source,rdbConns,batch,bucket,useUnlink,bytesRate)
+   throttle.stopped.set()
+
    endTime = time.ctime()
    print "Delete Key Done ! running through %s - %s " % (beginTime,endTime)
@@ -5,6 +5,14 @@ import time
 import sys
 import redis
 import os
+import json
+import signal
+import bisect
+import heapq
+import math
+import random
+import multiprocessing
+from array import array
 reload(sys)
 sys.setdefaultencoding('utf8')
 
@@ -19,118 +27,483 @@ __EMAIL__   = "xiepaup@163.com"
             2.        Show Key size distrute
             3.        Show Key key counter
             4.        Show Key with no ttl counter
+            5.        Show Key size p50/p99/max and the biggest keys of every type
 '''
 
 
-#LIST FORMAT
-#0   1     2     3     4      5      6      7       8     9      10    11 
-#ALL <=64 <=128 <=256 <=512 <=1024 <=2048 <=3072 <=4096 <=5120 <=6044 >6044
-string_size_counter_list = [0,0,0,0,0,0,0,0,0,0,0,0]
-list_size_counter_list   = [0,0,0,0,0,0,0,0,0,0,0,0]
-hash_size_counter_list   = [0,0,0,0,0,0,0,0,0,0,0,0]
-set_size_counter_list    = [0,0,0,0,0,0,0,0,0,0,0,0]
-zset_size_counter_list   = [0,0,0,0,0,0,0,0,0,0,0,0]
-
-
-
-def size_counter_do_count(keySizeCounterList,keySize,keyTtl):
-   keySizeCounterList[0] += 1   #// Add all global counter
-   if keyTtl < 0:
-      keySizeCounterList[1] += 1
-   if keySize <= 64:
-      keySizeCounterList[2]  += 1
-   elif keySize <= 128:
-      keySizeCounterList[3] += 1
-   elif keySize <= 512:
-      keySizeCounterList[4] += 1
-   elif keySize <= 1024:
-      keySizeCounterList[5] += 1
-   elif keySize <= 2048:
-      keySizeCounterList[6] += 1
-   elif keySize <= 3072:
-      keySizeCounterList[7] += 1
-   elif keySize <= 4096:
-      keySizeCounterList[8] += 1
-   elif keySize <= 5120:
-      keySizeCounterList[9] += 1
-   elif keySize <= 6044:
-      keySizeCounterList[10] += 1
-   else:
-      keySizeCounterList[11] += 1
-   return keySizeCounterList
-
-
-def key_size_static(keyType,keySize,keyTtl):
-   global string_size_counter_list
-   global list_size_counter_list  
-   global hash_size_counter_list  
-   global set_size_counter_list   
-   global zset_size_counter_list  
-
-   if keyType == "string":
-      string_size_counter_list = size_counter_do_count(string_size_counter_list,keySize,keyTtl)
-   elif keyType == "hash":
-      hash_size_counter_list   = size_counter_do_count(hash_size_counter_list,keySize,keyTtl)
-   elif keyType == "list":
-      list_size_counter_list   = size_counter_do_count(list_size_counter_list,keySize,keyTtl)
-   elif keyType == "set":
-      set_size_counter_list    = size_counter_do_count(set_size_counter_list,keySize,keyTtl)
-   elif keyType == "zset":
-      zset_size_counter_list   = size_counter_do_count(zset_size_counter_list,keySize,keyTtl)
-   else:
-      print "UNKONW KEY TYPE !!",keyType
-   
+KEY_TYPES = ('string','list','hash','set','zset')
+
+#Upper edges of the key size buckets (byte) , sizes above the last edge go to the "large" bucket
+DEFAULT_SIZE_BUCKETS = [64,128,256,512,1024,2048,3072,4096,5120,6144]
+DEFAULT_TOP_KEYS     = 10
+
+#How a key size is measured:
+#   debug  : DEBUG OBJECT serializedlength (byte)
+#   memory : MEMORY USAGE key SAMPLES n (byte) , redis >= 4.0
+#   length : STRLEN for string (byte) , element count (HLEN/LLEN/SCARD/ZCARD/XLEN) for the others
+SIZE_MODES           = ('debug','memory','length')
+LENGTH_COMMANDS      = {'string':'STRLEN','hash':'HLEN','list':'LLEN','set':'SCARD','zset':'ZCARD','stream':'XLEN'}
+DEFAULT_MEMORY_SAMPLES = 5
+
+#SCAN COUNT is adapted per page, so one page (SCAN + info pipeline) costs about SCAN_PAGE_TARGET_MS
+DEFAULT_SCAN_COUNT   = 100
+MIN_SCAN_COUNT       = 10
+MAX_SCAN_COUNT       = 5000
+SCAN_PAGE_TARGET_MS  = 50.0
+
+#Seconds the parent waits for a node result before waiting again , short enough to handle Ctrl-C
+RESULT_WAIT_SECONDS  = 60
+
+#Scan progress of every node is saved to <host>_<port>_scan.checkpoint every scan_options['checkpoint_interval'] seconds
+scan_options         = {'resume':False,'checkpoint_interval':30,'buckets':DEFAULT_SIZE_BUCKETS,'top':DEFAULT_TOP_KEYS,
+                        'size_mode':'debug','memory_samples':DEFAULT_MEMORY_SAMPLES,'encoding':False,'sample_rate':1.0,'db':0}
+scan_stop_event      = multiprocessing.Event()
+
+
+''' Powers of two from minSize up to maxSize, used by --log-buckets '''
+def log_size_buckets(minSize,maxSize):
+   edges = []
+   edge  = max(minSize,1)
+   while edge <= maxSize:
+      edges.append(edge)
+      edge = edge * 2
+   return edges
+
+
+class KeySizeHistogram(object):
+   '''
+   Key size histogram of one key type.
+   counts[i] holds sizes in (edges[i-1],edges[i]] , counts[-1] holds sizes above edges[-1].
+   The biggest topN keys are kept in a min heap, a key only costs a tuple when it enters the heap.
+   '''
+   def __init__(self,edges=DEFAULT_SIZE_BUCKETS,topN=DEFAULT_TOP_KEYS):
+      self.edges   = sorted(edges)
+      self.counts  = array('l',[0] * (len(self.edges) + 1))
+      self.total   = 0
+      self.no_ttl  = 0
+      self.max_size = 0
+      self.top_n   = topN
+      self.top     = []
+
+   def add(self,keySize,keyTtl,keyName=None):
+      self.counts[bisect.bisect_left(self.edges,keySize)] += 1
+      self.total += 1
+      if keyTtl < 0:
+         self.no_ttl += 1
+      if keySize > self.max_size:
+         self.max_size = keySize
+      if keyName is not None and self.top_n > 0:
+         if len(self.top) < self.top_n:
+            heapq.heappush(self.top,(keySize,keyName))
+         elif keySize > self.top[0][0]:
+            heapq.heapreplace(self.top,(keySize,keyName))
+
+   ''' Upper edge of the bucket holding the q-th percentile , never above the real max size '''
+   def percentile(self,q):
+      if self.total == 0:
+         return 0
+      rank = self.total * q / 100.0
+      seen = 0
+      for i in range(len(self.counts)):
+         seen += self.counts[i]
+         if seen >= rank and self.counts[i] > 0:
+            break
+      if i >= len(self.edges):
+         return self.max_size
+      return min(self.edges[i],self.max_size)
+
+   def top_keys(self):
+      return sorted(self.top,reverse=True)
+
+   def merge(self,other):
+      if other.edges != self.edges:
+         raise ValueError("Can not merge histograms with different buckets")
+      for i in range(len(self.counts)):
+         self.counts[i] += other.counts[i]
+      self.total    += other.total
+      self.no_ttl   += other.no_ttl
+      self.max_size  = max(self.max_size,other.max_size)
+      for (keySize,keyName) in other.top:
+         if len(self.top) < self.top_n:
+            heapq.heappush(self.top,(keySize,keyName))
+         elif keySize > self.top[0][0]:
+            heapq.heapreplace(self.top,(keySize,keyName))
+
+   def to_dict(self):
+      return {'edges':self.edges,'counts':self.counts.tolist(),'total':self.total,'no_ttl':self.no_ttl,
+              'max_size':self.max_size,'top_n':self.top_n,'top':self.top}
+
+   @classmethod
+   def from_dict(cls,data):
+      histogram = cls(data['edges'],data['top_n'])
+      histogram.counts   = array('l',data['counts'])
+      histogram.total    = data['total']
+      histogram.no_ttl   = data['no_ttl']
+      histogram.max_size = data['max_size']
+      #// checkpoints are dumped as latin-1 so binary key names survive json
+      histogram.top      = [(keySize,keyName.encode('latin-1')) for (keySize,keyName) in data['top']]
+      heapq.heapify(histogram.top)
+      return histogram
+
+
+class KeyDistribution(object):
+   '''
+   One KeySizeHistogram per key type , mergeable across workers and nodes.
+   With page sampling only sampled_keys of scanned_keys are in the histograms , see estimate().
+   '''
+   def __init__(self,edges=DEFAULT_SIZE_BUCKETS,topN=DEFAULT_TOP_KEYS):
+      self.edges = sorted(edges)
+      self.top_n = topN
+      self.histograms = dict((keyType,KeySizeHistogram(self.edges,topN)) for keyType in KEY_TYPES)
+      self.encodings  = {}
+      self.scanned_keys = 0
+      self.sampled_keys = 0
+
+   def histogram(self,keyType):
+      if keyType not in self.histograms:
+         self.histograms[keyType] = KeySizeHistogram(self.edges,self.top_n)
+      return self.histograms[keyType]
+
+   def add(self,keyType,keySize,keyTtl,keyName=None,keyEncoding=None):
+      self.histogram(keyType).add(keySize,keyTtl,keyName)
+      if keyEncoding is not None:
+         typeEncodings = self.encodings.setdefault(keyType,{})
+         typeEncodings[keyEncoding] = typeEncodings.get(keyEncoding,0) + 1
+
+   def key_types(self):
+      return list(KEY_TYPES) + sorted([t for t in self.histograms if t not in KEY_TYPES])
+
+   def is_sampled(self):
+      return self.sampled_keys < self.scanned_keys
+
+   '''
+   Extrapolate a sampled count to the whole keyspace , return (estimate , 95% confidence half width).
+   Normal approximation of a proportion with finite population correction ,
+   pages are treated as simple random samples of keys.
+   '''
+   def estimate(self,count):
+      if not self.is_sampled() or self.sampled_keys == 0:
+         return (count,0)
+      n = float(self.sampled_keys)
+      N = float(self.scanned_keys)
+      p = count / n
+      half_width = 1.96 * N * math.sqrt(p * (1 - p) / n * (1 - n / N))
+      return (int(round(p * N)),int(round(half_width)))
+
+   def merge(self,other):
+      for (keyType,histogram) in other.histograms.items():
+         self.histogram(keyType).merge(histogram)
+      for (keyType,typeEncodings) in other.encodings.items():
+         for (keyEncoding,count) in typeEncodings.items():
+            self.encodings.setdefault(keyType,{})
+            self.encodings[keyType][keyEncoding] = self.encodings[keyType].get(keyEncoding,0) + count
+      self.scanned_keys += other.scanned_keys
+      self.sampled_keys += other.sampled_keys
+
+   def to_dict(self):
+      return {'edges':self.edges,'top_n':self.top_n,'encodings':self.encodings,
+              'scanned_keys':self.scanned_keys,'sampled_keys':self.sampled_keys,
+              'histograms':dict((keyType,histogram.to_dict()) for (keyType,histogram) in self.histograms.items())}
+
+   @classmethod
+   def from_dict(cls,data):
+      distribution = cls(data['edges'],data['top_n'])
+      for (keyType,histogram) in data['histograms'].items():
+         distribution.histograms[str(keyType)] = KeySizeHistogram.from_dict(histogram)
+      for (keyType,typeEncodings) in data['encodings'].items():
+         distribution.encodings[str(keyType)] = dict((str(e),c) for (e,c) in typeEncodings.items())
+      distribution.scanned_keys = data['scanned_keys']
+      distribution.sampled_keys = data['sampled_keys']
+      return distribution
+
+
+#// merged result of all nodes
+key_distribution = None
+
 
 '''Redis SCAN command got keys '''
-def get_key(rdbConn,start):
+def get_key(rdbConn,start,count=DEFAULT_SCAN_COUNT):
    try:
-      keys_list = rdbConn.scan(start,count=20)
+      keys_list = rdbConn.scan(start,count=count)
       return keys_list
    except Exception,e:
       print e
 
-''' Redis DEBUG OBJECT command got key info '''
-def get_key_info(rdbConn,keyName):
+''' Grow or shrink SCAN COUNT so the next page takes about SCAN_PAGE_TARGET_MS '''
+def adjust_scan_count(count,elapsedMs):
+   if elapsedMs < SCAN_PAGE_TARGET_MS / 2:
+      return min(count * 2,MAX_SCAN_COUNT)
+   elif elapsedMs > SCAN_PAGE_TARGET_MS:
+      return max(count / 2,MIN_SCAN_COUNT)
+   return count
+
+'''
+Size a whole SCAN page in one pipeline , return [(key,[type,size,ttl,encoding]),...].
+Length mode needs the type first , so it costs a second pipeline per page.
+'''
+def get_keys_info(rdbConn,keys,sizeMode='debug',memorySamples=DEFAULT_MEMORY_SAMPLES,withEncoding=False):
     try:
-       rpiple = rdbConn.pipeline()
-       rpiple.type(keyName)
-       rpiple.debug_object(keyName)
-       rpiple.ttl(keyName)
-       key_info_list = rpiple.execute()
-       return key_info_list
+       rpiple = rdbConn.pipeline(transaction=False)
+       for keyName in keys:
+          rpiple.type(keyName)
+          rpiple.ttl(keyName)
+          if sizeMode == 'debug':
+             rpiple.debug_object(keyName)
+          elif sizeMode == 'memory':
+             rpiple.execute_command('MEMORY','USAGE',keyName,'SAMPLES',memorySamples)
+          if withEncoding:
+             rpiple.object('encoding',keyName)
+       replies = rpiple.execute(raise_on_error=False)
     except Exception,e:
        print "INFO : ",e
-
-def redis_key_static(key_info_list):
+       return []
+
+    step = 2 + (sizeMode != 'length') + withEncoding
+    keys_info = []
+    for i in range(len(keys)):
+       key_info_list = replies[i*step:i*step+step]
+       #// key expired or deleted between SCAN and the pipeline
+       if [x for x in key_info_list if isinstance(x,Exception)] or key_info_list[0] == 'none':
+          continue
+       (keyType,keyTtl) = key_info_list[0:2]
+       if sizeMode == 'debug':
+          keySize = key_info_list[2]['serializedlength']
+       elif sizeMode == 'memory':
+          keySize = key_info_list[2] or 0
+       else:
+          keySize = None
+       keyEncoding = key_info_list[-1] if withEncoding else None
+       keys_info.append((keys[i],[keyType,keySize,keyTtl,keyEncoding]))
+
+    if sizeMode == 'length' and keys_info:
+       try:
+          rpiple = rdbConn.pipeline(transaction=False)
+          for (keyName,key_info_list) in keys_info:
+             rpiple.execute_command(LENGTH_COMMANDS.get(key_info_list[0],'STRLEN'),keyName)
+          replies = rpiple.execute(raise_on_error=False)
+       except Exception,e:
+          print "INFO : ",e
+          return []
+       for i in range(len(keys_info)):
+          keys_info[i][1][1] = replies[i] if not isinstance(replies[i],Exception) else 0
+    return keys_info
+
+def redis_key_static(distribution,keyName,key_info_list):
 
     keyType = key_info_list[0]
-    keySize = key_info_list[1]['serializedlength']
+    keySize = key_info_list[1]
     keyTtl  = key_info_list[2]
-    key_size_static(keyType,keySize,keyTtl)
+    distribution.add(keyType,keySize,keyTtl,keyName,key_info_list[3])
+
+
+def node_file_prefix(host,port):
+   return host.replace('.','_')+'_'+str(port)
+
+def load_checkpoint(host,port):
+   checkpoint_file = node_file_prefix(host,port)+'_scan.checkpoint'
+   if not os.path.exists(checkpoint_file):
+      return None
+   checkpoint = json.load(open(checkpoint_file))
+   checkpoint['distribution'] = KeyDistribution.from_dict(checkpoint['distribution'])
+   return checkpoint
+
+''' Write to a temp file then rename, so a crash never leaves a half written checkpoint '''
+def save_checkpoint(host,port,checkpoint):
+   checkpoint_file = node_file_prefix(host,port)+'_scan.checkpoint'
+   tmp_handle = open(checkpoint_file+'.tmp','w')
+   data = dict(checkpoint,distribution=checkpoint['distribution'].to_dict())
+   json.dump(data,tmp_handle,encoding='latin-1')
+   tmp_handle.flush()
+   os.fsync(tmp_handle.fileno())
+   tmp_handle.close()
+   os.rename(checkpoint_file+'.tmp',checkpoint_file)
+
+def remove_checkpoint(host,port):
+   checkpoint_file = node_file_prefix(host,port)+'_scan.checkpoint'
+   if os.path.exists(checkpoint_file):
+      os.remove(checkpoint_file)
+
+
+''' Scan one redis node with its own cursor, return its KeyDistribution or None when interrupted '''
+def scan_node(node):
+   (host,port,passwd) = node
+   if scan_stop_event.is_set():
+      return None
+   no_ttl_file = node_file_prefix(host,port)+'_without_expiretime.redis'
+   checkpoint  = scan_options['resume'] and load_checkpoint(host,port)
+   if checkpoint:
+      if checkpoint['done']:
+         return checkpoint['distribution']
+      keys_without_expire_time_handle = open(no_ttl_file,'r+' if os.path.exists(no_ttl_file) else 'w')
+      keys_without_expire_time_handle.truncate(checkpoint['no_ttl_offset'])
+      keys_without_expire_time_handle.seek(0,os.SEEK_END)
+      print "%s : %s:%s resume from cursor %s" % (time.ctime(),host,port,checkpoint['cursor'])
+   else:
+      checkpoint = {'cursor':0,'count':DEFAULT_SCAN_COUNT,'distribution':KeyDistribution(scan_options['buckets'],scan_options['top']),'no_ttl_offset':0,'done':False}
+      keys_without_expire_time_handle = open(no_ttl_file,'w')
+
+   distribution = checkpoint['distribution']
+   #// SCAN pages are sampled independently per node , don't share the forked random state
+   sampler = random.Random()
+   rdbConn = redis.Redis(host=host,port=port,password=passwd or None)
+   cursor  = checkpoint['cursor']
+   count   = checkpoint['count']
+   last_checkpoint_time = time.time()
+   try:
+      while not scan_stop_event.is_set():
+          page_begin = time.time()
+          keys_page = get_key(rdbConn,cursor,count)
+          if keys_page is None:
+             break
+          #// a page is counted only once complete , an interrupted page is scanned again on --resume
+          page_distribution = KeyDistribution(distribution.edges,distribution.top_n)
+          page_no_ttl = []
+          page_distribution.scanned_keys += len(keys_page[1])
+          if scan_options['sample_rate'] >= 1 or sampler.random() < scan_options['sample_rate']:
+             page_distribution.sampled_keys += len(keys_page[1])
+             for (key,key_info) in get_keys_info(rdbConn,keys_page[1],scan_options['size_mode'],
+                                                 scan_options['memory_samples'],scan_options['encoding']):
+                 redis_key_static(page_distribution,key,key_info)
+                 if key_info[2] < 0:
+                    page_no_ttl.append(key_info[0]+','+key+'\n')
+          count  = adjust_scan_count(count,(time.time() - page_begin) * 1000)
+          next_cursor = int(keys_page[0])
+          distribution.merge(page_distribution)
+          keys_without_expire_time_handle.writelines(page_no_ttl)
+          cursor = next_cursor
+          if cursor == 0:
+             checkpoint['done'] = True
+             break
+          if time.time() - last_checkpoint_time >= scan_options['checkpoint_interval']:
+             keys_without_expire_time_handle.flush()
+             checkpoint.update({'cursor':cursor,'count':count,'no_ttl_offset':keys_without_expire_time_handle.tell()})
+             save_checkpoint(host,port,checkpoint)
+             last_checkpoint_time = time.time()
+   except KeyboardInterrupt:
+      #// the serial scan runs the other nodes after this one , stop them too
+      scan_stop_event.set()
+
+   keys_without_expire_time_handle.flush()
+   checkpoint.update({'cursor':cursor,'count':count,'no_ttl_offset':keys_without_expire_time_handle.tell()})
+   keys_without_expire_time_handle.close()
+   save_checkpoint(host,port,checkpoint)
+   if not checkpoint['done']:
+      print "%s : %s:%s stopped at cursor %s , checkpoint saved" % (time.ctime(),host,port,cursor)
+      return None
+   return distribution
 
 
+'''
+Read one RDB dump file instead of a live node , return its KeyDistribution or None on error.
+Sizes are RDB serialized lengths , the same as DEBUG OBJECT serializedlength , keys already expired are skipped.
+'''
+def analyze_rdb_file(fileName):
+   import redis_rdb_reader
+   if scan_stop_event.is_set():
+      return None
+   distribution = KeyDistribution(scan_options['buckets'],scan_options['top'])
+   sampler = random.Random()
+   keys_without_expire_time_handle = open(os.path.basename(fileName).replace('.','_')+'_without_expiretime.redis','w')
+   now_ms = int(time.time() * 1000)
+   try:
+      for (db,rdbType,keyName,keySize,expireMs) in redis_rdb_reader.RdbParser(fileName).keys():
+         if scan_options['db'] is not None and db != scan_options['db']:
+            continue
+         if expireMs is None:
+            keyTtl = -1
+         elif expireMs <= now_ms:
+            continue
+         else:
+            keyTtl = (expireMs - now_ms) / 1000
+         distribution.scanned_keys += 1
+         if scan_options['sample_rate'] < 1 and sampler.random() >= scan_options['sample_rate']:
+            continue
+         distribution.sampled_keys += 1
+         (keyType,keyEncoding) = redis_rdb_reader.RDB_TYPES[rdbType]
+         distribution.add(keyType,keySize,keyTtl,keyName,keyEncoding if scan_options['encoding'] else None)
+         if keyTtl < 0:
+            keys_without_expire_time_handle.write(keyType+','+keyName+'\n')
+         if scan_stop_event.is_set():
+            return None
+   except redis_rdb_reader.RdbError,e:
+      print "%s : %s , %s" % (time.ctime(),fileName,e)
+      return None
+   except KeyboardInterrupt:
+      scan_stop_event.set()
+      return None
+   finally:
+      keys_without_expire_time_handle.close()
+   return distribution
+
+
+''' Pool workers leave Ctrl-C to the parent, which stops them through scan_stop_event '''
+def init_scan_worker():
+   signal.signal(signal.SIGINT,signal.SIG_IGN)
+
+
+''' Expand a cluster seed node into all master nodes by CLUSTER SLOTS '''
+def get_cluster_masters(host,port,passwd):
+   from redis_cluster_router import ClusterRouter
+   router  = ClusterRouter(host,port,passwd)
+   masters = [(m_host,m_port,passwd) for (m_host,m_port) in router.masters()]
+   router.close()
+   return masters
+
+
+
+def format_size(size):
+   for unit in ('','K','M','G'):
+      if size < 1024 or unit == 'G':
+         break
+      size = size / 1024.0
+   return ('%d%s' if unit == '' else '%.1f%s') % (size,unit)
+
 
 '''Print Key distrubution '''
-def show_static_info(host,port,start_time,end_time):
-   print u'''----------------------------------------------------------------------------------------------------------------------------------------------------
+def print_table(labels,rows):
+   widths  = [max([len(label),9] + [len(str(row[i])) for row in rows]) for (i,label) in enumerate(labels)]
+   print '| ' + ' | '.join([label.center(w) for (label,w) in zip(labels,widths)]) + ' |'
+   for row in rows:
+      print '| ' + ' | '.join([str(v).rjust(w) for (v,w) in zip(row,widths)]) + ' |'
+
+
+def show_static_info(server,start_time,end_time,distribution):
+   labels  = ['KEY TYPE','KEY COUNT','KEY No TTL'] + ['Key %s' % e for e in distribution.edges] + ['Key large','P50','P99','MAX']
+   line    = '-' * (12 * len(labels) + 1)
+   rows    = []
+   ci_rows = []
+   for keyType in distribution.key_types():
+      histogram = distribution.histogram(keyType)
+      estimates = [distribution.estimate(c) for c in [histogram.total,histogram.no_ttl] + histogram.counts.tolist()]
+      rows.append([keyType.upper()] + [e[0] for e in estimates] +
+                  [histogram.percentile(50),histogram.percentile(99),histogram.max_size])
+      ci_rows.append([keyType.upper()] + ['+-%s' % e[1] for e in estimates])
+   print u'''%s
 统计时间:[%s ~ %s]
-Redis服务器[%s:%s]
+Redis服务器[%s]
 数据类型和数据大小分布情况如下:
-----------------------------------------------------------------------------------------------------------------------------------------------------
------------------------------------------------------------------------------------------------------------------------------------------------------
-|KEY TYPE | KEY COUNT | KEY No TTL | KEY 64(byte) | KEY 128 | Key 512 | Key 1024 | Key 2048 | Key 3072 | Key 4096 | Key 5120 | Key 6044 | Key large |
-|%7s  |   %7s  | %7s   | %7s      | %7s | %7s |  %7s | %7s  | %7s  | %7s  | %7s  | %7s  |  %7s  |
-|%7s  |   %7s  | %7s   | %7s      | %7s | %7s |  %7s | %7s  | %7s  | %7s  | %7s  | %7s  |  %7s  |
-|%7s  |   %7s  | %7s   | %7s      | %7s | %7s |  %7s | %7s  | %7s  | %7s  | %7s  | %7s  |  %7s  |
-|%7s  |   %7s  | %7s   | %7s      | %7s | %7s |  %7s | %7s  | %7s  | %7s  | %7s  | %7s  |  %7s  |
-|%7s  |   %7s  | %7s   | %7s      | %7s | %7s |  %7s | %7s  | %7s  | %7s  | %7s  | %7s  |  %7s  |
-----------------------------------------------------------------------------------------------------------------------------------------------------
-''' % (start_time,end_time,host,port,
-       'String',string_size_counter_list[0],string_size_counter_list[1],string_size_counter_list[2],string_size_counter_list[3],string_size_counter_list[4],string_size_counter_list[5],string_size_counter_list[6],string_size_counter_list[7],string_size_counter_list[8],string_size_counter_list[9],string_size_counter_list[10],string_size_counter_list[11],
-       'LIST',list_size_counter_list[0],list_size_counter_list[1],list_size_counter_list[2],list_size_counter_list[3],list_size_counter_list[4],list_size_counter_list[5],list_size_counter_list[6],list_size_counter_list[7],list_size_counter_list[8],list_size_counter_list[9],list_size_counter_list[10],list_size_counter_list[11],
-        'HASH',hash_size_counter_list[0],hash_size_counter_list[1],hash_size_counter_list[2],hash_size_counter_list[3],hash_size_counter_list[4],hash_size_counter_list[5],hash_size_counter_list[6],hash_size_counter_list[7],hash_size_counter_list[8],hash_size_counter_list[9],hash_size_counter_list[10],hash_size_counter_list[11],
-        'SET',set_size_counter_list[0],set_size_counter_list[1],set_size_counter_list[2],set_size_counter_list[3],set_size_counter_list[4],set_size_counter_list[5],set_size_counter_list[6],set_size_counter_list[7],set_size_counter_list[8],set_size_counter_list[9],set_size_counter_list[10],set_size_counter_list[11],
-        'ZSET',zset_size_counter_list[0],zset_size_counter_list[1],zset_size_counter_list[2],zset_size_counter_list[3],zset_size_counter_list[4],zset_size_counter_list[5],zset_size_counter_list[6],zset_size_counter_list[7],zset_size_counter_list[8],zset_size_counter_list[9],zset_size_counter_list[10],zset_size_counter_list[11])
+%s''' % (line,start_time,end_time,server,line)
+   if distribution.is_sampled():
+      print u'抽样统计: 共扫描 %s 个 KEY , 抽样分析 %s 个 KEY (%.2f%%) , 以下数量为估算值 , P50/P99/MAX 来自样本' % (
+             distribution.scanned_keys,distribution.sampled_keys,100.0 * distribution.sampled_keys / max(distribution.scanned_keys,1))
+   print_table(labels,rows)
+   print line
+   if distribution.is_sampled():
+      print u'估算值 95% 置信区间:'
+      print_table(labels[:-3],ci_rows)
+      print line
+   if distribution.encodings:
+      print u'各类型编码分布:'
+      for keyType in distribution.key_types():
+         typeEncodings = distribution.encodings.get(keyType,{})
+         if typeEncodings:
+            print '%8s | %s' % (keyType.upper(),' | '.join(['%s:%s' % (e,distribution.estimate(c)[0]) for (e,c) in sorted(typeEncodings.items())]))
+      print line
+   print u'各类型最大的 KEY (TOP %s):' % distribution.top_n
+   for keyType in distribution.key_types():
+      for (keySize,keyName) in distribution.histogram(keyType).top_keys():
+         print '%8s | %10s | %s' % (keyType.upper(),format_size(keySize),keyName)
+   print line
 
 
 
@@ -141,11 +514,31 @@ This Scripts is used for statistic key distribution , Current is Version is Just
 --INPUT :
    -p,--password=          Author pass
    -P,--port=              Redis Port ,Default is 6379
-   -h,--host=              Redis Host ,Default is 127.0.0.1
+   -h,--host=              Redis Host ,Default is 127.0.0.1, more nodes as host:port,host:port
+   -c,--cluster            Scan all master nodes of the cluster which host belongs to
+   -w,--workers=           Nodes scanned in parallel ,Default is 4
+   -r,--resume             Continue every node from its last <host>_<port>_scan.checkpoint
+   -i,--checkpoint=        Seconds between two checkpoints ,Default is 30
+   -b,--buckets=           Key size bucket edges ,Default is 64,128,256,512,1024,2048,3072,4096,5120,6144
+   -l,--log-buckets=       Power of two bucket edges between min,max ,eg: 16,1048576
+   -t,--top=               Show the biggest N keys of every type ,Default is 10
+   -s,--size-mode=         debug  : DEBUG OBJECT serializedlength (Default)
+                           memory : MEMORY USAGE key SAMPLES n ,for redis >= 4.0 or DEBUG disabled
+                           length : STRLEN for string ,element count for list/hash/set/zset
+   -m,--memory-samples=    SAMPLES of MEMORY USAGE ,Default is 5
+   -e,--encoding           Also show OBJECT ENCODING distribution of every type
+   -S,--sample=            Only analyze this fraction of SCAN pages and extrapolate ,eg: 0.01
+   -R,--rdb=               Analyze RDB dump files offline instead of a live node ,eg: dump.rdb,dump2.rdb
+   -d,--db=                DB analyzed in RDB files ,Default is 0 ,all for every db
    -H,--help               show Scritps Usages !
 
 --EXAMPLE:
     python redis_key_distribution.py -h 8.8.8.88 -P 7201
+    python redis_key_distribution.py -h 8.8.8.88:7201,8.8.8.89:7201 -w 2
+    python redis_key_distribution.py -h 8.8.8.88 -P 7201 -c -w 8
+    python redis_key_distribution.py -h 8.8.8.88 -P 7201 -c -w 8 --resume
+    python redis_key_distribution.py -h 8.8.8.88 -P 7201 -s memory -e -S 0.01
+    python redis_key_distribution.py -R /data/redis/7201/dump.rdb -e
 
 --Sample:
 ----------------------------------------------------------------------------------------------------------------------------------------------------
@@ -173,56 +566,140 @@ def parse_args(sys_argvs):
    passwd    = ''
    host      = '127.0.0.1'
    port      = 6379
+   cluster   = False
+   workers   = 4
+   resume    = False
+   interval  = 30
+   buckets   = DEFAULT_SIZE_BUCKETS
+   top       = DEFAULT_TOP_KEYS
+   size_mode = 'debug'
+   memory_samples = DEFAULT_MEMORY_SAMPLES
+   encoding  = False
+   sample_rate = 1.0
+   rdb_files = []
+   db        = 0
    try:
-      opts,args = getopt.getopt(sys_argvs,"HP:h:",["help","password=","port=","host="])
+      opts,args = getopt.getopt(sys_argvs,"Hp:P:h:cw:ri:b:l:t:s:m:eS:R:d:",["help","password=","port=","host=","cluster","workers=","resume","checkpoint=",
+                                                             "buckets=","log-buckets=","top=","size-mode=","memory-samples=","encoding","sample=",
+                                                             "rdb=","db="])
       for op,value in opts:
          if op in ("-p","--password"):
-             password = value
+             passwd = value
          elif op in ("-h","--host"):
              host = value
          elif op in ("-P","--port"):
              port = int(value)
+         elif op in ("-c","--cluster"):
+             cluster = True
+         elif op in ("-w","--workers"):
+             workers = max(int(value),1)
+         elif op in ("-r","--resume"):
+             resume = True
+         elif op in ("-i","--checkpoint"):
+             interval = int(value)
+         elif op in ("-b","--buckets"):
+             buckets = sorted(set([int(v) for v in value.split(',')]))
+         elif op in ("-l","--log-buckets"):
+             buckets = log_size_buckets(*[int(v) for v in value.split(',')])
+         elif op in ("-t","--top"):
+             top = int(value)
+         elif op in ("-s","--size-mode"):
+             if value not in SIZE_MODES:
+                raise ValueError("size mode should be one of %s" % ','.join(SIZE_MODES))
+             size_mode = value
+         elif op in ("-m","--memory-samples"):
+             memory_samples = int(value)
+         elif op in ("-e","--encoding"):
+             encoding = True
+         elif op in ("-S","--sample"):
+             sample_rate = min(max(float(value),0.0001),1.0)
+         elif op in ("-R","--rdb"):
+             rdb_files = value.split(',')
+         elif op in ("-d","--db"):
+             db = None if value == 'all' else int(value)
          elif op in ("-H","--help"):
              usage()
    except Exception,e:
         print "Parse Args Error ,%s" % (e)
    ##//return {'passwd':passwd,'host':host,'port':port,'outputdir':outputdir}
-   return {'passwd':passwd,'host':host,'port':port}
+   return {'passwd':passwd,'host':host,'port':port,'cluster':cluster,'workers':workers,'resume':resume,'checkpoint_interval':interval,
+           'buckets':buckets,'top':top,'size_mode':size_mode,'memory_samples':memory_samples,
+           'encoding':encoding,'sample_rate':sample_rate,'rdb_files':rdb_files,'db':db}
+
+
+def get_scan_nodes(input_args):
+   nodes = []
+   for addr in input_args['host'].split(','):
+      if ':' in addr:
+         (host,port) = addr.rsplit(':',1)
+         nodes.append((host,int(port),input_args['passwd']))
+      else:
+         nodes.append((addr,input_args['port'],input_args['passwd']))
+   if input_args['cluster']:
+      nodes = get_cluster_masters(*nodes[0])
+   return nodes
 
 
 
 ''' Main Function '''
 def main():
+   global key_distribution
    if len(sys.argv) < 2:
       usage()
    input_args = parse_args(sys.argv[1:])
 
-   host = input_args['host']
-   port = input_args['port']
+   nodes = get_scan_nodes(input_args)
+   for option in ('resume','checkpoint_interval','buckets','top','size_mode','memory_samples','encoding','sample_rate','db'):
+      scan_options[option] = input_args[option]
    start_time = time.ctime()
 
-   rdbConn = redis.Redis(host=host,port=port)
-   init_keys = get_key(rdbConn,0)
-
-   #keysFile = open(host.replace('.','_')+'_'+str(port)+'.redis','w')
-   keys_without_expire_time_handle = open(host.replace('.','_')+'_'+str(port)+'_without_expiretime.redis','w')
-
-   while True :
-       for key in init_keys[1] :
-            key_info = get_key_info(rdbConn,key)
-            if key_info:
-               redis_key_static(key_info)
-               #keysFile.write('''"%s"\n''' % (key+','+key_info[0]+','+str(key_info[1]['serializedlength'])+','+str(key_info[2])))
-               if key_info[2] < 0:
-                  keys_without_expire_time_handle.write(key_info[0]+','+key+'\n')
-       init_keys = get_key(rdbConn,init_keys[0])
-       if init_keys[0] == 0:
-          break
+   if input_args['rdb_files']:
+      (scan_worker,tasks) = (analyze_rdb_file,input_args['rdb_files'])
+      server = 'RDB:' + ','.join(tasks)
+   else:
+      (scan_worker,tasks) = (scan_node,nodes)
+      server = ','.join(['%s:%s' % (n[0],n[1]) for n in nodes])
+   if input_args['workers'] > 1 and len(tasks) > 1:
+      pool = multiprocessing.Pool(min(input_args['workers'],len(tasks)),init_scan_worker)
+      node_results = pool.imap_unordered(scan_worker,tasks)
+   else:
+      pool = None
+      node_results = iter([scan_worker(task) for task in tasks])
+   node_distributions = []
+   try:
+      while True:
+         if not pool:
+            node_distributions.append(node_results.next())
+            continue
+         #// a timed wait keeps Ctrl-C deliverable while waiting on the pool , scans may take days
+         try:
+            node_distributions.append(node_results.next(RESULT_WAIT_SECONDS))
+         except multiprocessing.TimeoutError:
+            pass
+   except StopIteration:
+      pass
+   except KeyboardInterrupt:
+      scan_stop_event.set()
+      node_distributions.append(None)
+   if pool:
+      pool.close()
+      pool.join()
+
+   if None in node_distributions:
+      if input_args['rdb_files']:
+         print "%s : Analyze RDB files failed or interrupted !" % (time.ctime())
+      else:
+         print "%s : Scan interrupted , run again with --resume to continue !" % (time.ctime())
+      sys.exit(1)
+   key_distribution = KeyDistribution(input_args['buckets'],input_args['top'])
+   for distribution in node_distributions:
+      key_distribution.merge(distribution)
+   if not input_args['rdb_files']:
+      for node in nodes:
+         remove_checkpoint(node[0],node[1])
 
    end_time = time.ctime()
-   #keysFile.close()
-   keys_without_expire_time_handle.close()
-   show_static_info(host,port,start_time,end_time)
+   show_static_info(server,start_time,end_time,key_distribution)
 
 if __name__ == "__main__":
    print ''' Please Wait For Seconds .... '''
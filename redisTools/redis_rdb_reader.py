@@ -0,0 +1,361 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+import mmap
+import os
+import struct
+import sys
+
+__Version__ = "1.0.0"
+__AUTHOR__  = "xiean"
+__EMAIL__   = "xiepaup@163.com"
+
+'''
+   Function :
+            Stream the keys of a redis RDB dump file without loading it into redis.
+            Values are skipped , not decoded , so every key only costs the bytes of its header:
+               for (db,rdbType,keyName,valueSize,expireMs) in RdbParser('dump.rdb').keys():
+                   ...
+            valueSize is the serialized length of the value , the same number DEBUG OBJECT
+            reports as serializedlength.
+            Regular files are memory mapped , pipes (eg: '-' for stdin) are read through a bounded buffer.
+'''
+
+
+RDB_OPCODE_SLOT_INFO       = 0xF4
+RDB_OPCODE_FUNCTION2       = 0xF5
+RDB_OPCODE_FUNCTION_PRE_GA = 0xF6
+RDB_OPCODE_MODULE_AUX      = 0xF7
+RDB_OPCODE_IDLE            = 0xF8
+RDB_OPCODE_FREQ            = 0xF9
+RDB_OPCODE_AUX             = 0xFA
+RDB_OPCODE_RESIZEDB        = 0xFB
+RDB_OPCODE_EXPIRETIME_MS   = 0xFC
+RDB_OPCODE_EXPIRETIME      = 0xFD
+RDB_OPCODE_SELECTDB        = 0xFE
+RDB_OPCODE_EOF             = 0xFF
+
+RDB_MODULE_OPCODE_EOF      = 0
+RDB_MODULE_OPCODE_SINT     = 1
+RDB_MODULE_OPCODE_UINT     = 2
+RDB_MODULE_OPCODE_FLOAT    = 3
+RDB_MODULE_OPCODE_DOUBLE   = 4
+RDB_MODULE_OPCODE_STRING   = 5
+
+RDB_ENC_INT8  = 0
+RDB_ENC_INT16 = 1
+RDB_ENC_INT32 = 2
+RDB_ENC_LZF   = 3
+
+#RDB value type => (key type as TYPE command shows , object encoding)
+RDB_TYPES = {
+   0  : ('string','raw'),
+   1  : ('list','linkedlist'),
+   2  : ('set','hashtable'),
+   3  : ('zset','skiplist'),
+   4  : ('hash','hashtable'),
+   5  : ('zset','skiplist'),
+   6  : ('module','module'),
+   7  : ('module','module'),
+   9  : ('hash','zipmap'),
+   10 : ('list','ziplist'),
+   11 : ('set','intset'),
+   12 : ('zset','ziplist'),
+   13 : ('hash','ziplist'),
+   14 : ('list','quicklist'),
+   15 : ('stream','stream'),
+   16 : ('hash','listpack'),
+   17 : ('zset','listpack'),
+   18 : ('list','quicklist'),
+   19 : ('stream','stream'),
+   20 : ('set','listpack'),
+   21 : ('stream','stream'),
+   24 : ('hash','hashtable'),
+   25 : ('hash','listpack'),
+}
+
+MAX_RDB_VERSION = 12
+STREAM_BUFFER_SIZE = 1 << 20
+
+
+class RdbError(Exception):
+   pass
+
+
+class RdbStream(object):
+   '''
+   Sequential reader over an RDB file.
+   A regular file is memory mapped so reads are slices of the page cache ,
+   anything else (pipe , stdin) falls back to a buffered file object and skip() reads and drops.
+   '''
+   def __init__(self,fileName,bufferSize=STREAM_BUFFER_SIZE):
+      self.data   = None
+      self.pos    = 0
+      self.buffer_size = bufferSize
+      if fileName == '-':
+         self.handle = getattr(sys.stdin,'buffer',sys.stdin)
+         return
+      self.handle = open(fileName,'rb',bufferSize)
+      try:
+         if os.fstat(self.handle.fileno()).st_size > 0:
+            self.data = mmap.mmap(self.handle.fileno(),0,access=mmap.ACCESS_READ)
+      except (ValueError,EnvironmentError):
+         self.data = None
+
+   def read(self,size):
+      if self.data is not None:
+         chunk = self.data[self.pos:self.pos+size]
+      else:
+         chunk = self.handle.read(size)
+      if len(chunk) < size:
+         raise RdbError("Unexpected end of file at offset %s" % (self.pos + len(chunk)))
+      self.pos += size
+      return chunk
+
+   def skip(self,size):
+      if self.data is not None:
+         if self.pos + size > len(self.data):
+            raise RdbError("Unexpected end of file at offset %s" % len(self.data))
+         self.pos += size
+         return
+      while size > 0:
+         size -= len(self.read(min(size,self.buffer_size)))
+
+   def tell(self):
+      return self.pos
+
+   def close(self):
+      if self.data is not None:
+         self.data.close()
+      if self.handle is not getattr(sys.stdin,'buffer',sys.stdin):
+         self.handle.close()
+
+
+def lzf_decompress(data,expectedLength):
+   src = bytearray(data)
+   out = bytearray()
+   i   = 0
+   while i < len(src):
+      ctrl = src[i]
+      i += 1
+      if ctrl < 32:
+         out += src[i:i+ctrl+1]
+         i += ctrl + 1
+         continue
+      length = ctrl >> 5
+      if length == 7:
+         length += src[i]
+         i += 1
+      ref = len(out) - ((ctrl & 0x1f) << 8) - src[i] - 1
+      i += 1
+      if ref < 0:
+         raise RdbError("Invalid LZF back reference")
+      for j in range(length + 2):
+         out.append(out[ref + j])
+   if len(out) != expectedLength:
+      raise RdbError("LZF length mismatch %s != %s" % (len(out),expectedLength))
+   return bytes(out)
+
+
+class RdbParser(object):
+   def __init__(self,fileName,bufferSize=STREAM_BUFFER_SIZE):
+      self.file_name = fileName
+      self.stream    = RdbStream(fileName,bufferSize)
+      self.version   = None
+      self.aux       = {}
+
+   def read_byte(self):
+      return ord(self.stream.read(1))
+
+   ''' Return (length,isEncoded) , an encoded length is the RDB_ENC_* of a special string '''
+   def read_length_with_encoding(self):
+      first = self.read_byte()
+      kind  = (first & 0xC0) >> 6
+      if kind == 0:
+         return (first & 0x3F,False)
+      elif kind == 1:
+         return (((first & 0x3F) << 8) | self.read_byte(),False)
+      elif kind == 3:
+         return (first & 0x3F,True)
+      elif first == 0x80:
+         return (struct.unpack('>I',self.stream.read(4))[0],False)
+      elif first == 0x81:
+         return (struct.unpack('>Q',self.stream.read(8))[0],False)
+      raise RdbError("Invalid length encoding 0x%x at offset %s" % (first,self.stream.tell() - 1))
+
+   def read_length(self):
+      (length,isEncoded) = self.read_length_with_encoding()
+      if isEncoded:
+         raise RdbError("Unexpected encoded length at offset %s" % self.stream.tell())
+      return length
+
+   def read_string(self):
+      (length,isEncoded) = self.read_length_with_encoding()
+      if not isEncoded:
+         return self.stream.read(length)
+      if length == RDB_ENC_INT8:
+         return str(struct.unpack('<b',self.stream.read(1))[0]).encode()
+      elif length == RDB_ENC_INT16:
+         return str(struct.unpack('<h',self.stream.read(2))[0]).encode()
+      elif length == RDB_ENC_INT32:
+         return str(struct.unpack('<i',self.stream.read(4))[0]).encode()
+      elif length == RDB_ENC_LZF:
+         compressedLength = self.read_length()
+         rawLength = self.read_length()
+         return lzf_decompress(self.stream.read(compressedLength),rawLength)
+      raise RdbError("Invalid string encoding %s at offset %s" % (length,self.stream.tell()))
+
+   def skip_string(self):
+      (length,isEncoded) = self.read_length_with_encoding()
+      if not isEncoded:
+         self.stream.skip(length)
+      elif length == RDB_ENC_INT8:
+         self.stream.skip(1)
+      elif length == RDB_ENC_INT16:
+         self.stream.skip(2)
+      elif length == RDB_ENC_INT32:
+         self.stream.skip(4)
+      elif length == RDB_ENC_LZF:
+         compressedLength = self.read_length()
+         self.read_length()
+         self.stream.skip(compressedLength)
+      else:
+         raise RdbError("Invalid string encoding %s at offset %s" % (length,self.stream.tell()))
+
+   ''' Old zset score : one length byte , 253/254/255 are nan/+inf/-inf '''
+   def skip_double(self):
+      length = self.read_byte()
+      if length < 253:
+         self.stream.skip(length)
+
+   def skip_module_value(self):
+      while True:
+         opcode = self.read_length()
+         if opcode == RDB_MODULE_OPCODE_EOF:
+            return
+         elif opcode in (RDB_MODULE_OPCODE_SINT,RDB_MODULE_OPCODE_UINT):
+            self.read_length()
+         elif opcode == RDB_MODULE_OPCODE_FLOAT:
+            self.stream.skip(4)
+         elif opcode == RDB_MODULE_OPCODE_DOUBLE:
+            self.stream.skip(8)
+         elif opcode == RDB_MODULE_OPCODE_STRING:
+            self.skip_string()
+         else:
+            raise RdbError("Unknown module opcode %s at offset %s" % (opcode,self.stream.tell()))
+
+   def skip_stream(self,rdbType):
+      for i in range(self.read_length()):
+         self.skip_string()
+         self.skip_string()
+      #// length , last id
+      for i in range(3):
+         self.read_length()
+      if rdbType >= 19:
+         #// first id , max deleted id , entries added
+         for i in range(5):
+            self.read_length()
+      for i in range(self.read_length()):
+         self.skip_string()
+         self.read_length()
+         self.read_length()
+         if rdbType >= 19:
+            self.read_length()
+         for j in range(self.read_length()):
+            self.stream.skip(16 + 8)
+            self.read_length()
+         for j in range(self.read_length()):
+            self.skip_string()
+            self.stream.skip(16 if rdbType >= 21 else 8)
+            self.stream.skip(16 * self.read_length())
+
+   def skip_value(self,rdbType):
+      if rdbType in (0,9,10,11,12,13,16,17,20):
+         self.skip_string()
+      elif rdbType in (1,2,14):
+         for i in range(self.read_length()):
+            self.skip_string()
+      elif rdbType == 3:
+         for i in range(self.read_length()):
+            self.skip_string()
+            self.skip_double()
+      elif rdbType == 4:
+         for i in range(self.read_length() * 2):
+            self.skip_string()
+      elif rdbType == 5:
+         for i in range(self.read_length()):
+            self.skip_string()
+            self.stream.skip(8)
+      elif rdbType == 7:
+         self.read_length()
+         self.skip_module_value()
+      elif rdbType == 18:
+         for i in range(self.read_length()):
+            self.read_length()
+            self.skip_string()
+      elif rdbType in (15,19,21):
+         self.skip_stream(rdbType)
+      elif rdbType == 24:
+         self.stream.skip(8)
+         for i in range(self.read_length()):
+            self.read_length()
+            self.skip_string()
+            self.skip_string()
+      elif rdbType == 25:
+         self.stream.skip(8)
+         self.skip_string()
+      else:
+         raise RdbError("Unsupported RDB value type %s at offset %s" % (rdbType,self.stream.tell()))
+
+   def read_header(self):
+      magic = self.stream.read(9)
+      if magic[:5] != b'REDIS' or not magic[5:].isdigit():
+         raise RdbError("%s is not a redis RDB file" % self.file_name)
+      self.version = int(magic[5:])
+      if self.version > MAX_RDB_VERSION:
+         raise RdbError("RDB version %s is not supported , newest known is %s" % (self.version,MAX_RDB_VERSION))
+
+   def keys(self):
+      '''
+      Yield (db,rdbType,keyName,valueSize,expireMs) for every key , expireMs is None without TTL.
+      '''
+      self.read_header()
+      db = 0
+      expireMs = None
+      while True:
+         opcode = self.read_byte()
+         if opcode == RDB_OPCODE_EOF:
+            break
+         elif opcode == RDB_OPCODE_SELECTDB:
+            db = self.read_length()
+         elif opcode == RDB_OPCODE_EXPIRETIME_MS:
+            expireMs = struct.unpack('<q',self.stream.read(8))[0]
+         elif opcode == RDB_OPCODE_EXPIRETIME:
+            expireMs = struct.unpack('<i',self.stream.read(4))[0] * 1000
+         elif opcode == RDB_OPCODE_RESIZEDB:
+            self.read_length()
+            self.read_length()
+         elif opcode == RDB_OPCODE_AUX:
+            auxKey = self.read_string()
+            self.aux[auxKey] = self.read_string()
+         elif opcode == RDB_OPCODE_FREQ:
+            self.stream.skip(1)
+         elif opcode == RDB_OPCODE_IDLE:
+            self.read_length()
+         elif opcode == RDB_OPCODE_MODULE_AUX:
+            for i in range(3):
+               self.read_length()
+            self.skip_module_value()
+         elif opcode == RDB_OPCODE_FUNCTION2:
+            self.skip_string()
+         elif opcode == RDB_OPCODE_SLOT_INFO:
+            for i in range(3):
+               self.read_length()
+         elif opcode == RDB_OPCODE_FUNCTION_PRE_GA:
+            raise RdbError("Pre GA function opcode is not supported")
+         else:
+            keyName = self.read_string()
+            valueBegin = self.stream.tell()
+            self.skip_value(opcode)
+            yield (db,opcode,keyName,self.stream.tell() - valueBegin,expireMs)
+            expireMs = None
+      self.stream.close()